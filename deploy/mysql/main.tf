@@ -116,6 +116,8 @@ export TZ="Asia/Seoul"
 sudo apt install -y mysql-server
 sleep 5
 sudo sed -i 's/bind-address.*/bind-address = 0.0.0.0/' /etc/mysql/mysql.conf.d/mysqld.cnf
+# 인서터 bulk 모드 (LOAD DATA LOCAL INFILE) 허용
+echo 'local_infile = 1' | sudo tee -a /etc/mysql/mysql.conf.d/mysqld.cnf
 sudo service mysql stop
 sudo service mysql start
 # MySQL 기동 대기
@@ -0,0 +1,259 @@
+"""
+
+원격 노드에 상주하는 작업 에이전트
+
+remote_*_proc 은 명령마다 `python3 -m kfktest.<도구>` 를 띄우기에 인터프리터 기동,
+kfktest.util 의 무거운 임포트 (pandas, boto3, pytest, paramiko), 가짜 데이터 풀과
+DB 접속을 매번 새로 한다. 에이전트는 노드마다 한 번 떠서 이들을 유지하고,
+SSH 채널 하나 위의 JSON lines RPC 로 inserter / selector / producer 작업을 받는다.
+
+- 요청 (stdin): {"id": 1, "op": "insert", "args": {...}}
+- 응답 (stdout): {"id": 1, "ok": true, "result": ..., "error": null, "elapsed": 1.2}
+- 작업들의 로그는 stderr 로 나가고, 클라이언트는 노드 이름을 붙여 바로 출력한다.
+
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+import multiprocessing
+from threading import Thread, Lock
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from kfktest.util import (SSH, SSHStream, _exec_command, linfo, fake_pool,
+    enable_db_cache)
+from kfktest.histogram import Histogram
+from kfktest.inserter import insert_workers
+from kfktest.selector import select
+from kfktest.producer import produce_workers
+
+AGENT_JOBS = 16  # 에이전트가 동시에 실행하는 최대 작업 수
+AGENT_START_TIMEOUT = 60  # 에이전트가 뜨기를 기다리는 시간 (초)
+# 에이전트 안에서 프로듀서 워커 프로세스를 띄우는 방식 (작업 쓰레드에서 fork 하면 교착될 수 있음)
+AGENT_START_METHOD = 'forkserver'
+
+# CLI 용 파서
+parser = argparse.ArgumentParser(description="원격 노드 작업 에이전트 (stdin / stdout JSON lines RPC).",
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter
+)
+parser.add_argument('profile', type=str, help="프로파일 이름.")
+parser.add_argument('-j', '--jobs', type=int, default=AGENT_JOBS, help="동시 작업 수.")
+
+
+def _op_insert(profile, workers=1, **kwargs):
+    return insert_workers(profile, workers, **kwargs)
+
+
+def _op_produce(profile, workers=1, **kwargs):
+    return produce_workers(profile, workers, start_method=AGENT_START_METHOD,
+        **kwargs)
+
+
+# 에이전트가 받는 작업 (인자는 각 함수의 키워드 인자)
+AGENT_OPS = {
+    'insert': _op_insert,
+    'select': select,
+    'produce': _op_produce,
+}
+
+
+def _jsonable(res):
+    """작업 결과를 JSON 으로 보낼 수 있게 (히스토그램은 요약 dict 로)."""
+    if isinstance(res, Histogram):
+        return res.summary()
+    if isinstance(res, dict):
+        return {k: _jsonable(v) for k, v in res.items()}
+    if isinstance(res, (list, tuple)):
+        return [_jsonable(v) for v in res]
+    return res
+
+
+def serve(profile, jobs=AGENT_JOBS):
+    """stdin 의 요청을 받아 작업을 실행하고 stdout 으로 응답.
+
+    fd 1 은 응답 전용으로 빼두고 print / linfo 와 네이티브 라이브러리의 출력은
+    stderr 로 보낸다. 가짜 데이터 풀은 먼저 만들어두고, DB 커넥션은 작업이
+    끝나도 닫지 않고 다음 작업에 재사용한다. 프로듀서 워커는 작업 쓰레드에서
+    fork 하지 않고 kfktest.producer 를 미리 임포트한 forkserver 로 띄운다.
+    해석할 수 없는 요청 줄은 (id 를 알면 에러로 응답하고) 건너뛴다.
+
+    """
+    out = os.fdopen(os.dup(1), 'w')
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+    lock = Lock()
+
+    def reply(msg):
+        with lock:
+            out.write(json.dumps(msg) + '\n')
+            out.flush()
+
+    def run(req):
+        st = time.time()
+        try:
+            res = AGENT_OPS[req['op']](profile, **req.get('args', {}))
+            reply(dict(id=req['id'], ok=True, result=_jsonable(res), error=None,
+                elapsed=time.time() - st))
+        except Exception as e:
+            reply(dict(id=req['id'], ok=False, result=None,
+                error=f'{type(e).__name__}: {e}', elapsed=time.time() - st))
+
+    enable_db_cache()
+    multiprocessing.set_forkserver_preload(['kfktest.producer'])
+    fake_pool(profile)
+    linfo(f"Agent {profile} ready.")
+
+    with ThreadPoolExecutor(max_workers=jobs) as ex:
+        for line in sys.stdin:
+            req = None
+            try:
+                req = json.loads(line)
+                rid, op = req['id'], req['op']
+            except (json.JSONDecodeError, KeyError, TypeError) as e:
+                rid = req.get('id') if isinstance(req, dict) else None
+                linfo(f"Bad request {line.strip()!r}: {type(e).__name__}: {e}")
+                if rid is not None:
+                    reply(dict(id=rid, ok=False, result=None,
+                        error=f"Bad request: {type(e).__name__}: {e}", elapsed=0))
+                continue
+            if op == 'exit':
+                break
+            if op == 'ping':
+                reply(dict(id=rid, ok=True, result='pong', error=None, elapsed=0))
+            elif op not in AGENT_OPS:
+                reply(dict(id=rid, ok=False, result=None,
+                    error=f"Unknown op {op}", elapsed=0))
+            else:
+                ex.submit(run, req)
+    linfo(f"Agent {profile} exit.")
+
+
+class RemoteAgent:
+    """원격 노드의 에이전트에 SSH 채널 하나로 접속한 클라이언트.
+
+    call 은 요청을 보내고 바로 Future 를 주기에 여러 작업을 동시에 걸 수 있다.
+    응답은 읽기 쓰레드가 요청 id 로 Future 에 넘긴다.
+
+    Args:
+        host (str): 노드 주소
+        profile (str): 프로파일 이름
+        name (str): 로그용 노드 이름. 기본값 None
+
+    """
+
+    def __init__(self, host, profile, name=None):
+        self.host = host
+        self.name = name or host
+        self.futs = {}
+        self.lock = Lock()
+        self.ids = itertools.count(1)
+        self.closed = False
+        ssh = SSH(host, name)
+        cmd = f"cd kfktest/deploy/{profile} && python3 -m kfktest.agent {profile}"
+        linfo(f"[ ] agent start {self.name}")
+        self.stdin, stdout, _ = _exec_command(ssh, cmd)
+        self.stream = SSHStream(stdout.channel, cmd, ignore_err=True,
+            on_err=lambda line: linfo(f"[{self.name}] {line}"))
+        self.reader = Thread(target=self._read, daemon=True)
+        self.reader.start()
+        self.call('ping').result(timeout=AGENT_START_TIMEOUT)
+        linfo(f"[v] agent start {self.name}")
+
+    def _read(self):
+        try:
+            for line in self.stream:
+                try:
+                    msg = json.loads(line)
+                except json.JSONDecodeError:
+                    linfo(f"[{self.name}] {line}")
+                    continue
+                with self.lock:
+                    fut = self.futs.pop(msg['id'], None)
+                if fut is None:
+                    continue
+                if msg['ok']:
+                    fut.set_result(msg['result'])
+                else:
+                    fut.set_exception(RuntimeError(f"[@{self.host}] {msg['error']}"))
+        finally:
+            with self.lock:
+                self.closed = True
+                futs, self.futs = self.futs, {}
+            for fut in futs.values():
+                fut.set_exception(RuntimeError(f"[@{self.host}] agent closed"))
+
+    def call(self, op, **args):
+        """작업 요청.
+
+        Returns:
+            Future: 작업 결과 (작업 함수의 반환값을 JSON 으로 옮긴 것)
+
+        """
+        fut = Future()
+        with self.lock:
+            if self.closed:
+                raise RuntimeError(f"[@{self.host}] agent closed")
+            rid = next(self.ids)
+            self.futs[rid] = fut
+            self.stdin.write(json.dumps(dict(id=rid, op=op, args=args)) + '\n')
+            self.stdin.flush()
+        return fut
+
+    def run(self, op, timeout=None, **args):
+        """작업을 요청하고 끝날 때까지 대기.
+
+        Args:
+            op (str): 작업 이름
+            timeout (float): 최대 대기 시간 (초). 넘으면 TimeoutError. 기본값 None (무한)
+
+        """
+        return self.call(op, **args).result(timeout=timeout)
+
+    def close(self):
+        """에이전트 종료 (실행 중인 작업은 끝까지 마친다)."""
+        with self.lock:
+            if not self.closed:
+                self.stdin.write(json.dumps(dict(id=0, op='exit')) + '\n')
+                self.stdin.flush()
+        self.reader.join()
+        self.stream.close()
+
+
+# 프로세스 공용 에이전트 ((host, profile) 별)
+_agents = {}
+_agents_lock = Lock()
+
+
+def _clear_agents():
+    """fork 된 자식 프로세스에서는 부모의 에이전트 채널을 쓰지 않는다."""
+    global _agents_lock
+    _agents_lock = Lock()
+    _agents.clear()
+
+
+os.register_at_fork(after_in_child=_clear_agents)
+
+
+def get_agent(host, profile, name=None):
+    """(host, profile) 의 에이전트 얻기 (없거나 끊겼으면 새로 띄움)."""
+    key = (host, profile)
+    with _agents_lock:
+        agent = _agents.get(key)
+        if agent is None or agent.closed:
+            agent = _agents[key] = RemoteAgent(host, profile, name)
+        return agent
+
+
+def close_agents():
+    """모든 에이전트 종료."""
+    with _agents_lock:
+        for agent in _agents.values():
+            agent.close()
+        _agents.clear()
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    serve(args.profile, args.jobs)
@@ -1,14 +1,19 @@
 from distutils.ccompiler import get_default_compiler
 from os import dup
 import sys
+import time
 import json
 import argparse
+import multiprocessing
 from collections import defaultdict
 
-from confluent_kafka import Consumer, KafkaError, KafkaException
+from confluent_kafka import Consumer, KafkaError, KafkaException, \
+    TopicPartition, TIMESTAMP_NOT_AVAILABLE
 
 from kfktest.util import load_setup, linfo, DB_PRE_ROWS, DB_ROWS, \
-    count_topic_message, SSH, consume_loop
+    count_topic_message, SSH, consume_loop, consume_assigned, collect_workers
+from kfktest.histogram import Histogram
+from kfktest.verify import IdTracker, SeqChecker, format_ranges
 
 # CLI 용 파서
 parser = argparse.ArgumentParser(description="프로파일에 맞는 토픽 컨슘.",
@@ -27,24 +32,127 @@ parser.add_argument('-d', '--dev', action='store_true', default=False,
 parser.add_argument('--topic', type=str, default=None, help="읽을 토픽 지정. (카운팅시 하나 이상 토픽을 ','로 구분해 지정 가능)")
 parser.add_argument('-f', '--fields', type=str, default=None, help="일치하는 필드만 표시 (',' 로 구분).")
 parser.add_argument('--field-types', type=str, default=None, help="일치하는 필드별 표시 타입 (',' 로 구분).")
+parser.add_argument('-l', '--latency', action='store_true', default=False,
+    help="프로듀스 → 컨슘 지연 시간 측정.")
+parser.add_argument('--lat-source', type=str, choices=['kafka', 'regts'], default='kafka',
+    help="지연 시간 기준 시각. kafka: 메시지 타임스탬프, regts: 메시지의 regts 필드 (with_ts 로 생성).")
+parser.add_argument('--lat-window', type=int, default=10, help="지연 시간을 나눠 볼 시간 구간 (초).")
+parser.add_argument('-e', '--eof', action='store_true', default=False,
+    help="시작 시점의 토픽 끝에 닿으면 바로 종료 (타임아웃은 안전장치로만).")
+parser.add_argument('-s', '--seq', action='store_true', default=False,
+    help="인서터별 (pid) sid 시퀀스의 빈틈/중복/순서 바뀜 검사.")
+parser.add_argument('--seq-window', type=int, default=1000, help="시퀀스 검사의 pid 별 순서 바뀜 허용 창.")
+parser.add_argument('--seq-expected', type=int, default=None,
+    help="pid 별 기대 행수. 주어지면 끝에서 못 받은 sid 도 빈틈으로 보고.")
+parser.add_argument('-w', '--workers', type=int, default=1,
+    help="파티션을 나눠 읽을 컨슈머 프로세스 수.")
+parser.add_argument('--max-id', type=int, default=DB_PRE_ROWS + DB_ROWS,
+    help="중복/누락 검증시 기대하는 최대 메시지 ID (1 부터).")
 
 
-def msg_process(msg, duplicate, miss, count_only, idmsgs, fields):
+class LatencyTracker:
+    """메시지별 프로듀스 → 컨슘 지연 시간 (ms) 을 히스토그램으로 기록.
+
+    전체, 파티션별, 기준 시각의 시간 구간별로 나눠 기록한다.
+    kafka 기준은 메시지 타임스탬프 (기본 CreateTime), regts 기준은 프로듀서가
+    넣은 regts 필드를 쓴다. 프로듀서와 컨슈머 장비의 시계가 맞아야 의미가 있다.
+
+    Args:
+        source (str): 기준 시각. kafka / regts. 기본값 kafka
+        window (int): 시간 구간 길이 (초). 기본값 10
+
+    """
+
+    def __init__(self, source='kafka', window=10):
+        assert source in ('kafka', 'regts')
+        self.source = source
+        self.window = window
+        self.total = Histogram()
+        self.partitions = defaultdict(Histogram)
+        self.windows = defaultdict(Histogram)
+        self.skipped = 0
+
+    def record(self, msg, data=None):
+        """메시지 하나의 지연 시간 기록.
+
+        Args:
+            msg: confluent_kafka 메시지
+            data (dict): 디코딩된 메시지 값. regts 기준에서 없으면 디코딩
+
+        """
+        now = time.time() * 1000
+        if self.source == 'kafka':
+            tstype, ts = msg.timestamp()
+            if tstype == TIMESTAMP_NOT_AVAILABLE:
+                ts = None
+        else:
+            if data is None and msg.value() is not None:
+                data = json.loads(msg.value())
+            # 툼스톤은 값이 없고, 커넥터 메시지는 payload 아래, 프로듀서 메시지는 최상위
+            ts = None if data is None else data.get('payload', data).get('regts')
+        if ts is None:
+            self.skipped += 1
+            return
+        lat = max(0.0, now - ts)
+        self.total.record(lat)
+        self.partitions[msg.partition()].record(lat)
+        self.windows[int(ts // (self.window * 1000))].record(lat)
+
+    def merge(self, other):
+        """다른 트래커의 기록을 합침."""
+        self.total.merge(other.total)
+        for part, hist in other.partitions.items():
+            self.partitions[part].merge(hist)
+        for win, hist in other.windows.items():
+            self.windows[win].merge(hist)
+        self.skipped += other.skipped
+        return self
+
+    def report(self, name):
+        """지연 시간 백분위 출력."""
+        linfo(f"{name} e2e latency (ms) [{self.source}]: {self.total}")
+        for part in sorted(self.partitions.keys()):
+            linfo(f"{name}   partition {part}: {self.partitions[part]}")
+        if len(self.windows) > 0:
+            first = min(self.windows.keys())
+            for win in sorted(self.windows.keys()):
+                linfo(f"{name}   window +{(win - first) * self.window}s: {self.windows[win]}")
+        if self.skipped > 0:
+            linfo(f"{name}   {self.skipped} messages without timestamp")
+
+
+def msg_process(msg, duplicate, miss, count_only, tracker, fields, lat=None,
+        seq=None):
+    """메시지 하나를 검증 기록에 반영 (또는 출력).
+
+    값은 필요한 곳이 있을 때 한 번만 디코딩해 지연 시간 / 시퀀스 / id 검사에
+    같이 쓴다. 툼스톤 (값이 없는 메시지) 은 id / 시퀀스 검사에서 뺀다.
+
+    """
     topic = msg.topic()
     partition = msg.partition()
     offset = msg.offset()
     key = msg.key()
     value = msg.value()
+    decode = (seq is not None or duplicate or miss
+        or (lat is not None and lat.source == 'regts')
+        or (not count_only and fields is not None))
+    data = json.loads(value) if decode and value is not None else None
+    if lat is not None:
+        lat.record(msg, data)
+    if seq is not None and data is not None:
+        seq.add_row(data)
     if duplicate or miss:
-        data = json.loads(value.decode('utf8'))
+        if data is None:
+            return
         id = data['payload']['id']
-        idmsgs[id].append((topic, partition, offset, data['payload']))
+        # 중복일 때만 메시지 정보가 남는다
+        tracker.add(id, (topic, partition, offset, data['payload']))
     else:
         if not count_only:
-            if fields is None:
+            if fields is None or data is None:
                 linfo(f'{topic}:{partition}:{offset} key={key} value={value}')
             else:
-                data = json.loads(value.decode('utf8'))
                 values = []
                 for f in fields.split(','):
                     field = f.strip()
@@ -64,7 +172,29 @@ def consume(profile,
         dev=parser.get_default('dev'),
         topic=parser.get_default('topic'),
         fields=parser.get_default('fields'),
+        latency=parser.get_default('latency'),
+        lat_source=parser.get_default('lat_source'),
+        lat_window=parser.get_default('lat_window'),
+        max_id=parser.get_default('max_id'),
+        eof=parser.get_default('eof'),
+        workers=parser.get_default('workers'),
+        seq=parser.get_default('seq'),
+        seq_window=parser.get_default('seq_window'),
+        seq_expected=parser.get_default('seq_expected'),
+        start_method='fork',
         ):
+    """토픽을 컨슘하며 중복 / 누락 / 지연 시간을 검증.
+
+    workers 가 1 보다 크면 토픽 파티션들을 나눠 workers 개의 프로세스가 각자
+    할당받아 읽고, 프로세스별 id 카운트와 지연 시간 히스토그램을 마지막에 합친다.
+    seq 검사는 한 pid 의 메시지가 여러 파티션에 흩어지기에 workers 가 1 일 때만.
+    쓰레드가 도는 프로세스 (kfktest.agent) 에서 부를 때는 fork 가 교착될 수 있기에
+    start_method 로 forkserver / spawn 을 쓴다.
+
+    Returns:
+        int: 컨슘한 메시지 수
+
+    """
     topic = f'{profile}_person' if topic is None else topic
     linfo(f"[ ] consume {topic}.")
 
@@ -75,51 +205,135 @@ def consume(profile,
     if count_only:
         total = count_topic_message(profile, topic)
         linfo(f"[v] consume {topic} with {total} messages.")
-        return
+        return total
     else:
         assert ',' not in topic
 
-    consumer = Consumer({
+    conf = {
         'bootstrap.servers': f'{broker_addr}:{broker_port}',
         'group.id': cgid,
         'auto.offset.reset': 'earliest' if from_begin else 'latest',
         'enable.auto.commit': auto_commit,
+        'enable.partition.eof': eof,
         # 'session.timeout.ms': timeout * 1000
-    })
+    }
+    opts = dict(duplicate=duplicate, miss=miss, fields=fields, latency=latency,
+        lat_source=lat_source, lat_window=lat_window, max_id=max_id)
 
-    linfo("Connected")
-    cnt = 0
-    dup_cnt = 0
-    idmsgs = defaultdict(list)
-    consume_loop(consumer, [topic],
-        lambda msg: msg_process(msg, duplicate, miss, count_only, idmsgs, fields),
-        timeout)
+    seqc = None
+    if workers == 1:
+        consumer = Consumer(conf)
+        linfo("Connected")
+        if seq:
+            seqc = SeqChecker(seq_window, expected=seq_expected)
+        cnt, tracker, lat = _consume_part(consumer, topic, None, timeout, eof,
+            opts, seqc)
+    else:
+        assert not seq, "Sequence check needs a single consumer"
+        cnt, tracker, lat = _consume_workers(conf, topic, workers, timeout, eof,
+            opts, start_method)
+
+    if seqc is not None:
+        seqc.finish().report(f"Consumer {topic}", linfo)
+
+    if lat is not None:
+        lat.report(f"Consumer {topic}")
 
     if duplicate:
-        for id, msgs in idmsgs.items():
-            dcnt = len(msgs) - 1
-            if dcnt > 0:
-                dup_cnt += dcnt
-                linfo(f"msgid {id} has {dcnt} duplicate messages:")
-                for msg in msgs:
-                    linfo(f"   > {msg}")
+        # 처음 받은 메시지는 남기지 않기에 두 번째부터 출력
+        for id, msgs in tracker.dups.items():
+            linfo(f"msgid {id} has {len(msgs)} duplicate messages:")
+            for msg in msgs:
+                linfo(f"   > {msg}")
 
     if miss:
-        aids = set(range(1, DB_PRE_ROWS + DB_ROWS + 1))
-        mids = set(idmsgs.keys())
-        if len(aids) > len(mids):
-            missed = aids - mids
-            print(f"Missed message ids {missed} among 1 to {DB_PRE_ROWS + DB_ROWS}")
-
+        missed = tracker.missing()
+        if len(missed) > 0:
+            nmiss = sum(e - s + 1 for s, e in missed)
+            print(f"Missed {nmiss} message ids {format_ranges(missed)} among 1 to {max_id}")
 
     linfo(f"[v] consume {topic} with {cnt} messages.")
-    if duplicate:
+    if duplicate and cnt > 0:
+        dup_cnt = tracker.dup_cnt
         linfo(f"Total {dup_cnt} duplicate messages ({dup_cnt * 100/ float(cnt):.2f} %).")
     return cnt
 
 
+def _consume_part(consumer, topic, parts, timeout, eof, opts, seq=None):
+    """토픽 (parts 가 주어지면 그 파티션들만) 을 컨슘해 검증 기록을 반환.
+
+    Returns:
+        tuple: (메시지 수, IdTracker, LatencyTracker 또는 None)
+
+    """
+    cnt = 0
+    tracker = IdTracker(opts['max_id'], keep_dups=opts['duplicate'])
+    lat = LatencyTracker(opts['lat_source'], opts['lat_window']) \
+        if opts['latency'] else None
+
+    def _process(msg):
+        nonlocal cnt
+        cnt += 1
+        msg_process(msg, opts['duplicate'], opts['miss'], False, tracker,
+            opts['fields'], lat, seq)
+
+    if parts is None:
+        consume_loop(consumer, [topic], _process, timeout, eof=eof)
+    else:
+        tps = [TopicPartition(topic, part) for part in parts]
+        consume_assigned(consumer, tps, _process, timeout, eof=eof)
+    return cnt, tracker, lat
+
+
+def _consume_worker(q, k, conf, topic, parts, timeout, eof, opts):
+    linfo(f"Consumer worker {k} reads partitions {parts}")
+    try:
+        cnt, tracker, lat = _consume_part(Consumer(conf), topic, parts, timeout,
+            eof, opts)
+        # 전체 id 범위 배열 대신 본 구간만 보냄
+        q.put((k, True, (cnt, tracker.trimmed(), lat)))
+    except Exception as e:
+        q.put((k, False, f'{type(e).__name__}: {e}'))
+
+
+def _consume_workers(conf, topic, workers, timeout, eof, opts, start_method='fork'):
+    """파티션을 나눠 여러 프로세스로 컨슘하고 검증 기록을 합침.
+
+    워커가 실패하거나 결과 없이 죽으면 나머지 워커를 끝내고 예외를 낸다.
+
+    """
+    cons = Consumer(conf)
+    parts = sorted(cons.list_topics(topic, timeout=10).topics[topic].partitions)
+    cons.close()
+    workers = min(workers, len(parts))
+
+    ctx = multiprocessing.get_context(start_method)
+    q = ctx.Queue()
+    procs = []
+    for k in range(workers):
+        p = ctx.Process(target=_consume_worker,
+            args=(q, k, conf, topic, parts[k::workers], timeout, eof, opts))
+        p.start()
+        procs.append(p)
+
+    results = collect_workers(q, procs)
+
+    cnt = 0
+    tracker = IdTracker(opts['max_id'], keep_dups=opts['duplicate'])
+    lat = None
+    for k in range(workers):
+        _cnt, _tracker, _lat = results[k]
+        cnt += _cnt
+        tracker.merge(_tracker)
+        if _lat is not None:
+            lat = _lat if lat is None else lat.merge(_lat)
+    return cnt, tracker, lat
+
+
 if __name__ == '__main__':
     args = parser.parse_args()
     consume(args.profile, args.cgid, args.timeout, args.auto_commit, args.from_begin,
         args.count_only, args.duplicate, args.miss, args.dev, args.topic,
-        args.fields)
\ No newline at end of file
+        args.fields, args.latency, args.lat_source, args.lat_window,
+        args.max_id, args.eof, args.workers, args.seq, args.seq_window,
+        args.seq_expected)
\ No newline at end of file
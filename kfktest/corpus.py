@@ -0,0 +1,52 @@
+"""
+
+가짜 데이터 코퍼스 생성
+
+Faker 로 만든 값들을 시드 고정 Arrow IPC 파일로 저장해 두면, 인서터 / 프로듀서 /
+로거 프로세스들이 풀을 새로 만들지 않고 메모리 맵해 쓴다 (kfktest.fakepool).
+
+"""
+import os
+import time
+import argparse
+
+from kfktest.fakepool import write_corpus
+from kfktest.util import fake_corpus_path, linfo
+
+# CLI 용 파서
+parser = argparse.ArgumentParser(description="가짜 데이터 코퍼스 생성.",
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter
+)
+parser.add_argument('profile', type=str, help="프로파일 이름.")
+parser.add_argument('-s', '--size', type=int, default=100000, help="코퍼스 행수.")
+parser.add_argument('--seed', type=int, default=0, help="Faker 시드.")
+parser.add_argument('-f', '--force', action='store_true', default=False,
+    help="이미 있어도 다시 생성.")
+
+
+def build_corpus(profile,
+        size=parser.get_default('size'),
+        seed=parser.get_default('seed'),
+        force=parser.get_default('force')
+        ):
+    """프로파일별 가짜 데이터 코퍼스를 temp/{profile}/ 아래에 생성.
+
+    인서터/프로듀서/로거 프로세스들은 이 파일을 메모리 맵해 pid 별 구간을
+    샘플링하기에, 프로세스마다 Faker 로 풀을 만드는 시작 비용이 없어진다.
+    시드가 고정되어 있어 어느 노드에서 만들어도 같은 코퍼스가 된다.
+
+    """
+    path = fake_corpus_path(profile)
+    if os.path.isfile(path) and not force:
+        linfo(f"corpus {path} already exists.")
+        return path
+    linfo(f"[ ] build_corpus {path} with {size} rows")
+    st = time.time()
+    write_corpus(path, size, seed)
+    linfo(f"[v] build_corpus {path} with {size} rows in {time.time() - st:.1f} seconds")
+    return path
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    build_corpus(args.profile, args.size, args.seed, args.force)
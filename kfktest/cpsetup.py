@@ -1,7 +1,7 @@
 import os
 import argparse
 
-from kfktest.util import HOME, scp_to_remote, load_setup
+from kfktest.util import HOME, fanout_put, load_setup, fake_corpus_path
 
 # CLI 용 파서
 parser = argparse.ArgumentParser(description="인프라 정보 파일 원격으로 복사.",
@@ -19,10 +19,14 @@ def cp_setup(profile):
     else:
         targets = ['producer_public_ip', 'consumer_public_ip']
 
-    for target in targets:
-        ip = setup[target]['value']
-        src = os.path.join(HOME, f'temp/{profile}/setup.json')
-        scp_to_remote(src, ip, f'~/kfktest/temp/{profile}')
+    # 모든 노드에 동시에 복사
+    ips = [setup[target]['value'] for target in targets]
+    srcs = [os.path.join(HOME, f'temp/{profile}/setup.json')]
+    # 가짜 데이터 코퍼스가 있으면 함께 복사
+    corpus = fake_corpus_path(profile)
+    if os.path.isfile(corpus):
+        srcs.append(corpus)
+    return fanout_put(ips, srcs, f'~/kfktest/temp/{profile}')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,198 @@
+"""
+
+가짜 데이터 풀
+
+Faker 호출은 행당 6 번이고 호출 하나가 수십~수백 us 라 인서트/프로듀스 속도를
+제한한다. 컬럼별 값 풀을 한 번만 만들어 두고, 행과 배치는 인덱스 샘플링으로
+조립한다.
+
+"""
+import os
+from threading import Lock
+
+import numpy as np
+import pyarrow as pa
+from faker import Faker
+from faker.providers import internet, date_time, company, phone_number
+
+POOL_SIZE = 1000  # 컬럼별 풀 크기 (컬럼별 독립 샘플링이라 조합 수는 충분)
+FAKE_COLS = ['name', 'address', 'ip', 'birth', 'company', 'phone']
+CORPUS_WINDOW = 10000  # 코퍼스 이용시 프로세스별로 샘플링하는 행 범위
+
+# 프로세스별 공용 풀 (코퍼스 경로, pid 별)
+_pools = {}
+# 인서트 워커 쓰레드들이 동시에 풀을 만들지 않게
+_pools_lock = Lock()
+
+
+def _reset_after_fork():
+    """fork 된 자식 프로세스에서 풀의 난수 상태를 새로.
+
+    풀은 copy-on-write 로 그대로 쓰되, 부모와 같은 난수열로 같은 행들을
+    만들지 않게 한다. 다른 쓰레드가 잡고 있던 락도 새로 만든다.
+
+    """
+    global _pools_lock
+    _pools_lock = Lock()
+    for pool in _pools.values():
+        pool.rng = np.random.default_rng()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def reseed_pools(seed):
+    """프로세스 공용 풀들의 난수 상태를 seed 와 OS pid 로 새로.
+
+    fork 전에 만든 풀을 물려받은 워커들이 서로 다른 행을 만들게 워커 시작시 부른다.
+
+    """
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.rng = np.random.default_rng([seed, os.getpid()])
+
+
+def new_faker(seed=None):
+    """프로바이더가 추가된 Faker 생성."""
+    fake = Faker()
+    fake.add_provider(internet)
+    fake.add_provider(date_time)
+    fake.add_provider(company)
+    fake.add_provider(phone_number)
+    if seed is not None:
+        fake.seed_instance(seed)
+    return fake
+
+
+def build_columns(size=POOL_SIZE, seed=None):
+    """Faker 로 컬럼별 값 풀 생성.
+
+    Args:
+        size (int): 컬럼별 값 수
+        seed (int): Faker 시드. 기본값 None
+
+    Returns:
+        dict: 컬럼 이름별 값 배열 (NumPy object 배열)
+
+    """
+    fake = new_faker(seed)
+    gens = {
+        'name': fake.name,
+        'address': fake.address,
+        'ip': fake.ipv4_public,
+        'birth': fake.date,
+        'company': fake.company,
+        'phone': fake.phone_number,
+    }
+    columns = {}
+    for col in FAKE_COLS:
+        gen = gens[col]
+        columns[col] = np.array([gen() for _ in range(size)], dtype=object)
+    return columns
+
+
+class FakePool:
+    """컬럼별 값 풀에서 인덱스 샘플링으로 가짜 행 생성.
+
+    컬럼은 NumPy 배열 또는 pyarrow 배열 (메모리 맵된 코퍼스) 모두 가능.
+
+    """
+
+    def __init__(self, columns, seed=None):
+        self.columns = columns
+        self.size = len(columns[FAKE_COLS[0]])
+        self.rng = np.random.default_rng(seed)
+
+    def _take(self, col, idx):
+        values = self.columns[col]
+        if isinstance(values, (pa.Array, pa.ChunkedArray)):
+            return values.take(idx).to_pylist()
+        return values[idx].tolist()
+
+    def sample(self, count):
+        """count 개 행의 값을 컬럼별 리스트로 샘플링.
+
+        Returns:
+            list: FAKE_COLS 순서의 컬럼별 값 리스트
+
+        """
+        idx = self.rng.integers(0, self.size, (len(FAKE_COLS), count))
+        return [self._take(col, idx[i]) for i, col in enumerate(FAKE_COLS)]
+
+    def rows(self, count, *prefix):
+        """count 개 행을 튜플 리스트로 샘플링.
+
+        Args:
+            count (int): 행 수
+            prefix: 각 행 앞에 붙일 컬럼들. 스칼라는 모든 행에 반복되고,
+                시퀀스는 행별 값으로 쓰인다.
+
+        Returns:
+            list: (*prefix, name, address, ip, birth, company, phone) 튜플 리스트
+
+        """
+        heads = [p if isinstance(p, (list, tuple, range, np.ndarray))
+                 else [p] * count for p in prefix]
+        return list(zip(*heads, *self.sample(count)))
+
+
+def write_corpus(path, size, seed=0):
+    """시드 고정된 가짜 데이터 코퍼스를 Arrow IPC 파일로 저장.
+
+    Args:
+        path (str): 저장할 파일 경로
+        size (int): 코퍼스 행수
+        seed (int): Faker 시드. 기본값 0
+
+    """
+    columns = build_columns(size, seed)
+    table = pa.table({col: pa.array(columns[col], pa.string())
+                      for col in FAKE_COLS})
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # 다른 프로세스가 쓰는 도중의 파일을 읽지 않게
+    tmp = f'{path}.tmp'
+    with pa.OSFile(tmp, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            # 하나의 레코드 배치로 써야 컬럼이 청크로 나뉘지 않는다
+            writer.write_table(table, max_chunksize=size)
+    os.replace(tmp, path)
+
+
+def load_corpus(path, pid=0, window=CORPUS_WINDOW):
+    """코퍼스 파일을 메모리 맵하고 pid 별 구간을 잘라 반환.
+
+    복사 없이 페이지 캐시를 공유하기에 여러 프로세스가 떠도 메모리를 따로 쓰지 않는다.
+
+    Returns:
+        dict: 컬럼 이름별 pyarrow 배열
+
+    """
+    source = pa.memory_map(path, 'r')
+    table = pa.ipc.open_file(source).read_all()
+    size = table.num_rows
+    window = min(window, size)
+    offset = (pid * window) % (size - window + 1)
+    table = table.slice(offset, window)
+    return {col: table.column(col) for col in FAKE_COLS}
+
+
+def get_fake_pool(corpus=None, pid=0):
+    """프로세스 공용 가짜 데이터 풀 (최초 호출시 생성).
+
+    Args:
+        corpus (str): 코퍼스 파일 경로. 파일이 있으면 메모리 맵해 이용하고,
+            없으면 Faker 로 풀을 생성. 기본값 None
+        pid (int): 코퍼스에서 구간을 나눌 프로세스 ID
+
+    """
+    if corpus is None or not os.path.isfile(corpus):
+        key = None
+    else:
+        key = (corpus, pid)
+    with _pools_lock:
+        if key not in _pools:
+            if key is None:
+                _pools[key] = FakePool(build_columns())
+            else:
+                _pools[key] = FakePool(load_corpus(corpus, pid))
+        return _pools[key]
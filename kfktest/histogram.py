@@ -0,0 +1,98 @@
+"""
+
+지연 시간 히스토그램
+
+값을 모두 저장하지 않고 로그 스케일 버킷의 카운트 배열에만 기록하기에,
+기록 수와 상관없이 메모리가 일정하고 프로세스간 병합이 쉽다.
+
+"""
+import math
+
+import numpy as np
+
+PERCENTILES = [50, 90, 99]
+
+
+class Histogram:
+    """로그 스케일 버킷의 배열 기반 히스토그램.
+
+    버킷 경계는 min_value * (1 + precision) ** i 이고, 백분위 값은 해당 버킷의
+    상한으로 보고하기에 상대 오차는 precision 이내.
+
+    Args:
+        min_value (float): 구분할 최소값. 이하 값은 첫 버킷에 들어감. 기본값 0.01
+        max_value (float): 구분할 최대값. 이상 값은 마지막 버킷에 들어감.
+            기본값 1 시간 (ms 단위 기준)
+        precision (float): 버킷의 상대 폭. 기본값 0.01 (1%)
+
+    """
+
+    def __init__(self, min_value=0.01, max_value=3600 * 1000, precision=0.01):
+        self.min_value = min_value
+        self.max_value = max_value
+        self.log_ratio = math.log1p(precision)
+        self.counts = np.zeros(self._index(max_value) + 1, dtype=np.int64)
+        self.total = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def _index(self, value):
+        if value <= self.min_value:
+            return 0
+        return int(math.ceil(math.log(value / self.min_value) / self.log_ratio))
+
+    def _bound(self, idx):
+        return self.min_value * math.exp(idx * self.log_ratio)
+
+    def record(self, value):
+        """값 하나 기록."""
+        idx = min(self._index(value), len(self.counts) - 1)
+        self.counts[idx] += 1
+        self.total += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def record_many(self, values):
+        """값 배열을 한 번에 기록."""
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return
+        clipped = np.maximum(values, self.min_value)
+        idx = np.ceil(np.log(clipped / self.min_value) / self.log_ratio)
+        idx = np.minimum(idx, len(self.counts) - 1).astype(np.int64)
+        self.counts += np.bincount(idx, minlength=len(self.counts))
+        self.total += len(values)
+        self.sum += float(values.sum())
+        self.max = max(self.max, float(values.max()))
+
+    def merge(self, other):
+        """같은 설정의 다른 히스토그램을 합침."""
+        assert len(self.counts) == len(other.counts)
+        self.counts += other.counts
+        self.total += other.total
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+        return self
+
+    def percentile(self, q):
+        """q 백분위 값 (버킷 상한, 최대값을 넘지 않음)."""
+        if self.total == 0:
+            return 0.0
+        rank = max(1, int(math.ceil(self.total * q / 100.0)))
+        idx = int(np.searchsorted(np.cumsum(self.counts), rank))
+        return min(self._bound(idx), self.max)
+
+    def summary(self):
+        """기록 수, 평균, 백분위, 최대값 dict."""
+        res = {'count': self.total,
+               'mean': self.sum / self.total if self.total > 0 else 0.0}
+        for q in PERCENTILES:
+            res[f'p{q}'] = self.percentile(q)
+        res['max'] = self.max
+        return res
+
+    def __str__(self):
+        smr = self.summary()
+        pcts = ' '.join([f'p{q} {smr[f"p{q}"]:.1f}' for q in PERCENTILES])
+        return f"count {smr['count']} mean {smr['mean']:.1f} {pcts} max {smr['max']:.1f}"
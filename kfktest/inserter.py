@@ -5,11 +5,14 @@ import random
 import argparse
 import json
 from multiprocessing import Process
+from concurrent.futures import ThreadPoolExecutor
 
-import pymssql
-from mysql.connector import connect
+from kfktest.util import insert_fake, load_setup, DB_BATCH, DB_EPOCH, linfo, \
+    INSERT_MODES, db_connect, db_release
+from kfktest.histogram import Histogram
 
-from kfktest.util import insert_fake, load_setup, DB_BATCH, DB_EPOCH, linfo
+# 배치별로 기록하는 지연 시간 종류 (insert_fake 참고)
+LAT_KINDS = ['write', 'commit', 'response']
 
 # CLI 용 파서
 parser = argparse.ArgumentParser(description="DB 에 가짜 데이터 인서트.",
@@ -30,6 +33,13 @@ parser.add_argument('--dt', type=str, default=None, help="지정된 일시로 
 parser.add_argument('--db-host', type=str, help="외부 MySQL DB 주소.")
 parser.add_argument('--db-user', type=str, help="외부 MySQL DB 유저.")
 parser.add_argument('--db-passwd', type=str, help="외부 MySQL DB 암호.")
+parser.add_argument('--mode', type=str, choices=INSERT_MODES, default='many',
+    help="인서트 방식. many: executemany, values: multi-row VALUES, "
+    "bulk: 벌크 로드 (MySQL 은 LOAD DATA LOCAL INFILE, MSSQL 은 BCP).")
+parser.add_argument('--rate', type=float, default=None,
+    help="초당 목표 행수. 지정하면 고정된 시간표로 배치를 보내는 open-loop 방식.")
+parser.add_argument('-w', '--workers', type=int, default=1,
+    help="한 프로세스에서 띄울 인서트 워커 (쓰레드) 수. 워커별 pid 는 pid, pid + 1, ...")
 
 
 def insert(db_type,
@@ -45,7 +55,9 @@ def insert(db_type,
         show=False,
         db_host=None,
         db_user=None,
-        db_passwd=None
+        db_passwd=None,
+        mode=parser.get_default('mode'),
+        rate=parser.get_default('rate')
         ):
     """가짜 데이터 인서트.
 
@@ -66,6 +78,12 @@ def insert(db_type,
         db_host (str): 외부 DB 주소
         db_user (str): 외부 DB 유저
         db_passwd (str): 외부 DB 암호
+        mode (str): 인서트 방식. many, values, bulk 중 하나. 기본값 many
+        rate (float): 초당 목표 행수. 기본값 None (최대 속도)
+
+    배치별 쓰기/커밋/응답 지연 시간을 히스토그램으로 기록해 백분위로 출력한다.
+    rate 를 올려가며 response 지연이 커지기 시작하는 지점이 커밋이 밀리는 속도.
+
     """
     # 프로세스간 commit 이 몰리지 않게
     time.sleep(random.random() * delay)
@@ -82,39 +100,106 @@ def insert(db_type,
         db_passwd = setup['db_passwd']['value']['result']
 
     linfo(f"Inserter {pid} connect DB at {db_host}")
-    if db_type == 'mysql':
-        conn = connect(host=db_host, user=db_user, password=db_passwd, db=db_name)
-    else:
-        conn = pymssql.connect(host=db_host, user=db_user, password=db_passwd, database=db_name)
+    # MySQL bulk 모드는 LOAD DATA LOCAL INFILE 을 쓰기에 클라이언트에서 허용 필요
+    conn = db_connect(db_type, db_host, db_user, db_passwd, db_name,
+        local_infile=db_type == 'mysql' and mode == 'bulk')
     cursor = conn.cursor()
     linfo("Connect done.")
 
+    lats = {kind: Histogram() for kind in LAT_KINDS}
     st = time.time()
-    insert_fake(conn, cursor, epoch, batch, pid, db_type, table=table, dt=dt, show=show)
-    conn.close()
+    insert_fake(conn, cursor, epoch, batch, pid, db_type, table=table, dt=dt, show=show,
+        mode=mode, rate=rate, lats=lats)
+    db_release(conn)
 
     elapsed = time.time() - st
     vel = epoch * batch / elapsed
     if not no_result:
         linfo(f"Inserter {pid} inserted {batch * epoch} rows. {int(vel)} rows per seconds with batch of {batch}.")
+        if rate is not None:
+            linfo(f"Inserter {pid} target rate {int(rate)} rows/sec with batch of {batch}.")
+        for kind in LAT_KINDS:
+            linfo(f"Inserter {pid} {kind} latency (ms): {lats[kind]}")
+    return lats
+
+
+def insert_workers(db_type, workers,
+        db_name=parser.get_default('db_name'),
+        table=parser.get_default('table'),
+        epoch=parser.get_default('epoch'),
+        batch=parser.get_default('batch'),
+        pid=parser.get_default('pid'),
+        dev=parser.get_default('devs'),
+        no_result=parser.get_default('no_result'),
+        delay=0,
+        dt=None,
+        show=False,
+        db_host=None,
+        db_user=None,
+        db_passwd=None,
+        mode=parser.get_default('mode'),
+        rate=parser.get_default('rate')
+        ):
+    """한 프로세스 안에서 여러 인서트 워커를 쓰레드로 실행.
+
+    - 워커마다 자기 DB 커넥션을 쓰고, pid 는 pid 부터 1 씩 증가
+    - DB 드라이버는 I/O 중 GIL 을 놓기에 쓰레드로도 동시 인서트가 된다
+    - 원격 인서트시 노드당 하나의 SSH 세션과 인터프리터로 충분해
+      sshd 세션 수 제한 없이 워커 수를 늘릴 수 있다
+
+    Args:
+        workers (int): 워커 수
+        나머지는 insert 와 같음
+
+    Returns:
+        list: 워커별 지연 시간 히스토그램 dict
+
+    """
+    if workers == 1:
+        return [insert(db_type, db_name, table, epoch, batch, pid, dev,
+            no_result, delay, dt, show, db_host, db_user, db_passwd, mode, rate)]
+
+    st = time.time()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futs = [pool.submit(insert, db_type, db_name, table, epoch, batch,
+                            pid + k, dev, no_result, delay, dt, show, db_host,
+                            db_user, db_passwd, mode, rate)
+                for k in range(workers)]
+        results = [fut.result() for fut in futs]
+
+    elapsed = time.time() - st
+    vel = workers * epoch * batch / elapsed
+    if not no_result:
+        lats = {kind: Histogram() for kind in LAT_KINDS}
+        for res in results:
+            for kind in LAT_KINDS:
+                lats[kind].merge(res[kind])
+        # merge.py 가 워커별 결과만 모으도록 "rows per seconds" 를 쓰지 않음
+        linfo(f"Inserter workers {pid}-{pid + workers - 1} inserted {workers * batch * epoch} rows. total {int(vel)} rows/sec.")
+        for kind in LAT_KINDS:
+            linfo(f"Inserter workers {kind} latency (ms): {lats[kind]}")
+    return results
 
 
 if __name__ == '__main__':
     args = parser.parse_args()
     tables = [tbl.strip() for tbl in args.table.split(',')]
     if len(tables) == 1:
-        insert(args.db_type, args.db_name, args.table, args.epoch, args.batch,
-            args.pid, args.dev, args.no_result, args.delay, args.dt, False,
-            args.db_host, args.db_user, args.db_passwd)
+        insert_workers(args.db_type, args.workers, args.db_name, args.table,
+            args.epoch, args.batch, args.pid, args.dev, args.no_result,
+            args.delay, args.dt, False, args.db_host, args.db_user,
+            args.db_passwd, args.mode, args.rate)
     else:
         # 테이블이 하나 이상 지정되면 병렬 처리
         procs = []
         for table in tables:
-            p = Process(target=insert, args=(args.db_type, args.db_name,
+            p = Process(target=insert_workers, args=(args.db_type, args.workers,
+                                             args.db_name,
                                              table, args.epoch, args.batch,
                                              args.pid, args.dev, args.no_result,
                                              args.delay, args.dt, False,
-                                             args.db_host, args.db_user, args.db_passwd
+                                             args.db_host, args.db_user, args.db_passwd,
+                                             args.mode, args.rate
                                              ))
             procs.append(p)
             p.start()
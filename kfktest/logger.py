@@ -13,6 +13,9 @@ parser = argparse.ArgumentParser(description="대상 파일에 가짜 로그 생
 parser.add_argument('dest_file', type=str)
 parser.add_argument('-m', '--messages', type=int, default=10000, help="생성할 메시지 수.")
 parser.add_argument('-l', '--latency', type=int, default=None, help="메시지당 지연 시간 (ms)")
+parser.add_argument('-p', '--profile', type=str, default=None,
+    help="가짜 데이터 코퍼스를 찾을 프로파일 이름.")
+parser.add_argument('--pid', type=int, default=0, help="코퍼스 구간을 나눌 로거 ID.")
 
 #----------------------------------------------------------------------
 def create_rotating_log(path):
@@ -32,13 +35,19 @@ def create_rotating_log(path):
 def logger(
         dest_file,
         messages=parser.get_default('messages'),
-        latency=parser.get_default('latency')
+        latency=parser.get_default('latency'),
+        profile=parser.get_default('profile'),
+        pid=parser.get_default('pid')
         ):
-    """대상 파일에 가짜 로그 생성."""
+    """대상 파일에 가짜 로그 생성.
+
+    profile 의 코퍼스가 있으면 메모리 맵해 pid 별 구간에서 샘플링한다.
+
+    """
     linfo(f"[ ] logger produces {messages} messages to {dest_file}.")
     log = create_rotating_log(dest_file)
     st = time.time()
-    for i, data in enumerate(gen_fake_data(messages)):
+    for i, data in enumerate(gen_fake_data(messages, profile=profile, pid=pid)):
         log.info(json.dumps(data))
         if (i + 1) % 500 == 0:
             linfo(f"gen {i + 1} th fake data")
@@ -52,4 +61,4 @@ def logger(
 
 if __name__ == '__main__':
     args = parser.parse_args()
-    logger(args.dest_file, args.messages, args.latency)
\ No newline at end of file
+    logger(args.dest_file, args.messages, args.latency, args.profile, args.pid)
\ No newline at end of file
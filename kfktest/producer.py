@@ -2,6 +2,9 @@ import time
 import json
 import argparse
 import socket
+import heapq
+import multiprocessing
+from itertools import count
 from random import random
 
 from confluent_kafka import Producer
@@ -10,8 +13,10 @@ from confluent_kafka import Producer
 from faker import Faker
 from faker.providers import internet, date_time, company, phone_number
 
-from kfktest.util import (get_kafka_ssh, load_setup, linfo, gen_fake_data
+from kfktest.util import (get_kafka_ssh, load_setup, linfo, gen_fake_data,
+    fake_pool, collect_workers
 )
+from kfktest.fakepool import reseed_pools
 
 # CLI 용 파서
 parser = argparse.ArgumentParser(description="프로파일에 맞는 토픽에 레코드 생성.",
@@ -19,7 +24,7 @@ parser = argparse.ArgumentParser(description="프로파일에 맞는 토픽에 
 )
 parser.add_argument('profile', type=str, help="프로파일 이름 (. 이 있으면 도메인/IP 로 해석).")
 parser.add_argument('-m', '--messages', type=int, default=10000, help="생성할 메시지 수.")
-parser.add_argument('--acks', type=int, default=1, help="전송 완료에 필요한 승인 수.")
+parser.add_argument('--acks', type=int, default=1, help="전송 완료에 필요한 승인 수 (-1 이면 all).")
 parser.add_argument('-c', '--compress', type=str,
     choices=['none', 'gzip', 'snappy', 'lz4'], default='none', help="데이터 압축 방식.")
 parser.add_argument('-p', '--pid', type=int, default=0, help="셀렉트 프로세스 ID.")
@@ -33,6 +38,15 @@ parser.add_argument('-t', '--topic', type=str, default=None, help="명시적 토
 parser.add_argument('--with_key', action='store_true', default=False, help="메시지 키 생성.")
 parser.add_argument('--with_ts', action='store_true', default=False, help="메시지 타임스탬프 생성.")
 parser.add_argument('--dt', type=str, default=None, help="지정된 일시로 메시지 생성.")
+parser.add_argument('--linger-ms', type=int, default=5, help="배치를 모으기 위해 기다리는 시간 (ms).")
+parser.add_argument('--batch-size', type=int, default=1000000, help="파티션별 배치 최대 크기 (bytes).")
+parser.add_argument('--queue-max', type=int, default=100000, help="로컬 전송 큐 최대 메시지 수.")
+parser.add_argument('--flush-every', type=int, default=0,
+    help="지정한 메시지 수마다 flush (0 이면 하지 않음). flush 는 큐를 비워 배치를 깬다.")
+parser.add_argument('-w', '--workers', type=int, default=1,
+    help="fork 할 프로듀서 워커 프로세스 수. 워커별 pid 는 pid, pid + 1, ...")
+parser.add_argument('--pin-partitions', action='store_true', default=False,
+    help="워커 k 는 k 번째 파티션으로만 전송.")
 
 #
 # 브로커가 없을 때 조용히 전송 메시지를 손실하는 문제
@@ -63,24 +77,63 @@ parser.add_argument('--dt', type=str, default=None, help="지정된 일시로 
 #         self.pending_futures = []
 
 
-def delivery_report(err, msg):
-    """ Called once for each message produced to indicate delivery result.
-        Triggered by poll() or flush(). """
-    if err is not None:
-        print('Message delivery failed: {}'.format(err))
-    # else:
-    #     print('Message delivered to {} [{}]'.format(msg.topic(), msg.partition()))
+class DeliveryReport:
+    """전송 결과 콜백. 전송 성공/실패 수를 센다.
 
+    produce() 된 메시지마다 poll() 또는 flush() 에서 한 번씩 불린다.
+    브로커가 죽으면 메시지마다 실패하기에 첫 에러만 로깅하고 나머지는 센다.
 
-def send(prod, topic, pid, _data, with_key):
+    """
+
+    def __init__(self):
+        self.delivered = 0
+        self.failed = 0
+        self.first_error = None
+
+    def __call__(self, err, msg):
+        if err is not None:
+            self.failed += 1
+            if self.first_error is None:
+                self.first_error = err
+                linfo(f"Message delivery failed: {err}")
+        else:
+            self.delivered += 1
+
+
+def send(prod, topic, pid, _data, with_key, report, partition=None):
+    data = json.dumps(_data).encode()
+    key = f"{pid}-{_data['id']}".encode() if with_key else None
+    # librdkafka 는 -1 (RD_KAFKA_PARTITION_UA) 이면 파티셔너로 정함
+    partition = -1 if partition is None else partition
+    while True:
+        try:
+            prod.produce(topic, data, key=key, partition=partition,
+                callback=report)
+            break
+        except BufferError:
+            # 로컬 큐가 차면 flush 대신 전송 결과를 처리하며 자리가 나길 기다림
+            prod.poll(0.1)
     # Trigger any available delivery report callbacks from previous produce() calls
     prod.poll(0)
-    data = json.dumps(_data).encode()
-    if with_key:
-        key = f"{pid}-{_data['id']}".encode()
-        prod.produce(topic, data, key=key, callback=delivery_report)
-    else:
-        prod.produce(topic, data, callback=delivery_report)
+
+
+def release_delayed(prod, topic, pid, pending, with_key, report, now,
+        partition=None):
+    """예정 시간이 된 지연/중복 메시지를 전송.
+
+    Args:
+        pending (list): (예정 시간, 순번, 메시지) 의 heapq 힙
+
+    Returns:
+        int: 전송한 메시지 수
+
+    """
+    sent = 0
+    while len(pending) > 0 and pending[0][0] <= now:
+        _, _, data = heapq.heappop(pending)
+        send(prod, topic, pid, data, with_key, report, partition)
+        sent += 1
+    return sent
 
 
 def produce(profile,
@@ -96,16 +149,25 @@ def produce(profile,
         etopic=parser.get_default('topic'),
         with_key=parser.get_default('with_key'),
         with_ts=parser.get_default('with_ts'),
-        dt=parser.get_default('dt')
+        dt=parser.get_default('dt'),
+        linger_ms=parser.get_default('linger_ms'),
+        batch_size=parser.get_default('batch_size'),
+        queue_max=parser.get_default('queue_max'),
+        flush_every=parser.get_default('flush_every'),
+        partition=None
         ):
     """Fake 레코드 전송.
 
     - 대상 토픽은 미리 존재하거나 브로커 설정에서 auto.create.topics.enable=true 여야 한다.
     - linger_ms 가 있으면 전송 속도가 빨라진다.
-    - 기본 구현은 브로커가 죽어도 전송시 예외 발생 않기에 SafeKafkaProducer 이용
-    - 이따금씩 flush 를 명시적으로 불러주면 속도 많이 느려지지 않고 (~5%) 예외 확인 가능
-        - 브로커 다운시에는 retry 탓인지 느려짐
+    - 브로커가 죽어도 전송시 예외가 발생하지 않기에, 전송 결과 콜백으로 성공/실패를 센다.
+        - 속도는 전송 확인된 메시지 수 기준
         - retry 를 해도 메시지 손실이 발생할 수 있으나, 안하는 것보다는 작은 손실
+    - flush 는 librdkafka 큐를 비워 배치를 깨기에 기본은 하지 않는다 (flush_every).
+        로컬 큐가 차면 poll 하며 기다린다.
+    - partition 이 주어지면 (파티션 수로 나눈 나머지) 해당 파티션으로만 전송.
+    - 지연/중복 메시지는 예정 시간 기준 힙에 넣어 두었다가 시간이 되면 전송.
+        그 사이의 메시지는 쉬지 않고 전송하고, 마지막에 남은 것은 예정 시간까지 기다려 전송
 
     """
     if '.' not in profile:
@@ -125,9 +187,20 @@ def produce(profile,
     conf = {
         'bootstrap.servers': f'{addr}',
         'client.id': socket.gethostname(),
-        'compression.codec': compress
+        'compression.codec': compress,
+        'acks': acks,
+        'linger.ms': linger_ms,
+        'batch.size': batch_size,
+        'queue.buffering.max.messages': queue_max,
         }
     prod = Producer(conf)
+    if partition is not None:
+        meta = prod.list_topics(topic, timeout=10).topics.get(topic)
+        if meta is None or meta.error is not None or len(meta.partitions) == 0:
+            err = None if meta is None else meta.error
+            raise RuntimeError(f"No partitions for topic {topic}: {err}")
+        partition %= len(meta.partitions)
+        linfo(f"producer {pid} pinned to partition {partition}")
     # prod = SafeKafkaProducer(
     #     acks=acks,
     #     compression_type=compress,
@@ -135,63 +208,124 @@ def produce(profile,
     #     value_serializer=lambda x: json.dumps(x).encode('utf-8'),
     #     )
 
+    report = DeliveryReport()
     st = time.time()
-    dup_msgs = []
-    dup_times = []
-    lag_msgs = []
-    lag_times = []
-    for i, data in enumerate(gen_fake_data(messages, with_ts)):
+    # (예정 시간, 순번, 메시지). 순번은 같은 시간일 때 dict 비교를 피하고 순서 유지
+    pending = []
+    seq = count()
+    for i, data in enumerate(gen_fake_data(messages, with_ts, profile, pid)):
         if dt is not None:
             data['regdt'] = dt
 
         if (i + 1) % 500 == 0:
             linfo(f"gen {i + 1} th fake data")
+        if flush_every > 0 and (i + 1) % flush_every == 0:
             prod.flush()
 
         lagged = False
+        now = time.time()
         if duprate > 0 and random() <= duprate:
             # 중복 메시지 발생
-            dup_msgs.append(data)
-            dup_times.append(time.time())
+            heapq.heappush(pending, (now + dupdelay, next(seq), data))
         elif lagrate > 0 and random() <= lagrate:
             # 지연 메시지 발생
-            lag_msgs.append(data)
-            lag_times.append(time.time())
+            heapq.heappush(pending, (now + lagdelay, next(seq), data))
             lagged = True
         if not lagged:
-            send(prod, topic, pid, data, with_key)
+            send(prod, topic, pid, data, with_key, report, partition)
 
         # 지연/중복 메시지 발행
-        now = time.time()
-        sents = []
-        for i, msg in enumerate(lag_msgs):
-            if now - lag_times[i] >= lagdelay:
-                send(prod, topic, pid, data, with_key)
-                sents.append(i)
-        for i in sents:
-            del lag_msgs[i]
-            del lag_times[i]
-
-        sents = []
-        for i, msg in enumerate(dup_msgs):
-            if now - dup_times[i] >= dupdelay:
-                send(prod, topic, pid, data, with_key)
-                sents.append(i)
-        for i in sents:
-            del dup_msgs[i]
-            del dup_times[i]
-
-        # 중복 / 지연이 설정된 경우는 메시지 천천히 발행 (순차적 시간 확인)
-        if duprate > 0 or lagrate > 0:
-            time.sleep(0.1)
-
-    prod.flush()
-    vel = messages / (time.time() - st)
-    linfo(f"[v] producer {pid} produces {messages} messages to {topic}. {int(vel)} rows per seconds.")
+        release_delayed(prod, topic, pid, pending, with_key, report, now,
+            partition)
+
+    # 남은 지연/중복 메시지는 예정 시간까지 기다려 발행
+    while len(pending) > 0:
+        wait = pending[0][0] - time.time()
+        if wait > 0:
+            prod.poll(wait)
+        release_delayed(prod, topic, pid, pending, with_key, report,
+            time.time(), partition)
+
+    remain = prod.flush()
+    elapsed = time.time() - st
+    vel = report.delivered / elapsed
+    if report.failed > 0:
+        linfo(f"producer {pid} failed to deliver {report.failed} messages. first error: {report.first_error}")
+    linfo(f"[v] producer {pid} produces {messages} messages to {topic}. delivered {report.delivered}, failed {report.failed}, remain {remain}. {int(vel)} rows per seconds.")
+    return dict(delivered=report.delivered, failed=report.failed, elapsed=elapsed)
+
+
+def _produce_worker(q, k, profile, kwargs):
+    # fork 전에 만든 풀의 난수 상태를 워커별로 (같은 페이로드를 만들지 않게)
+    reseed_pools(kwargs['pid'])
+    try:
+        q.put((k, True, produce(profile, **kwargs)))
+    except Exception as e:
+        q.put((k, False, f'{type(e).__name__}: {e}'))
+
+
+def produce_workers(profile, workers,
+        pid=parser.get_default('pid'),
+        pin_partitions=parser.get_default('pin_partitions'),
+        start_method='fork',
+        **kwargs
+        ):
+    """프로듀서 워커 프로세스들을 띄워 병렬로 전송.
+
+    - fork 면 가짜 데이터 풀을 fork 전에 만들어 워커들이 copy-on-write 로 공유
+        (워커마다 Faker 설정이나 인터프리터 기동 비용이 없다). 난수 상태는 워커마다
+        pid 로 새로 시드해 서로 다른 페이로드를 만든다
+    - 쓰레드가 도는 프로세스 (kfktest.agent) 에서 fork 하면 다른 쓰레드가 쥔 락을
+        물려받아 교착될 수 있기에 start_method 로 forkserver / spawn 을 쓴다
+    - 워커 k 의 pid 는 pid + k, pin_partitions 이면 k 번째 파티션으로만 전송
+    - 워커별 전송 확인 수를 모아 전체 속도를 출력
+    - 워커가 실패하거나 결과 없이 죽으면 나머지 워커를 끝내고 예외를 낸다
+
+    Args:
+        profile (str): 프로파일 이름
+        workers (int): 워커 수
+        pid (int): 첫 워커의 pid
+        pin_partitions (bool): 워커별 파티션 고정 여부
+        start_method (str): 워커 프로세스 시작 방식 (fork, forkserver, spawn)
+        kwargs: produce 에 전달할 인자
+
+    Returns:
+        dict: 전체 전송 성공/실패 수와 경과 시간
+
+    """
+    if workers == 1:
+        partition = 0 if pin_partitions else None
+        return produce(profile, pid=pid, partition=partition, **kwargs)
+
+    if start_method == 'fork':
+        fake_pool(profile, pid)
+    ctx = multiprocessing.get_context(start_method)
+    q = ctx.Queue()
+    procs = []
+    st = time.time()
+    for k in range(workers):
+        wkwargs = dict(kwargs, pid=pid + k,
+            partition=k if pin_partitions else None)
+        p = ctx.Process(target=_produce_worker, args=(q, k, profile, wkwargs))
+        p.start()
+        procs.append(p)
+
+    results = collect_workers(q, procs)
+    elapsed = time.time() - st
+
+    delivered = sum(res['delivered'] for res in results.values())
+    failed = sum(res['failed'] for res in results.values())
+    vel = delivered / elapsed
+    linfo(f"[v] producer workers {pid}-{pid + workers - 1} delivered {delivered}, failed {failed}. total {int(vel)} rows/sec.")
+    return dict(delivered=delivered, failed=failed, elapsed=elapsed)
 
 
 if __name__ == '__main__':
     args = parser.parse_args()
-    produce(args.profile, args.messages, args.acks, args.compress, args.pid,
-        args.dev, args.lagrate, args.lagdelay, args.duprate, args.dupdelay,
-        args.topic, args.with_key, args.with_ts, args.dt)
+    produce_workers(args.profile, args.workers, args.pid, args.pin_partitions,
+        messages=args.messages, acks=args.acks, compress=args.compress,
+        dev=args.dev, lagrate=args.lagrate, lagdelay=args.lagdelay,
+        duprate=args.duprate, dupdelay=args.dupdelay, etopic=args.topic,
+        with_key=args.with_key, with_ts=args.with_ts, dt=args.dt,
+        linger_ms=args.linger_ms, batch_size=args.batch_size,
+        queue_max=args.queue_max, flush_every=args.flush_every)
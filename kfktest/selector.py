@@ -1,13 +1,20 @@
 import time
 import io
+import random
 import json
 from pathlib import Path
 import argparse
 
-import pymssql
-from mysql.connector import connect
+from kfktest.util import load_setup, count_rows, max_row_id, linfo, \
+    COUNT_MODES, db_connect, db_release
 
-from kfktest.util import load_setup, count_rows, linfo
+# 셀렉트 패턴
+#   legacy: 전체 정렬 (MySQL ORDER BY pid, sid DESC / MSSQL ORDER BY newid())
+#   point: id 범위 안의 임의 id 들로 포인트 조회
+#   range: 마지막으로 읽은 id 다음부터 키셋 범위 스캔
+#   sample: MSSQL 은 TABLESAMPLE, MySQL 은 id 를 일정 간격으로 뽑아 표본 조회
+# legacy 외에는 테이블 크기와 무관하게 batch 에 비례하는 비용
+SELECT_PATTERNS = ['legacy', 'point', 'range', 'sample']
 
 # CLI 용 파서
 parser = argparse.ArgumentParser(description="DB 에서 데이터 셀렉트.",
@@ -19,12 +26,101 @@ parser.add_argument('-b', '--batch', type=int, default=1000, help="한 번에 se
 parser.add_argument('-p', '--pid', type=int, default=0, help="셀렉트 프로세스 ID.")
 parser.add_argument('-d', '--dev', action='store_true', default=False,
     help="개발 PC 에서 실행.")
+parser.add_argument('--pattern', type=str, default='point,range,sample',
+    help=f"셀렉트 패턴. 하나 이상인 경우 ',' 로 구분해 번갈아 실행. ({', '.join(SELECT_PATTERNS)})")
+parser.add_argument('--count-mode', type=str, choices=COUNT_MODES, default='maxid',
+    help="인서트가 끝났는지 보기 위해 행수를 얻는 방식 (count_rows 참고). meta 는 근사값이라 권장하지 않음.")
+
+
+def _person(db_type):
+    return 'person' if db_type == 'mysql' else '[test].[dbo].[person]'
+
+
+def _select_ids(db_type, cursor, ids):
+    """id 목록으로 포인트 조회."""
+    if len(ids) == 0:
+        return 0
+    marks = ', '.join(['%s'] * len(ids))
+    cursor.execute(f"SELECT * FROM {_person(db_type)} WHERE id IN ({marks})",
+        tuple(ids))
+    return len(cursor.fetchall())
+
+
+def select_legacy(db_type, cursor, batch, state):
+    """전체 정렬 후 batch 행 (테이블 크기에 비례하는 비용)."""
+    if db_type == 'mysql':
+        sql = f'''
+            SELECT * FROM (
+                SELECT * FROM person ORDER BY pid, sid DESC LIMIT {batch}
+            ) sub
+            '''
+    else:
+        sql = f'''
+            SELECT TOP {batch} *
+            FROM [test].[dbo].[person]
+            ORDER BY newid()
+            '''
+    cursor.execute(sql)
+    return len(cursor.fetchall())
+
+
+def select_point(db_type, cursor, batch, state):
+    """1 ~ 최대 id 사이 임의 id 들로 포인트 조회."""
+    max_id = state['max_id']
+    if max_id == 0:
+        return 0
+    ids = random.sample(range(1, max_id + 1), min(batch, max_id))
+    return _select_ids(db_type, cursor, ids)
+
+
+def select_range(db_type, cursor, batch, state):
+    """마지막으로 읽은 id 다음부터 batch 행 키셋 스캔. 끝에 닿으면 처음부터."""
+    last_id = state.get('last_id', 0)
+    if db_type == 'mysql':
+        sql = f"SELECT * FROM person WHERE id > %s ORDER BY id LIMIT {batch}"
+    else:
+        sql = f"SELECT TOP {batch} * FROM [test].[dbo].[person] WHERE id > %s ORDER BY id"
+    cursor.execute(sql, (last_id,))
+    rows = cursor.fetchall()
+    # id 는 첫 컬럼
+    state['last_id'] = rows[-1][0] if len(rows) == batch else 0
+    return len(rows)
+
+
+def select_sample(db_type, cursor, batch, state):
+    """테이블 전체에 걸친 표본 batch 행 조회."""
+    max_id = state['max_id']
+    if max_id == 0:
+        return 0
+    if db_type == 'mssql':
+        # 페이지 단위 샘플링이라 행수는 대략적
+        pct = min(100.0, 100.0 * batch / max_id)
+        cursor.execute(f'''
+            SELECT TOP {batch} *
+            FROM [test].[dbo].[person] TABLESAMPLE SYSTEM ({pct:.6f} PERCENT)
+            ''')
+        return len(cursor.fetchall())
+    # MySQL 은 TABLESAMPLE 이 없어 임의 시작점에서 일정 간격의 id 들로
+    stride = max(1, max_id // batch)
+    start = random.randint(1, stride)
+    ids = list(range(start, max_id + 1, stride))[:batch]
+    return _select_ids(db_type, cursor, ids)
+
+
+SELECTORS = {
+    'legacy': select_legacy,
+    'point': select_point,
+    'range': select_range,
+    'sample': select_sample,
+}
 
 
 def select(db_type, db_name=parser.get_default('db_name'),
         batch=parser.get_default('batch'),
         pid=parser.get_default('pid'),
-        dev=parser.get_default('devs')
+        dev=parser.get_default('devs'),
+        pattern=parser.get_default('pattern'),
+        count_mode=parser.get_default('count_mode')
         ):
     """DB 에서 가짜 데이터 셀렉트.
 
@@ -38,6 +134,14 @@ def select(db_type, db_name=parser.get_default('db_name'),
         batch (int): 한 번에 select 할 행수
         pid (int): 멀티 프로세스 인서트시 구분용 ID
         dev (bool): 개발 PC 에서 실행 여부
+        pattern (str): 셀렉트 패턴. 하나 이상인 경우 ',' 로 구분해 번갈아 실행
+            SELECT_PATTERNS 참고
+        count_mode (str): 종료 확인용 행수 방식. 기본값 maxid
+            행수가 5 번 연속 같으면 인서트가 끝난 것으로 보고 종료. 매 초 COUNT(*) 로
+            전체를 읽으면 측정 대상인 인서트와 경합하기에 싼 방식을 쓴다.
+            meta 는 근사값이라 인서트 중에도 같은 값이 이어져 일찍 끝날 수 있다.
+
+    패턴별로 쿼리에 걸린 시간 기준의 읽기 속도도 출력한다.
 
     Returns:
         int: 읽은 행 수 (테이블 행 수와 일치하지 않음!)
@@ -50,40 +154,40 @@ def select(db_type, db_name=parser.get_default('db_name'),
     db_passwd = setup['db_passwd']['value']['result']
 
     linfo(f"Selector {pid} connect DB at {db_host} batch {batch}")
-    if db_type == 'mysql':
-        conn = connect(host=db_host, user=db_user, password=db_passwd, db=db_name)
-    else:
-        conn = pymssql.connect(host=db_host, user=db_user, password=db_passwd, database=db_name)
+    conn = db_connect(db_type, db_host, db_user, db_passwd, db_name)
     cursor = conn.cursor()
     linfo("Connect done.")
 
-    if db_type == 'mysql':
-        sql = f'''
-            SELECT * FROM (
-                SELECT * FROM person ORDER BY pid, sid DESC LIMIT {batch}
-            ) sub
-            '''
-    else:
-        # MSSQL
+    patterns = [ptn.strip() for ptn in pattern.split(',')]
+    for ptn in patterns:
+        assert ptn in SELECTORS, f"Unknown select pattern {ptn}"
+    if db_type == 'mssql':
         cursor.execute('SET TRANSACTION ISOLATION LEVEL READ UNCOMMITTED')
-        sql = f'''
-            SELECT TOP {batch} *
-            FROM [test].[dbo].[person]
-            ORDER BY newid()
-            '''
 
+    state = {}
+    ptn_rows = dict.fromkeys(patterns, 0)
+    ptn_time = dict.fromkeys(patterns, 0.0)
     st = time.time()
     tot_read = row_cnt = i = 0
-    row_prev = count_rows(db_type, cursor)
+    row_prev = count_rows(db_type, cursor, count_mode)
     equal = 0
     while True:
         i += 1
         linfo(f"Selector {pid} row_prev: {row_prev}, row_cnt: {row_cnt} equal {equal}")
         conn.commit()
         time.sleep(1)
-        cursor.execute(sql)
-        tot_read += len(cursor.fetchall())
-        row_cnt = count_rows(db_type, cursor)
+        state['max_id'] = max_row_id(db_type, cursor)
+        ptn = patterns[i % len(patterns)]
+        t0 = time.time()
+        n_read = SELECTORS[ptn](db_type, cursor, batch, state)
+        ptn_time[ptn] += time.time() - t0
+        ptn_rows[ptn] += n_read
+        tot_read += n_read
+        # maxid 방식이면 이번 루프에서 이미 얻은 최대 id 를 재사용
+        if count_mode == 'maxid':
+            row_cnt = state['max_id']
+        else:
+            row_cnt = count_rows(db_type, cursor, count_mode)
         if row_cnt == row_prev:
             equal += 1
         else:
@@ -92,10 +196,13 @@ def select(db_type, db_name=parser.get_default('db_name'),
             break
         row_prev = row_cnt
 
-    conn.close()
+    db_release(conn)
 
     elapsed = time.time() - st
     vel = tot_read / elapsed
+    for ptn in patterns:
+        pvel = ptn_rows[ptn] / ptn_time[ptn] if ptn_time[ptn] > 0 else 0
+        linfo(f"Selector {pid} {ptn} selects {ptn_rows[ptn]} rows in {ptn_time[ptn]:.2f} sec. {int(pvel)} rows/sec.")
     linfo(f"Selector {pid} selects {tot_read} rows. {int(vel)} rows per seconds.")
     return tot_read
 
@@ -103,4 +210,4 @@ def select(db_type, db_name=parser.get_default('db_name'),
 if __name__ == '__main__':
     args = parser.parse_args()
     select(args.db_type, args.db_name, args.batch, args.pid,
-        args.dev)
\ No newline at end of file
+        args.dev, args.pattern, args.count_mode)
\ No newline at end of file
@@ -12,10 +12,18 @@ parser.add_argument('-t', '--table', type=str, default='person', help="이용할
 parser.add_argument('--db-host', type=str, help="외부 MySQL DB 주소.")
 parser.add_argument('--db-user', type=str, help="외부 MySQL DB 유저.")
 parser.add_argument('--db-passwd', type=str, help="외부 MySQL DB 암호.")
+parser.add_argument('--key-index', action='store_true', default=False,
+    help="(pid, sid) 인덱스 생성. workload 의 UPDATE / DELETE 용.")
 
 
 def reset_table(profile, table, fix_regdt=None, concur=None, datetime1=False,
-        db_host=None, db_user=None, db_passwd=None):
+        db_host=None, db_user=None, db_passwd=None, key_index=False):
+    """테이블을 지우고 다시 생성.
+
+    key_index 가 참이면 (pid, sid) 인덱스를 만들어, workload 의 키 기반
+    UPDATE / DELETE 가 전체 스캔을 하지 않게 한다.
+
+    """
     regdt_def = 'CURRENT_TIMESTAMP' if fix_regdt is None else f"'{fix_regdt}'"
     linfo(f"[ ] reset_table for {profile} {table}")
     if concur is None:
@@ -68,6 +76,8 @@ def reset_table(profile, table, fix_regdt=None, concur=None, datetime1=False,
         mysql_exec_many(cursor, sql)
     else:
         cursor.execute(sql)
+    if key_index:
+        cursor.execute(f"CREATE INDEX idx_{table}_pid_sid ON {table}(pid, sid)")
     conn.commit()
     linfo(f"[v] reset_table for {profile} {table}")
     return conn, cursor
@@ -76,4 +86,4 @@ def reset_table(profile, table, fix_regdt=None, concur=None, datetime1=False,
 if __name__ == '__main__':
     args = parser.parse_args()
     reset_table(args.db_type, args.table, None, None, False, 
-        args.db_host, args.db_user, args.db_passwd)
\ No newline at end of file
+        args.db_host, args.db_user, args.db_passwd, args.key_index)
\ No newline at end of file
@@ -4,6 +4,7 @@
 
 """
 import io
+import csv
 from cgitb import enable
 import random
 import os
@@ -17,28 +18,39 @@ from dateutil.parser import parse as parse_dt
 import time
 import binascii
 import subprocess
+import tempfile
+import queue
+from threading import Thread, Lock
+from concurrent.futures import ThreadPoolExecutor
 from multiprocessing import Process, Queue
 import gzip
 
 import pymssql
 from mysql.connector import connect
-from faker import Faker
-from faker.providers import internet, date_time, company, phone_number
 import paramiko
 import boto3
 import pytest
 from retry import retry
 import pandas as pd
 import boto3
-from confluent_kafka import KafkaError, KafkaException, Consumer
+from confluent_kafka import KafkaError, KafkaException, Consumer, TopicPartition, \
+    TopicCollection, ConsumerGroupTopicPartitions, ConsumerGroupState, OFFSET_END
+from confluent_kafka.admin import AdminClient, NewTopic, ConfigResource
+
+from kfktest.fakepool import get_fake_pool, FAKE_COLS
 
 # Insert / Select 프로세스 수
-NUM_INS_PROCS = 10  # 10 초과이면 sshd 세션수 문제(?)로 Insert가 안되는 문제 발생
+NUM_INS_PROCS = 10  # 동시 인서트 워커 수. 한 inserter 프로세스의 쓰레드 워커로 실행되기에
+                    # 노드당 SSH 세션은 하나 (예전 프로세스별 세션은 10 초과시 sshd 제한에 걸림)
                     # 10 일때 CT 에서 이따금씩(?) 1~4 개 정도 메시지 손실 발생
 NUM_SEL_PROCS = 4
 
 KFKTEST_S3_BUCKET = os.environ.get('KFKTEST_S3_BUCKET')
 KFKTEST_S3_DIR = os.environ.get('KFKTEST_S3_DIR')
+# 토픽 관리 방식 (admin: AdminClient 로 직접, cli: SSH 로 kafka-topics 실행)
+KFKTEST_TOPIC_BACKEND = os.environ.get('KFKTEST_TOPIC_BACKEND', 'admin')
+# xtopic 이 토픽을 지우고 다시 만드는 대신 비울지 (truncate_topic) 기본값
+KFKTEST_TOPIC_TRUNCATE = os.environ.get('KFKTEST_TOPIC_TRUNCATE', '').lower() in ('1', 'true', 'yes')
 
 # 빠른 테스트를 위해서는 EPOCH 와 BATCH 수를 10 정도로 줄여 테스트
 
@@ -63,6 +75,31 @@ INTERNAL_TOPICS = ['__consumer_offsets', 'connect-configs', 'connect-offsets',
     '_schemas',
     ]
 DB_PORTS = {'mysql': 3306, 'mssql': 1433}
+FAKE_CHUNK = 1000  # gen_fake_data 가 한 번에 샘플링하는 행수
+# insert_fake 인서트 방식
+#   many: executemany 로 파라미터 INSERT (pymssql 은 행마다 왕복)
+#   values: 여러 행을 하나의 INSERT ... VALUES 문으로 (MSSQL_MAX_VALUES 행씩)
+#   bulk: DBMS 별 벌크 로드 (MySQL 은 LOAD DATA LOCAL INFILE, MSSQL 은 BCP)
+INSERT_MODES = ['many', 'values', 'bulk']
+MSSQL_MAX_VALUES = 1000  # SQL Server 의 INSERT ... VALUES 최대 행수
+# MSSQL BCP 용 person 계열 테이블의 컬럼 순번 (kfktest.table.reset_table 참고)
+MSSQL_COL_IDS = {'regdt': 2, 'pid': 3, 'sid': 4, 'name': 5, 'address': 6,
+    'ip': 7, 'birth': 8, 'company': 9, 'phone': 10}
+CONSUME_BATCH = 1000  # consume_loop / consume_iter 가 한 번에 받는 최대 메시지 수
+CONSUME_POLL = 1.0  # consume() 한 번의 최대 대기 시간 (초)
+SSH_USER = 'ubuntu'  # 노드 SSH 유저
+SSH_KEEPALIVE = 30  # 풀 SSH 트랜스포트의 keepalive 간격 (초)
+SSH_STREAM_CHUNK = 32768  # ssh_stream 이 채널에서 한 번에 읽는 바이트 수
+SSH_STREAM_POLL = 0.05  # ssh_stream 이 출력을 기다리는 간격 (초)
+SSH_STREAM_ERR_MAX = 65536  # ssh_stream 이 남기는 stderr 끝부분 크기 (바이트)
+ADMIN_PORT = 19092  # AdminClient 가 접속하는 브로커 외부 포트
+ADMIN_TIMEOUT = 30  # AdminClient 요청과 토픽 생성/삭제 반영 대기 시간 (초)
+WATERMARK_POLL = 0.5  # count_topic_message 가 메시지 수 증가를 확인하는 간격 (초)
+WATERMARK_SETTLE = 2  # count_topic_message 가 기대 수에 닿은 뒤 늦은 중복을 지켜보는 시간 (초)
+WORKER_POLL = 1.0  # collect_workers 가 워커 결과와 생존을 확인하는 간격 (초)
+DB_CACHE_IDLE = NUM_INS_PROCS  # db_release 가 접속 키별로 남겨두는 최대 유휴 커넥션 수 (넘으면 닫음)
+# count_rows 의 행수 얻는 방식 (exact: COUNT(*), maxid: 최대 id, meta: 메타데이터 추정)
+COUNT_MODES = ['exact', 'maxid', 'meta']
 HOME = os.path.abspath(
         os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 
@@ -76,47 +113,73 @@ def db_port(profile):
     return DB_PORTS[profile]
 
 
-def gen_fake_data(count, with_ts=False):
-    """Fake 데이터 생성."""
-    fake = Faker()
-    fake.add_provider(internet)
-    fake.add_provider(date_time)
-    fake.add_provider(company)
-    fake.add_provider(phone_number)
-
-    for i in range(count):
-        data = {
-            'id': i + 1,
-            'name': fake.name(),
-            'address': fake.address(),
-            'ip': fake.ipv4_public(),
-            'birth': fake.date(),
-            'company': fake.company(),
-            'phone': fake.phone_number()
-        }
-        if with_ts:
-            data['regts'] = int(time.time() * 1000)
-        yield data
-
-
-def insert_fake(conn, cursor, epoch, batch, pid, profile, table='person', dt=None, show=False):
-    """Fake 데이터를 DB insert."""
+def fake_corpus_path(profile):
+    """프로파일별 가짜 데이터 코퍼스 경로.
+
+    python -m kfktest.corpus {profile} 로 미리 만들어 둘 수 있다.
+
+    """
+    return os.path.join(HOME, 'temp', profile, 'fake_corpus.arrow')
+
+
+def fake_pool(profile=None, pid=0):
+    """프로파일 코퍼스가 있으면 그것을, 없으면 Faker 로 만든 가짜 데이터 풀."""
+    corpus = None if profile is None else fake_corpus_path(profile)
+    return get_fake_pool(corpus, pid)
+
+
+def gen_fake_data(count, with_ts=False, profile=None, pid=0):
+    """Fake 데이터 생성.
+
+    행마다 Faker 를 부르지 않고, 공용 풀에서 FAKE_CHUNK 행씩 샘플링해 만든다.
+
+    Args:
+        count (int): 생성할 행수
+        with_ts (bool): regts 타임스탬프 추가 여부. 기본값 False
+        profile (str): 코퍼스를 찾을 프로파일. 기본값 None
+        pid (int): 코퍼스 구간을 나눌 프로세스 ID. 기본값 0
+
+    """
+    pool = fake_pool(profile, pid)
+    for base in range(0, count, FAKE_CHUNK):
+        n = min(FAKE_CHUNK, count - base)
+        cols = pool.sample(n)
+        for k, values in enumerate(zip(*cols)):
+            data = {'id': base + k + 1}
+            data.update(zip(FAKE_COLS, values))
+            if with_ts:
+                data['regts'] = int(time.time() * 1000)
+            yield data
+
+
+def insert_fake(conn, cursor, epoch, batch, pid, profile, table='person', dt=None, show=False,
+        mode='many', rate=None, lats=None):
+    """Fake 데이터를 DB insert.
+
+    Args:
+        mode (str): 인서트 방식. INSERT_MODES 중 하나. 기본값 many
+            MySQL 의 bulk 는 커넥션이 allow_local_infile=True 로 만들어져야 함
+        rate (float): 초당 목표 행수. 주어지면 배치를 고정된 시간표에 맞춰
+            시작하는 open-loop 방식으로 인서트. 기본값 None (최대 속도)
+        lats (dict): 배치별 ms 단위 지연 시간을 기록할 Histogram 들
+            - write: executemany (또는 벌크 로드) 시간
+            - commit: 커밋 시간
+            - response: 시간표상 시작 시간부터 커밋 완료까지 (coordinated omission 보정)
+
+    """
     assert profile in ('mysql', 'mssql')
-    linfo(f"[ ] insert_fake {epoch} {batch} {table}")
-    fake = Faker()
-    fake.add_provider(internet)
-    fake.add_provider(date_time)
-    fake.add_provider(company)
-    fake.add_provider(phone_number)
-
-    if dt is None:
-        sql = f"INSERT INTO {table}(pid, sid, name, address, ip, birth, company, phone) VALUES(%s, %s, %s, %s, %s, %s, %s, %s)"
-    else:
-        sql = f"INSERT INTO {table}(regdt, pid, sid, name, address, ip, birth, company, phone) VALUES(%s, %s, %s, %s, %s, %s, %s, %s, %s)"
-    # if profile == 'mysql':
-    #     sql = "INSERT INTO person(pid, sid, name, address, ip, birth, company, phone) VALUES(%s, %s, %s, %s, %s, %s, %s, %s)"
-    # else:
-    #     sql = "INSERT INTO person(pid, sid, name, address, ip, birth, company, phone) VALUES(%s, %s, %s, %s, %s, %s, %s, %s, %s)"
+    assert mode in INSERT_MODES
+    linfo(f"[ ] insert_fake {epoch} {batch} {table} {mode}")
+    pool = fake_pool(profile, pid)
+    # rate 가 있으면 j 번째 배치는 st + j * interval 에 시작해야 한다
+    interval = None if rate is None else batch / rate
+    st = time.time()
+
+    cols = 'pid, sid, name, address, ip, birth, company, phone'
+    if dt is not None:
+        cols = f'regdt, {cols}'
+    marks = ', '.join(['%s'] * len(cols.split(',')))
+    sql = f"INSERT INTO {table}({cols}) VALUES({marks})"
 
     for j in range(epoch):
         if batch == 1:
@@ -124,26 +187,134 @@ def insert_fake(conn, cursor, epoch, batch, pid, profile, table='person', dt=Non
                 linfo(f"Inserter {pid} epoch: {j+1}")
         else:
             linfo(f"Inserter {pid} epoch: {j+1}")
-        rows = []
-        for i in range(batch):
-            row = [
-                pid,
-                j * batch + i,
-                fake.name(),
-                fake.address(),
-                fake.ipv4_public(),
-                fake.date(),
-                fake.company(),
-                fake.phone_number()
-            ]
-            if dt is not None:
-                row.insert(0, dt)
-            rows.append(tuple(row))
-            if show:
-                linfo(row)
-        cursor.executemany(sql, rows)
+        sids = range(j * batch, (j + 1) * batch)
+        if dt is None:
+            rows = pool.rows(batch, pid, sids)
+        else:
+            rows = pool.rows(batch, dt, pid, sids)
+        if show:
+            for row in rows:
+                linfo(list(row))
+
+        if interval is None:
+            due = time.time()
+        else:
+            # 밀린 경우 쉬지 않고 바로 보내되, 지연은 원래 시작 시간부터 잰다
+            due = st + j * interval
+            wait = due - time.time()
+            if wait > 0:
+                time.sleep(wait)
+        t0 = time.time()
+        if mode == 'many':
+            cursor.executemany(sql, rows)
+        elif mode == 'values':
+            insert_values(cursor, table, cols, rows)
+        elif profile == 'mysql':
+            mysql_load_data(cursor, table, cols, rows)
+        else:
+            mssql_bulk_copy(conn, table, cols, rows)
+        t1 = time.time()
         conn.commit()
-    linfo(f"[v] insert_fake {epoch} {batch} {table}")
+        t2 = time.time()
+        if lats is not None:
+            lats['write'].record((t1 - t0) * 1000)
+            lats['commit'].record((t2 - t1) * 1000)
+            lats['response'].record((t2 - due) * 1000)
+    linfo(f"[v] insert_fake {epoch} {batch} {table} {mode}")
+
+
+def insert_values(cursor, table, cols, rows, chunk=MSSQL_MAX_VALUES):
+    """여러 행을 multi-row INSERT ... VALUES 문으로 인서트.
+
+    pymssql 의 executemany 는 행마다 INSERT 를 보내지만, 이렇게 하면 chunk 행당
+    한 번의 왕복으로 끝난다. 파라미터는 클라이언트에서 치환되기에 SQL Server 의
+    파라미터 수 제한 (2100) 은 해당 없음.
+
+    Args:
+        cursor: DB 커서
+        table (str): 대상 테이블
+        cols (str): ',' 로 구분된 대상 컬럼들 (행 값 순서와 일치)
+        rows (list): 행 튜플 리스트
+        chunk (int): 문장당 행수. 기본값 MSSQL_MAX_VALUES
+
+    """
+    mark = '(' + ', '.join(['%s'] * len(cols.split(','))) + ')'
+    for i in range(0, len(rows), chunk):
+        part = rows[i:i + chunk]
+        sql = f"INSERT INTO {table}({cols}) VALUES {', '.join([mark] * len(part))}"
+        cursor.execute(sql, tuple(v for row in part for v in row))
+
+
+def mssql_bulk_copy(conn, table, cols, rows):
+    """pymssql 의 BCP (bulk copy) 로 행들을 인서트.
+
+    Args:
+        conn: pymssql 커넥션
+        table (str): 대상 테이블 (reset_table 로 만든 person 계열)
+        cols (str): ',' 로 구분된 대상 컬럼들 (행 값 순서와 일치)
+        rows (list): 행 튜플 리스트
+
+    """
+    col_ids = [MSSQL_COL_IDS[col.strip()] for col in cols.split(',')]
+    conn.bulk_copy(table, rows, column_ids=col_ids, batch_size=len(rows))
+
+
+def mysql_load_data(cursor, table, cols, rows):
+    """행들을 메모리상의 CSV 로 만들어 LOAD DATA LOCAL INFILE 로 스트리밍.
+
+    - 커넥터는 파일 경로만 받기에, 임시 디렉토리에 named pipe 를 만들고
+      쓰레드에서 메모리 버퍼를 흘려 보낸다 (디스크에 데이터를 쓰지 않음).
+    - 서버에 local_infile=1 설정이 필요
+
+    Args:
+        cursor: MySQL 커서
+        table (str): 대상 테이블
+        cols (str): ',' 로 구분된 대상 컬럼들 (행 값 순서와 일치)
+        rows (list): 행 튜플 리스트
+
+    """
+    buf = io.StringIO()
+    csv.writer(buf, quoting=csv.QUOTE_ALL, lineterminator='\n').writerows(rows)
+    data = buf.getvalue().encode('utf8')
+
+    tmpdir = tempfile.mkdtemp(prefix='kfktest-')
+    fifo = os.path.join(tmpdir, f'{table}.csv')
+    os.mkfifo(fifo)
+
+    def _feed():
+        try:
+            with open(fifo, 'wb') as f:
+                f.write(data)
+        except BrokenPipeError:
+            pass
+
+    feeder = Thread(target=_feed, daemon=True)
+    feeder.start()
+    try:
+        cursor.execute(f"""
+            LOAD DATA LOCAL INFILE '{fifo}' INTO TABLE {table}
+            CHARACTER SET utf8mb4
+            FIELDS TERMINATED BY ',' ENCLOSED BY '"' ESCAPED BY ''
+            LINES TERMINATED BY '\\n'
+            ({cols})
+        """)
+    finally:
+        if feeder.is_alive():
+            # 서버가 파일을 읽지 않고 끝난 경우 (local_infile 비활성 등)
+            # 쓰는 쪽이 막히지 않게 대신 읽어서 버린다
+            fd = os.open(fifo, os.O_RDONLY | os.O_NONBLOCK)
+            try:
+                while feeder.is_alive():
+                    try:
+                        if os.read(fd, 65536) == b'':
+                            feeder.join(0.01)
+                    except BlockingIOError:
+                        feeder.join(0.01)
+            finally:
+                os.close(fd)
+        feeder.join()
+        os.unlink(fifo)
+        os.rmdir(tmpdir)
 
 
 def insert_fake_tmp(profile, epoch, batch):
@@ -153,9 +324,8 @@ def insert_fake_tmp(profile, epoch, batch):
 
 
 @retry(RuntimeError, tries=10, delay=3)
-def SSH(host, name=None):
+def _ssh_connect(host, user, name):
     """Paramiko SSH 접속 생성."""
-    name = host if name is None else f'{name} ({host})'
     linfo(f"[ ] ssh connect {name}")
     ssh_pkey = os.environ['KFKTEST_SSH_PKEY']
     ssh = paramiko.SSHClient()
@@ -163,13 +333,111 @@ def SSH(host, name=None):
     ssh.set_missing_host_key_policy(paramiko.MissingHostKeyPolicy())
     pkey = paramiko.RSAKey.from_private_key_file(ssh_pkey)
     try:
-        ssh.connect(host, username='ubuntu', pkey=pkey)
+        ssh.connect(host, username=user, pkey=pkey)
     except (paramiko.ssh_exception.NoValidConnectionsError, paramiko.ssh_exception.SSHException) as e:
         raise RuntimeError(f"Can not connect to {host}")
+    ssh.get_transport().set_keepalive(SSH_KEEPALIVE)
     linfo(f"[v] ssh connect {name}")
     return ssh
 
 
+class PooledSSH:
+    """SSH 풀의 (host, user) 별 접속.
+
+    Paramiko SSHClient 처럼 쓰면 (exec_command 등) 공유 트랜스포트 위에 채널을
+    연다. 트랜스포트가 끊겨 있으면 호출 전에 다시 접속한다.
+
+    """
+
+    def __init__(self, host, user, name):
+        self.host = host
+        self.user = user
+        self.name = name
+        self.lock = Lock()
+        self.client = None
+
+    def _active(self):
+        if self.client is None:
+            return False
+        transport = self.client.get_transport()
+        return transport is not None and transport.is_active()
+
+    def connect(self, force=False):
+        """살아있는 SSHClient 반환 (끊겼거나 force 면 다시 접속)."""
+        with self.lock:
+            if force or not self._active():
+                if self.client is not None:
+                    linfo(f"ssh reconnect {self.name}")
+                    self.client.close()
+                self.client = _ssh_connect(self.host, self.user, self.name)
+            return self.client
+
+    def close(self):
+        with self.lock:
+            if self.client is not None:
+                self.client.close()
+                self.client = None
+
+    def __getattr__(self, attr):
+        return getattr(self.connect(), attr)
+
+
+# 프로세스 공용 SSH 풀 ((host, user) 별 PooledSSH)
+_ssh_pool = {}
+_ssh_pool_lock = Lock()
+
+
+def _clear_ssh_pool():
+    """fork 된 자식 프로세스에서 SSH 풀 비우기.
+
+    부모의 트랜스포트 쓰레드는 자식에 없기에 물려받은 접속은 쓸 수 없다.
+    자식은 처음 쓸 때 새로 접속한다.
+
+    """
+    global _ssh_pool_lock
+    _ssh_pool_lock = Lock()
+    _ssh_pool.clear()
+
+
+os.register_at_fork(after_in_child=_clear_ssh_pool)
+
+
+def SSH(host, name=None, user=SSH_USER):
+    """SSH 풀에서 (host, user) 접속 얻기.
+
+    프로세스 안에서는 호스트별 트랜스포트 하나를 공유하기에, 반복 호출해도
+    핸드셰이크 없이 채널만 연다. 한 접속의 동시 채널 수는 sshd 의 MaxSessions
+    (기본 10) 로 제한된다.
+
+    """
+    name = host if name is None else f'{name} ({host})'
+    key = (host, user)
+    with _ssh_pool_lock:
+        if key not in _ssh_pool:
+            _ssh_pool[key] = PooledSSH(host, user, name)
+        ssh = _ssh_pool[key]
+    ssh.connect()
+    return ssh
+
+
+def close_ssh_pool():
+    """SSH 풀의 접속을 모두 닫음."""
+    with _ssh_pool_lock:
+        for ssh in _ssh_pool.values():
+            ssh.close()
+        _ssh_pool.clear()
+
+
+def _exec_command(ssh, cmd):
+    """exec_command 하되, 풀의 트랜스포트가 확인 직후 끊긴 경우 한 번 다시 접속."""
+    try:
+        return ssh.exec_command(cmd)
+    except paramiko.ssh_exception.SSHException:
+        if not isinstance(ssh, PooledSSH):
+            raise
+        return ssh.connect(True).exec_command(cmd)
+
+
 def ssh_exec(ssh, cmd, kafka_env=True, stderr_type="stderr", ignore_err=False):
     """SSH 로 명령 실행
 
@@ -190,7 +458,7 @@ def ssh_exec(ssh, cmd, kafka_env=True, stderr_type="stderr", ignore_err=False):
     env = "source ~/.kenv && " if kafka_env else ""
     cmd = f'{env}{cmd}'
     # linfo(f"[ ] ssh_exec {cmd}")
-    _, stdout, stderr = ssh.exec_command(cmd)
+    _, stdout, stderr = _exec_command(ssh, cmd)
     es = stdout.channel.recv_exit_status()
     out = stdout.read().decode('utf8')
     err = stderr.read().decode('utf8')
@@ -209,11 +477,176 @@ def ssh_exec(ssh, cmd, kafka_env=True, stderr_type="stderr", ignore_err=False):
     return out
 
 
+class SSHStream:
+    """ssh_stream 의 원격 명령 출력 스트림.
+
+    순회하면 stdout 을 줄 (str, 줄바꿈 제외) 또는 chunk 바이트 단위로 받는 대로
+    내준다. 소비하는 쪽이 읽어야 채널 창이 비워지기에, 읽기가 느리면 원격 명령의
+    출력도 그만큼 늦춰진다 (backpressure). stderr 는 따로 비우며 끝부분만 남긴다.
+
+    순회가 끝나면 status 에 종료 코드가 있다. 중간에 그만두면 close 로 채널을
+    닫아 원격 명령을 끝낸다.
+
+    """
+
+    def __init__(self, chan, cmd, chunk=None, ignore_err=False, on_err=None):
+        self.chan = chan
+        self.cmd = cmd
+        self.chunk = chunk
+        self.ignore_err = ignore_err
+        self.on_err = on_err
+        self.status = None
+        self._err = b''
+        self._err_rest = b''
+
+    @property
+    def err(self):
+        """받은 stderr 의 끝부분 (최대 SSH_STREAM_ERR_MAX 바이트)."""
+        return self._err.decode('utf8', 'replace')
+
+    def _read_err(self):
+        data = self.chan.recv_stderr(SSH_STREAM_CHUNK)
+        self._err = (self._err + data)[-SSH_STREAM_ERR_MAX:]
+        if self.on_err is not None:
+            self._err_rest, lines = _split_lines(self._err_rest + data)
+            for line in lines:
+                self.on_err(line)
+
+    def _chunks(self):
+        """stdout 을 받는 대로 내줌 (크기 제각각)."""
+        chan = self.chan
+        while True:
+            if chan.recv_stderr_ready():
+                self._read_err()
+            if chan.recv_ready():
+                yield chan.recv(SSH_STREAM_CHUNK)
+                continue
+            if chan.exit_status_ready() and not chan.recv_ready() \
+                    and not chan.recv_stderr_ready():
+                break
+            time.sleep(SSH_STREAM_POLL)
+        if self.on_err is not None and self._err_rest != b'':
+            self.on_err(self._err_rest.decode('utf8', 'replace'))
+        self.status = chan.recv_exit_status()
+        if self.status != 0 and not self.ignore_err:
+            ssh_addr = chan.get_transport().getpeername()[0]
+            raise Exception(f'[@{ssh_addr}] {self.cmd} <--- {self.err}')
+
+    def __iter__(self):
+        buf = b''
+        for data in self._chunks():
+            buf += data
+            if self.chunk is None:
+                buf, lines = _split_lines(buf)
+                yield from lines
+            else:
+                while len(buf) >= self.chunk:
+                    yield buf[:self.chunk]
+                    buf = buf[self.chunk:]
+        if buf != b'':
+            yield buf.decode('utf8') if self.chunk is None else buf
+
+    def close(self):
+        self.chan.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _split_lines(buf):
+    """버퍼에서 완성된 줄들을 떼어냄.
+
+    Returns:
+        tuple: (남은 미완성 줄 바이트, 디코딩된 줄 리스트)
+
+    """
+    end = buf.rfind(b'\n')
+    if end < 0:
+        return buf, []
+    lines = buf[:end].decode('utf8').split('\n')
+    return buf[end + 1:], lines
+
+
+def ssh_stream(ssh, cmd, kafka_env=True, chunk=None, ignore_err=False,
+        on_err=None):
+    """SSH 로 명령을 실행하고 출력을 받는 대로 내주는 스트림.
+
+    ssh_exec 는 명령이 끝난 뒤 출력 전체를 문자열로 주지만, 이것은 출력이 클 때
+    (토픽 전체 덤프 등) 메모리를 출력 크기만큼 쓰지 않고 받으면서 처리할 수 있다.
+
+    Args:
+        ssh: 명령을 실행할 Paramiko SSH 객체
+        cmd (str): 명령
+        kafka_env (bool): 카프카 환경 변수 설정 여부. 기본 True
+        chunk (int): 주어지면 줄 대신 이 크기의 바이트 덩어리로 (마지막은 작을 수 있음)
+        ignore_err (bool): 종료 코드가 0 이 아니어도 예외를 내지 않음
+        on_err (callable): stderr 줄마다 불릴 함수. 기본값 None
+
+    Returns:
+        SSHStream: 순회 가능한 출력 스트림
+
+    """
+    env = "source ~/.kenv && " if kafka_env else ""
+    cmd = f'{env}{cmd}'
+    _, stdout, _ = _exec_command(ssh, cmd)
+    return SSHStream(stdout.channel, cmd, chunk, ignore_err, on_err)
+
+
 def local_exec(cmd):
     """로컬에서 쉘 명령 실행."""
     return subprocess.run(cmd, shell=True)
 
 
+def collect_workers(q, procs, poll=WORKER_POLL):
+    """워커 프로세스들의 결과를 큐에서 모으고 종료를 기다림.
+
+    워커는 (k, ok, 결과 또는 에러 메시지) 를 큐에 넣는다. 실패를 알린 워커나
+    결과 없이 죽은 워커가 있으면 나머지 워커를 끝내고 예외를 낸다.
+    join 전에 큐를 비워야 워커가 종료된다.
+
+    Args:
+        q (Queue): 워커 결과 큐
+        procs (list): 워커 프로세스 리스트 (k 번째가 워커 k)
+        poll (float): 큐를 기다리며 워커 생존을 확인하는 간격 (초)
+
+    Returns:
+        dict: 워커 번호별 결과
+
+    """
+    results = {}
+    gone = set()
+    try:
+        while len(results) < len(procs):
+            try:
+                k, ok, res = q.get(timeout=poll)
+            except queue.Empty:
+                dead = [k for k, p in enumerate(procs)
+                    if k not in results and p.exitcode is not None]
+                # 종료 직전에 넣은 결과가 늦게 보일 수 있어 한 번 더 기다린 뒤 판단
+                lost = [k for k in dead if k in gone]
+                if len(lost) > 0:
+                    codes = ', '.join(f'{k}: {procs[k].exitcode}' for k in lost)
+                    raise RuntimeError(f"Worker exited without result ({codes})")
+                gone.update(dead)
+                continue
+            if not ok:
+                raise RuntimeError(f"Worker {k} failed: {res}")
+            results[k] = res
+    except BaseException:
+        for p in procs:
+            if p.exitcode is None:
+                p.terminate()
+        for p in procs:
+            p.join()
+        raise
+    for p in procs:
+        p.join()
+    return results
+
+
 def scp_to_remote(src, dst_addr, dst_dir):
     """로컬 파일을 원격지로 scp.
 
@@ -237,6 +670,189 @@ def scp_to_remote(src, dst_addr, dst_dir):
     return local_exec(cmd)
 
 
+def _fanout_run(job, kafka_env, stream):
+    """fanout_exec 의 호스트 하나 실행."""
+    host, cmd = job['host'], job['cmd']
+    name = job.get('name') or host
+    res = dict(host=host, name=name, cmd=cmd, status=None, out='', err='',
+        elapsed=0, error=None)
+    st = time.time()
+
+    def _log(line):
+        linfo(f"[{name}] {line}")
+
+    try:
+        ssh = SSH(host, job.get('name'))
+        outs = []
+        with ssh_stream(ssh, cmd, kafka_env, ignore_err=True,
+                on_err=_log if stream else None) as lines:
+            for line in lines:
+                outs.append(f'{line}\n')
+                if stream:
+                    _log(line)
+        res['status'] = lines.status
+        res['out'] = ''.join(outs)
+        res['err'] = lines.err
+    except Exception as e:
+        res['error'] = str(e)
+    res['elapsed'] = time.time() - st
+    return res
+
+
+def fanout_exec(jobs, kafka_env=False, stream=True, ignore_err=False, wait=True):
+    """여러 호스트에 명령을 동시에 실행.
+
+    호스트마다 풀의 SSH 접속에 채널을 열기에, 걸리는 시간은 가장 느린 호스트 정도다.
+
+    Args:
+        jobs (list): 작업 dict 리스트. host (주소), cmd (명령), name (로그용 이름, 선택)
+        kafka_env (bool): 카프카 환경 변수 설정 여부. 기본 False
+        stream (bool): 호스트별 출력을 줄 단위로 바로 로깅. 기본 True
+        ignore_err (bool): 실패한 작업이 있어도 예외를 내지 않음. 기본 False
+        wait (bool): 모든 작업이 끝날 때까지 대기. False 면 Future 를 반환
+
+    Returns:
+        list: 작업 순서대로의 결과 dict 리스트. host, name, cmd, status (종료 코드),
+            out, err, elapsed (초), error (접속 실패 등 예외 메시지)
+
+    """
+    def _run():
+        with ThreadPoolExecutor(max_workers=max(len(jobs), 1)) as ex:
+            results = list(ex.map(lambda job: _fanout_run(job, kafka_env, stream), jobs))
+        failed = [r for r in results if r['error'] is not None or r['status'] != 0]
+        if len(failed) > 0 and not ignore_err:
+            msg = ', '.join([f"[@{r['host']}] {r['cmd']} <--- {r['error'] or r['err']}"
+                for r in failed])
+            raise Exception(msg)
+        return results
+
+    if wait:
+        return _run()
+    ex = ThreadPoolExecutor(max_workers=1)
+    fut = ex.submit(_run)
+    ex.shutdown(wait=False)
+    return fut
+
+
+def _fanout_put_one(host, srcs, dst_dir):
+    res = dict(host=host, files=[], elapsed=0, error=None)
+    st = time.time()
+    try:
+        ssh = SSH(host)
+        ssh_exec(ssh, f'mkdir -p {dst_dir}', False)
+        # SFTP 상대 경로는 홈 디렉토리 기준
+        rdir = dst_dir[2:] if dst_dir.startswith('~/') else dst_dir
+        sftp = ssh.open_sftp()
+        try:
+            for src in srcs:
+                dst = f'{rdir}/{os.path.basename(src)}'
+                sftp.put(os.path.abspath(src), dst)
+                res['files'].append(dst)
+        finally:
+            sftp.close()
+    except Exception as e:
+        res['error'] = str(e)
+    res['elapsed'] = time.time() - st
+    return res
+
+
+def fanout_put(hosts, srcs, dst_dir, ignore_err=False):
+    """로컬 파일들을 여러 호스트에 SFTP 로 동시에 복사.
+
+    Args:
+        hosts (list): 대상 노드 주소 리스트
+        srcs (list): 원본 파일 경로 리스트
+        dst_dir (str): 대상 디렉토리 (없으면 만듦)
+        ignore_err (bool): 실패한 호스트가 있어도 예외를 내지 않음. 기본 False
+
+    Returns:
+        list: 호스트 순서대로의 결과 dict 리스트. host, files (복사한 원격 경로),
+            elapsed (초), error
+
+    """
+    assert not dst_dir.endswith('/')
+    linfo(f"[ ] fanout_put {srcs} to {hosts}:{dst_dir}")
+    with ThreadPoolExecutor(max_workers=max(len(hosts), 1)) as ex:
+        results = list(ex.map(lambda host: _fanout_put_one(host, srcs, dst_dir), hosts))
+    failed = [r for r in results if r['error'] is not None]
+    if len(failed) > 0 and not ignore_err:
+        raise Exception(', '.join([f"[@{r['host']}] {r['error']}" for r in failed]))
+    linfo(f"[v] fanout_put {srcs} to {hosts}:{dst_dir}")
+    return results
+
+
+# 프로세스 공용 AdminClient (브로커 주소별)
+_admins = {}
+_admins_lock = Lock()
+
+
+def _clear_admins():
+    """librdkafka 클라이언트는 fork 후 쓸 수 없기에 자식에서 새로 만든다."""
+    global _admins_lock
+    _admins_lock = Lock()
+    _admins.clear()
+
+
+os.register_at_fork(after_in_child=_clear_admins)
+
+
+def get_admin(kfk_ssh):
+    """Kafka 노드 SSH 객체의 주소로 AdminClient 얻기 (ADMIN_PORT 로 접속)."""
+    if isinstance(kfk_ssh, PooledSSH):
+        addr = kfk_ssh.host
+    else:
+        addr = kfk_ssh.get_transport().getpeername()[0]
+    with _admins_lock:
+        if addr not in _admins:
+            _admins[addr] = AdminClient({'bootstrap.servers': f'{addr}:{ADMIN_PORT}'})
+        return _admins[addr]
+
+
+def _admin_topics(admin):
+    """메타데이터의 토픽 이름들 (정렬)."""
+    return sorted(admin.list_topics(timeout=ADMIN_TIMEOUT).topics.keys())
+
+
+def _admin_wait_deleted(admin, topics):
+    """토픽들이 메타데이터에서 사라질 때까지 대기.
+
+    Returns:
+        list: ADMIN_TIMEOUT 뒤에도 남은 토픽들
+
+    """
+    st = time.time()
+    while True:
+        remain = sorted(set(topics) & set(_admin_topics(admin)))
+        if len(remain) == 0 or time.time() - st > ADMIN_TIMEOUT:
+            return remain
+        time.sleep(WATERMARK_POLL)
+
+
+def _admin_describe_topic(admin, topic):
+    """kafka-topics --describe 출력과 같은 형식으로 토픽 정보."""
+    desc = admin.describe_topics(TopicCollection([topic]),
+        request_timeout=ADMIN_TIMEOUT)[topic].result()
+    res = ConfigResource(ConfigResource.Type.TOPIC, topic)
+    entries = admin.describe_configs([res],
+        request_timeout=ADMIN_TIMEOUT)[res].result()
+    # CLI 처럼 기본값이 아닌 설정만
+    cfgs = ','.join([f'{e.name}={e.value}' for e in entries.values()
+        if not e.is_default])
+    parts = sorted(desc.partitions, key=lambda p: p.id)
+    rf = len(parts[0].replicas) if len(parts) > 0 else 0
+    info = [f'Topic: {topic}', f'TopicId: {desc.topic_id}',
+        f'PartitionCount: {len(parts)}', f'ReplicationFactor: {rf}',
+        f'Configs: {cfgs}']
+    plist = []
+    for p in parts:
+        leader = p.leader.id if p.leader is not None else 'none'
+        replicas = ','.join([str(n.id) for n in p.replicas])
+        isr = ','.join([str(n.id) for n in p.isr])
+        plist.append(['', f'Topic: {topic}', f'Partition: {p.id}',
+            f'Leader: {leader}', f'Replicas: {replicas}', f'Isr: {isr}'])
+    return info, plist
+
+
 def list_topics(kfk_ssh, skip_internal=True):
     """토픽 리스팅.
 
@@ -249,8 +865,11 @@ def list_topics(kfk_ssh, skip_internal=True):
 
     """
     linfo("list_topics at kafka")
-    ret = ssh_exec(kfk_ssh, f'kafka-topics --list --bootstrap-server localhost:9092')
-    topics = ret.strip().split('\n')
+    if KFKTEST_TOPIC_BACKEND == 'admin':
+        topics = _admin_topics(get_admin(kfk_ssh))
+    else:
+        ret = ssh_exec(kfk_ssh, f'kafka-topics --list --bootstrap-server localhost:9092')
+        topics = ret.strip().split('\n')
     if skip_internal:
         topics = [t for t in topics if t not in INTERNAL_TOPICS]
     return topics
@@ -266,6 +885,13 @@ def create_topic(kfk_ssh, topic, partitions=TOPIC_PARTITIONS,
 
     """
     linfo(f"[ ] create_topic '{topic}'")
+    if KFKTEST_TOPIC_BACKEND == 'admin':
+        config = {} if config is None else {ck: str(cv) for ck, cv in config.items()}
+        new = NewTopic(topic, partitions, replications, config=config)
+        get_admin(kfk_ssh).create_topics([new],
+            operation_timeout=ADMIN_TIMEOUT)[topic].result()
+        linfo(f"[v] create_topic '{topic}'")
+        return f'Created topic {topic}.\n'
     cmd = f'kafka-topics --create --topic {topic} --bootstrap-server localhost:9092 --partitions {partitions} --replication-factor {replications}'
     if config is not None:
         for ck, cv in config.items():
@@ -300,6 +926,8 @@ def describe_topic(kfk_ssh, topic):
         tuple: 토픽 정보, 토픽 파티션들 정보
 
     """
+    if KFKTEST_TOPIC_BACKEND == 'admin':
+        return _admin_describe_topic(get_admin(kfk_ssh), topic)
     ret = ssh_exec(kfk_ssh, f'kafka-topics --describe --topic {topic} --bootstrap-server localhost:9092')
     items = ret.strip().split('\n')
     items = [item.split('\t') for item in items]
@@ -344,6 +972,9 @@ def check_topic_exists(kfk_ssh, topic):
 
 
 def _check_topic_exists(kfk_ssh, topic):
+    if KFKTEST_TOPIC_BACKEND == 'admin':
+        # 토픽을 지정해 메타데이터를 요청하면 자동 생성될 수 있어 전체 목록으로 확인
+        return topic in _admin_topics(get_admin(kfk_ssh))
     ret = ssh_exec(kfk_ssh, "kafka-topics --list --bootstrap-server localhost:9092")
     topics = ret.strip().split('\n')
     return topic in topics
@@ -368,6 +999,20 @@ def delete_topic(kfk_ssh, topic, ignore_not_exist=False):
 
     linfo(f"[ ] delete_topic '{topic}'")
 
+    if KFKTEST_TOPIC_BACKEND == 'admin':
+        admin = get_admin(kfk_ssh)
+        try:
+            admin.delete_topics([topic], operation_timeout=ADMIN_TIMEOUT)[topic].result()
+        except KafkaException as e:
+            if e.args[0].code() == KafkaError.UNKNOWN_TOPIC_OR_PART and ignore_not_exist:
+                linfo(f"   delete_topic '{topic}' - not exist")
+                return
+            raise e
+        if len(_admin_wait_deleted(admin, [topic])) > 0:
+            raise RuntimeError(f"Topic {topic} still remain.")
+        linfo(f"[v] delete_topic '{topic}'")
+        return f'Deleted topic {topic}.\n'
+
     try:
         ret = ssh_exec(kfk_ssh, f'kafka-topics --delete --topic {topic}  --bootstrap-server localhost:9092')
     except Exception as e:
@@ -419,6 +1064,22 @@ def delete_all_topics(kfk_ssh, profile):
     """
     topics = list_topics(kfk_ssh)
     linfo(f"[ ] delete_all_topics")
+    if KFKTEST_TOPIC_BACKEND == 'admin':
+        if len(topics) > 0:
+            # 한 번의 요청으로 모두 지우고 결과를 함께 기다림
+            admin = get_admin(kfk_ssh)
+            futs = admin.delete_topics(topics, operation_timeout=ADMIN_TIMEOUT)
+            for topic, fut in futs.items():
+                try:
+                    fut.result()
+                except KafkaException as e:
+                    if e.args[0].code() != KafkaError.UNKNOWN_TOPIC_OR_PART:
+                        raise e
+            remain = _admin_wait_deleted(admin, topics)
+            if len(remain) > 0:
+                raise RuntimeError(f"Topics {remain} still remain.")
+        linfo(f"[v] delete_all_topics")
+        return
     if len(topics) > 0 and len(topics[0]) > 0:
         topics = ','.join(topics)
         try:
@@ -428,9 +1089,8 @@ def delete_all_topics(kfk_ssh, profile):
             raise e
 
         # 남은 토픽 확인
-        topics = list_topics(kfk_ssh)
-        num_topic = sum(topics)
-        if num_topic > 0:
+        topics = [t for t in list_topics(kfk_ssh) if t != '']
+        if len(topics) > 0:
             raise RuntimeError(f"Topics {topics} still remain.")
     linfo(f"[v] delete_all_topics")
     return
@@ -444,16 +1104,206 @@ def delete_all_topics(kfk_ssh, profile):
 
 
 def reset_topic(ssh, topic, partitions=TOPIC_PARTITIONS,
-        replications=TOPIC_REPLICATIONS, config=None):
-    """특정 토픽 초기화."""
+        replications=TOPIC_REPLICATIONS, config=None, truncate=False):
+    """특정 토픽 초기화.
+
+    truncate 면 같은 레이아웃의 토픽이 있을 때 지우지 않고 비운다 (truncate_topic).
+
+    """
     linfo(f"[ ] reset_topic '{topic}'")
-    delete_topic(ssh, topic, True)
-    create_topic(ssh, topic, partitions, replications, config)
+    if not truncate or not _truncate_or_recreate(ssh, [topic], partitions,
+            replications, config):
+        delete_topic(ssh, topic, True)
+        create_topic(ssh, topic, partitions, replications, config)
     linfo(f"[v] reset_topic '{topic}'")
 
 
-def count_topic_message(profile, topic, timeout=10):
+def _group_partitions(admin, group, topics):
+    """컨슈머 그룹이 토픽들에 오프셋을 커밋한 (토픽, 파티션) 집합."""
+    req = ConsumerGroupTopicPartitions(group)
+    res = admin.list_consumer_group_offsets([req],
+        request_timeout=ADMIN_TIMEOUT)[group].result()
+    return {(tp.topic, tp.partition) for tp in res.topic_partitions
+        if tp.topic in topics and tp.offset >= 0}
+
+
+def _topic_groups(admin, topics):
+    """토픽들에 커밋된 오프셋이 있는 빈 (활성 멤버 없는) 컨슈머 그룹들.
+
+    Returns:
+        dict: 그룹별 오프셋이 커밋된 (토픽, 파티션) 집합
+
+    """
+    listing = admin.list_consumer_groups(request_timeout=ADMIN_TIMEOUT).result()
+    groups = {}
+    for grp in listing.valid:
+        if grp.state != ConsumerGroupState.EMPTY:
+            linfo(f"   skip active consumer group {grp.group_id}")
+            continue
+        parts = _group_partitions(admin, grp.group_id, topics)
+        if len(parts) > 0:
+            groups[grp.group_id] = parts
+    return groups
+
+
+def truncate_topic(kfk_ssh, topics, groups=None):
+    """토픽들의 모든 파티션을 끝까지 비우고 컨슈머 그룹 오프셋을 새 시작으로 맞춤.
+
+    토픽을 지우고 다시 만들지 않기에 파티션 리더 재선출 없이 레이아웃이 유지된다.
+    오프셋은 0 으로 돌아가지 않고 이어지기에 메시지 수는 high - low 로 세야 한다
+    (count_by_watermark). cleanup.policy=compact 토픽은 비울 수 없다.
+
+    Args:
+        kfk_ssh: Kafka 노드의 Paramiko SSH 객체
+        topics (list): 비울 토픽들
+        groups (list): 오프셋을 맞출 컨슈머 그룹들. None 이면 토픽들에 커밋된
+            오프셋이 있는 빈 그룹들을 찾는다. 그룹마다 이미 오프셋을 커밋한
+            파티션만 맞춘다
+
+    Returns:
+        dict: (토픽, 파티션) 별 새 시작 오프셋
+
+    """
+    linfo(f"[ ] truncate_topic {topics}")
+    admin = get_admin(kfk_ssh)
+    meta = admin.list_topics(timeout=ADMIN_TIMEOUT).topics
+    tps = [TopicPartition(topic, part, OFFSET_END) for topic in topics
+        for part in meta[topic].partitions]
+    # 모든 파티션을 한 번의 요청으로
+    futs = admin.delete_records(tps, request_timeout=ADMIN_TIMEOUT,
+        operation_timeout=ADMIN_TIMEOUT)
+    lows = {(tp.topic, tp.partition): fut.result().low_watermark
+        for tp, fut in futs.items()}
+
+    if groups is None:
+        groups = _topic_groups(admin, topics)
+    else:
+        groups = {group: _group_partitions(admin, group, topics) for group in groups}
+    for group, parts in groups.items():
+        # 커밋한 적 없는 파티션에 오프셋을 새로 만들지 않는다
+        offsets = [TopicPartition(topic, part, lows[(topic, part)])
+            for topic, part in sorted(parts) if (topic, part) in lows]
+        if len(offsets) == 0:
+            continue
+        req = ConsumerGroupTopicPartitions(group, offsets)
+        admin.alter_consumer_group_offsets([req],
+            request_timeout=ADMIN_TIMEOUT)[group].result()
+    linfo(f"[v] truncate_topic {topics} groups {list(groups)}")
+    return lows
+
+
+def _truncate_or_recreate(kfk_ssh, topics, partitions, replications, config):
+    """토픽들을 비우되, 없거나 레이아웃이 다른 토픽은 지우고 다시 만듦.
+
+    설정 (config) 이 주어지면 기존 토픽의 설정과 비교하지 않고 다시 만든다.
+
+    Returns:
+        bool: 비우기를 했으면 True. AdminClient 를 못 쓰는 cli 방식이면 False
+
+    """
+    if KFKTEST_TOPIC_BACKEND != 'admin':
+        return False
+    meta = get_admin(kfk_ssh).list_topics(timeout=ADMIN_TIMEOUT).topics
+    keep = []
+    for topic in topics:
+        tmeta = meta.get(topic)
+        same = tmeta is not None and config is None \
+            and len(tmeta.partitions) == partitions \
+            and all(len(pm.replicas) == replications for pm in tmeta.partitions.values())
+        if same:
+            keep.append(topic)
+            continue
+        if tmeta is not None:
+            delete_topic(kfk_ssh, topic, True)
+        create_topic(kfk_ssh, topic, partitions, replications, config)
+    if len(keep) > 0:
+        truncate_topic(kfk_ssh, keep)
+    return True
+
+
+def count_topic_message(profile, topic, timeout=10, exact=False, expected=None):
+    """토픽의 메시지 수를 카운팅.
+
+    파티션별 워터마크 (high - low) 오프셋의 합으로 세기에 토픽 크기와 무관하게
+    밀리초 단위로 끝난다. 컴팩션이나 트랜잭션 (커밋/어보트 마커) 이 있으면 오프셋이
+    메시지 수와 다르므로 exact 로 실제 컨슘해 센다.
+
+    Args:
+        profile (str): 프로파일 이름
+        topic (str): 토픽명. 하나 이상이면 ',' 로 구분
+        timeout (int): 메시지 수가 이 시간 (초) 동안 늘지 않을 때까지 기다림.
+            None 이면 바로 반환. 기본값 10 은 JDBC 커넥터의 기본 폴링 간격
+            (poll.interval.ms 5000) 두 번 정도로, 기대 수를 모를 때 커넥터가 아직
+            가져오지 않은 메시지를 다 센 것으로 오인하지 않기 위함
+        exact (bool): kafka-console-consumer 로 끝까지 읽어 셈. 기본값 False
+        expected (int): 기대 메시지 수. 이만큼 되면 timeout 대신 WATERMARK_SETTLE
+            동안만 더 늘지 않는지 보고 반환 (늦게 온 중복도 세기 위해). 기본값 None
+
+    """
+    if exact:
+        return _count_topic_message_exact(profile, topic, timeout)
+
     linfo("[ ] count_topic_message")
+    topics = [t.strip() for t in topic.split(',')]
+    cons = new_consumer(profile, 'kfktest-counter')
+    try:
+        cnt = count_by_watermark(cons, topics)
+        if timeout is not None:
+            last = time.time()
+            while True:
+                settle = timeout
+                if expected is not None and cnt >= expected:
+                    settle = min(timeout, WATERMARK_SETTLE)
+                if time.time() - last >= settle:
+                    break
+                time.sleep(WATERMARK_POLL)
+                _cnt = count_by_watermark(cons, topics)
+                if _cnt != cnt:
+                    cnt = _cnt
+                    last = time.time()
+    finally:
+        cons.close()
+    linfo(f"[v] count_topic_message {cnt}")
+    return cnt
+
+
+def topic_watermarks(cons, topics):
+    """토픽들의 파티션별 (low, high) 워터마크 오프셋.
+
+    파티션별 조회를 쓰레드 풀에서 병렬로 한다.
+
+    Args:
+        cons: confluent_kafka Consumer
+        topics (list): 토픽명 리스트
+
+    Returns:
+        dict: (토픽, 파티션) 별 (low, high). 없는 토픽은 제외
+
+    """
+    tps = []
+    for topic in topics:
+        meta = cons.list_topics(topic, timeout=10).topics[topic]
+        if meta.error is not None:
+            continue
+        tps += [TopicPartition(topic, part) for part in meta.partitions]
+    if len(tps) == 0:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(32, len(tps))) as pool:
+        marks = pool.map(
+            lambda tp: cons.get_watermark_offsets(tp, timeout=10, cached=False),
+            tps)
+        return {(tp.topic, tp.partition): mark for tp, mark in zip(tps, marks)}
+
+
+def count_by_watermark(cons, topics):
+    """워터마크 오프셋으로 토픽들의 메시지 수 합."""
+    marks = topic_watermarks(cons, topics)
+    return sum(high - low for low, high in marks.values())
+
+
+def _count_topic_message_exact(profile, topic, timeout=10):
+    """kafka-console-consumer 로 토픽을 처음부터 읽어 메시지 수를 셈."""
+    linfo("[ ] count_topic_message exact")
     setup = load_setup(profile)
     kfk_ip = setup['kafka_public_ip']['value']
     timeout = timeout * 1000 if timeout is not None else None
@@ -464,7 +1314,7 @@ def count_topic_message(profile, topic, timeout=10):
     kfk_ssh = SSH(kfk_ip)
     ret = ssh_exec(kfk_ssh, cmd)
     cnt = int(ret.strip())
-    linfo(f"[v] count_topic_message {cnt}")
+    linfo(f"[v] count_topic_message exact {cnt}")
     return cnt
 
 
@@ -1105,14 +1955,20 @@ def claim_kafka(kfk_ssh):
         'partitions': TOPIC_PARTITIONS,
         'replications': TOPIC_REPLICATIONS,
         'cdc': False,      # CDC 여부,
-        'topic_cfg': None  # 토픽 생성 설정
+        'topic_cfg': None,  # 토픽 생성 설정
+        'truncate': KFKTEST_TOPIC_TRUNCATE,  # 지우고 다시 만드는 대신 비울지
     }])
 def xtopic(xkfssh, xprofile, request):
-    """카프카 토픽 초기화."""
+    """카프카 토픽 초기화.
+
+    truncate 면 대상 토픽들만 비우고 (truncate_topic) 다른 토픽은 남겨둔다.
+
+    """
     linfo("xtopic_")
+    truncate = request.param.get('truncate', KFKTEST_TOPIC_TRUNCATE)
 
     if request.param.get('cdc', False):
-        reset_topic(xkfssh, f"db1")
+        reset_topic(xkfssh, f"db1", truncate=truncate)
         scm = 'dbo' if xprofile == 'mssql' else 'test'
         topic = f"db1.{scm}.person"
     else:
@@ -1122,8 +1978,12 @@ def xtopic(xkfssh, xprofile, request):
         topics = [topic]
     partitions = request.param.get('partitions', TOPIC_PARTITIONS)
     replications = request.param.get('replications', TOPIC_REPLICATIONS)
-    delete_all_topics(xkfssh, xprofile)
     topic_cfg = request.param.get('topic_cfg', None)
+    if truncate and _truncate_or_recreate(xkfssh, topics, partitions,
+            replications, topic_cfg):
+        yield topic
+        return
+    delete_all_topics(xkfssh, xprofile)
     for _topic in topics:
         create_topic(xkfssh, _topic, partitions, replications, topic_cfg)
     yield topic
@@ -1177,6 +2037,88 @@ def _db_concur(profile, db_addr, db_user, db_passwd):
     return conn, cursor
 
 
+# 재사용할 DB 커넥션 ((db_type, host, user, db_name, local_infile) 별 유휴 커넥션 리스트)
+# enable_db_cache 전에는 db_release 가 커넥션을 닫는다
+_db_cache = None
+_db_cache_lock = Lock()
+
+
+def enable_db_cache():
+    """db_connect / db_release 가 커넥션을 닫지 않고 재사용하게 (kfktest.agent 용)."""
+    global _db_cache
+    with _db_cache_lock:
+        if _db_cache is None:
+            _db_cache = {}
+
+
+def _db_alive(db_type, conn):
+    try:
+        if db_type == 'mysql':
+            return conn.is_connected()
+        cursor = conn.cursor()
+        cursor.execute('SELECT 1')
+        cursor.fetchall()
+        return True
+    except Exception:
+        return False
+
+
+def db_connect(db_type, db_host, db_user, db_passwd, db_name, local_infile=False):
+    """DB 커넥션 얻기.
+
+    enable_db_cache 후에는 유휴 커넥션이 살아 있으면 그것을 준다.
+
+    Args:
+        db_type (str): DBMS 종류. mysql / mssql
+        db_host (str): DB 주소
+        db_user (str): DB 유저
+        db_passwd (str): DB 암호
+        db_name (str): DB 이름
+        local_infile (bool): MySQL LOAD DATA LOCAL INFILE 허용 여부
+
+    """
+    key = (db_type, db_host, db_user, db_name, local_infile)
+    while _db_cache is not None:
+        with _db_cache_lock:
+            idle = _db_cache.get(key, [])
+            if len(idle) == 0:
+                break
+            conn = idle.pop()
+        if _db_alive(db_type, conn):
+            return conn
+
+    if db_type == 'mysql':
+        conn = connect(host=db_host, user=db_user, password=db_passwd, db=db_name,
+            allow_local_infile=local_infile)
+    else:
+        conn = pymssql.connect(host=db_host, user=db_user, password=db_passwd, database=db_name)
+    conn._kfktest_key = key
+    return conn
+
+
+def db_release(conn):
+    """db_connect 로 얻은 커넥션 반납.
+
+    캐시를 쓰지 않거나 같은 접속 키의 유휴 커넥션이 DB_CACHE_IDLE 개 이상이면 닫는다.
+
+    """
+    if _db_cache is None:
+        conn.close()
+        return
+    # 열린 트랜잭션을 끝내야 다음 사용자가 오래된 스냅샷을 보지 않는다
+    try:
+        conn.rollback()
+    except Exception:
+        conn.close()
+        return
+    with _db_cache_lock:
+        idle = _db_cache.setdefault(conn._kfktest_key, [])
+        if len(idle) < DB_CACHE_IDLE:
+            idle.append(conn)
+            return
+    conn.close()
+
+
 def mysql_exec_many(cursor, stmt):
     """MySQL 용 멀티 라인 쿼리 실행
 
@@ -1212,13 +2154,18 @@ def drop_all_tables(profile):
 
 
 def local_produce_proc(profile, pid, msg_cnt, acks=1, duprate=0, lagrate=0,
-        with_key=False, with_ts=False):
-    """로컬 프로듀서 프로세스 함수."""
-    from kfktest.producer import produce
+        with_key=False, with_ts=False, workers=1):
+    """로컬 프로듀서 프로세스 함수.
+
+    workers 가 1 보다 크면 pid 부터 workers 개의 워커 프로세스를 fork 해 전송.
+
+    """
+    from kfktest.producer import produce_workers
 
     linfo(f"[ ] produce process {pid}")
-    produce(profile, messages=msg_cnt, acks=acks, dev=True, duprate=duprate,
-        lagrate=lagrate, with_key=with_key, with_ts=with_ts)
+    produce_workers(profile, workers, pid, messages=msg_cnt, acks=acks,
+        dev=True, duprate=duprate, lagrate=lagrate, with_key=with_key,
+        with_ts=with_ts)
     linfo(f"[v] produce process {pid}")
 
 
@@ -1234,14 +2181,23 @@ def local_consume_proc(profile, pid, q, topic=None, timeout=10):
     linfo(f"[v] consume process {pid} {cnt}")
 
 
-def remote_produce_proc(profile, setup, pid, msg_cnt):
-    """원격 프로듀서 프로세스 함수."""
-    from kfktest.producer import produce
+def remote_produce_proc(profile, setup, pid, msg_cnt, workers=1, agent=False):
+    """원격 프로듀서 프로세스 함수.
+
+    workers 가 1 보다 크면 하나의 SSH 세션으로 pid 부터 workers 개의 워커가 전송.
+    agent 면 노드에 상주하는 kfktest.agent 로 실행하고 결과 dict 를 반환.
 
+    """
     linfo(f"[ ] produce process {pid}")
     pro_ip = setup['producer_public_ip']['value']
+    if agent:
+        from kfktest.agent import get_agent
+        ret = get_agent(pro_ip, profile, 'producer').run('produce', workers=workers,
+            pid=pid, messages=msg_cnt)
+        linfo(f"[v] produce process {pid}")
+        return ret
     ssh = SSH(pro_ip, 'producer')
-    cmd = f"cd kfktest/deploy/{profile} && python3 -m kfktest.producer {profile} -p {pid} -m {msg_cnt}"
+    cmd = f"cd kfktest/deploy/{profile} && python3 -m kfktest.producer {profile} -p {pid} -m {msg_cnt} -w {workers}"
     ret = ssh_exec(ssh, cmd, False)
     linfo(ret)
     linfo(f"[v] produce process {pid}")
@@ -1260,49 +2216,102 @@ def remote_consume_proc(profile, setup, pid):
     return ret
 
 
-def local_select_proc(profile, pid):
+def local_select_proc(profile, pid, pattern=None):
     """로컬에서 가짜 데이터 셀렉트 프로세스 함수."""
     linfo(f"Select process {pid} start")
     cmd = f"cd ../deploy/{profile} && python -m kfktest.selector {profile} -p {pid} -d "
+    if pattern is not None:
+        cmd += f'--pattern {pattern}'
     local_exec(cmd)
     linfo(f"Select process {pid} done")
 
 
 def local_insert_proc(profile, pid, epoch=DB_EPOCH, batch=DB_BATCH, hide=False,
-        table=None):
-    """로컬에서 가짜 데이터 인서트 프로세스 함수."""
+        table=None, mode='many', rate=None, workers=1):
+    """로컬에서 가짜 데이터 인서트 프로세스 함수.
+
+    workers 가 1 보다 크면 한 프로세스에서 pid 부터 workers 개의 워커가 인서트.
+
+    """
     linfo(f"[ ] local insert process {pid} {epoch} {table}")
     hide = '-n' if hide else ''
-    cmd = f"cd ../deploy/{profile} && python -m kfktest.inserter {profile} -p {pid} -e {epoch} -b {batch} -d {hide}"
+    cmd = f"cd ../deploy/{profile} && python -m kfktest.inserter {profile} -p {pid} -e {epoch} -b {batch} -d {hide} --mode {mode} -w {workers}"
+    if rate is not None:
+        cmd += f' --rate {rate}'
     if table is not None:
         cmd += f' -t {table}'
     local_exec(cmd)
     linfo(f"[v] local insert process {pid} {epoch} {table}")
 
 
-def remote_select_proc(profile, setup, pid):
-    """원격 셀렉트 노드에서 가짜 데이터 셀렉트 (원격 노드에 setup.json 있어야 함)."""
-    linfo(f"[ ] select process {pid}")
+def remote_select_job(profile, setup, pid, pattern=None):
+    """원격 셀렉트 명령의 fanout_exec 작업."""
     sel_ip = setup['selector_public_ip']['value']
-    ssh = SSH(sel_ip, 'selector')
     cmd = f"cd kfktest/deploy/{profile} && python3 -m kfktest.selector {profile} -p {pid}"
-    ret = ssh_exec(ssh, cmd, False)
+    if pattern is not None:
+        cmd += f' --pattern {pattern}'
+    return dict(host=sel_ip, cmd=cmd, name='selector')
+
+
+def remote_select_proc(profile, setup, pid, pattern=None, agent=False):
+    """원격 셀렉트 노드에서 가짜 데이터 셀렉트 (원격 노드에 setup.json 있어야 함).
+
+    agent 면 노드에 상주하는 kfktest.agent 로 실행하고 읽은 행수를 반환.
+
+    """
+    linfo(f"[ ] select process {pid}")
+    if agent:
+        from kfktest.agent import get_agent
+        args = dict(pid=pid) if pattern is None else dict(pid=pid, pattern=pattern)
+        sel_ip = setup['selector_public_ip']['value']
+        ret = get_agent(sel_ip, profile, 'selector').run('select', **args)
+        linfo(f"[v] select process {pid}")
+        return ret
+    job = remote_select_job(profile, setup, pid, pattern)
+    ssh = SSH(job['host'], job['name'])
+    ret = ssh_exec(ssh, job['cmd'], False)
     linfo(ret)
     linfo(f"[v] select process {pid}")
     return ret
 
 
-def remote_insert_proc(profile, setup, pid, epoch=DB_EPOCH, batch=DB_BATCH,
-        hide=False, table=None, delay=0):
-    """원격 인서트 노드에서 가짜 데이터 인서트 (원격 노드에 setup.json 있어야 함)."""
-    linfo(f"[ ] remote insert process {pid}")
+def remote_insert_job(profile, setup, pid, epoch=DB_EPOCH, batch=DB_BATCH,
+        hide=False, table=None, delay=0, mode='many', rate=None, workers=1):
+    """원격 인서트 명령의 fanout_exec 작업."""
     ins_ip = setup['inserter_public_ip']['value']
     hide = '-n' if hide else ''
-    ssh = SSH(ins_ip, 'inserter')
-    cmd = f"cd kfktest/deploy/{profile} && python3 -m kfktest.inserter {profile} -p {pid} -e {epoch} -b {batch} {hide} --delay {delay}"
+    cmd = f"cd kfktest/deploy/{profile} && python3 -m kfktest.inserter {profile} -p {pid} -e {epoch} -b {batch} {hide} --delay {delay} --mode {mode} -w {workers}"
+    if rate is not None:
+        cmd += f' --rate {rate}'
     if table is not None:
         cmd += f' -t {table}'
-    ret = ssh_exec(ssh, cmd, False)
+    return dict(host=ins_ip, cmd=cmd, name='inserter')
+
+
+def remote_insert_proc(profile, setup, pid, epoch=DB_EPOCH, batch=DB_BATCH,
+        hide=False, table=None, delay=0, mode='many', rate=None, workers=1,
+        agent=False):
+    """원격 인서트 노드에서 가짜 데이터 인서트 (원격 노드에 setup.json 있어야 함).
+
+    workers 가 1 보다 크면 하나의 SSH 세션으로 pid 부터 workers 개의 워커가 인서트.
+    agent 면 노드에 상주하는 kfktest.agent 로 실행하고 워커별 지연 시간 요약을 반환.
+
+    """
+    linfo(f"[ ] remote insert process {pid}")
+    if agent:
+        from kfktest.agent import get_agent
+        args = dict(workers=workers, pid=pid, epoch=epoch, batch=batch,
+            no_result=hide, delay=delay, mode=mode, rate=rate)
+        if table is not None:
+            args['table'] = table
+        ins_ip = setup['inserter_public_ip']['value']
+        ret = get_agent(ins_ip, profile, 'inserter').run('insert', **args)
+        linfo(f"[v] remote insert process {pid}")
+        return ret
+    job = remote_insert_job(profile, setup, pid, epoch, batch, hide, table,
+        delay, mode, rate, workers)
+    ssh = SSH(job['host'], job['name'])
+    ret = ssh_exec(ssh, job['cmd'], False)
     linfo(ret)
     linfo(f"[v] remote insert process {pid}")
     return ret
@@ -1314,7 +2323,7 @@ def producer_logger_proc(profile, messages=10000, latency=0):
     setup = load_setup(profile)
     pip = setup['producer_public_ip']['value']
     ssh = SSH(pip, 'producer')
-    cmd = f"python3 -m kfktest.logger test.log -m {messages} -l {latency}"
+    cmd = f"python3 -m kfktest.logger test.log -m {messages} -l {latency} -p {profile}"
     ret = ssh_exec(ssh, cmd, False)
     linfo(f"[v] producer_logger_proc")
     return ret
@@ -1359,25 +2368,16 @@ def _xtable(xprofile, table, request):
     pre_batch = request.param.get('pre_batch', 0)
     fix_regdt = request.param.get('fix_regdt', None)
     datetime1 = request.param.get('datetime1', False)
-    conn, cursor = reset_table(xprofile, table, fix_regdt, datetime1=datetime1)
+    key_index = request.param.get('key_index', False)
+    conn, cursor = reset_table(xprofile, table, fix_regdt, datetime1=datetime1,
+                               key_index=key_index)
 
     from kfktest.inserter import insert
     if pre_epoch > 0 :
         linfo(f"[ ] insert initial data to {table}")
-        # Insert 프로세스들 시작
-        ins_pros = []
-        for pid in range(1, NUM_INS_PROCS + 1):
-            # insert 프로세스
-            p = Process(target=local_insert_proc, args=(xprofile, pid,
-                                                        pre_epoch,
-                                                        pre_batch,
-                                                        True,
-                                                        table))
-            ins_pros.append(p)
-            p.start()
-
-        for p in ins_pros:
-            p.join()
+        # 하나의 Insert 프로세스에서 NUM_INS_PROCS 개 워커로 인서트
+        local_insert_proc(xprofile, 1, pre_epoch, pre_batch, True, table,
+                          workers=NUM_INS_PROCS)
         linfo(f"[v] insert initial data to {table}")
 
 
@@ -1642,20 +2642,68 @@ def wait_vm_state(profile, inst_name, state):
 
 
 
-def count_rows(db_type, cursor):
+def count_rows(db_type, cursor, mode='exact'):
+    """person 테이블 행수 얻기.
+
+    Args:
+        db_type (str): DBMS 종류. mysql / mssql
+        cursor: DB 커서
+        mode (str): 얻는 방식. COUNT_MODES 중 하나. 기본값 exact
+            - exact: COUNT(*). 정확하나 테이블 전체를 읽어 인서트와 경합
+            - maxid: AUTO_INCREMENT / IDENTITY 키의 최대값. 기본키 인덱스의
+                끝만 읽어 싸고, 인서트만 있으면 행수와 같다 (삭제나 롤백이 있으면 더 큼)
+            - meta: DBMS 메타데이터의 행수. 테이블을 읽지 않으나 근사값
+                (MSSQL sys.dm_db_partition_stats, MySQL information_schema).
+                통계 갱신 시점에 따라 인서트 중에도 같은 값이 이어질 수 있기에
+                인서트 종료 판단 (selector 의 count_mode) 에는 쓰지 않는다
+
+    """
+    assert mode in COUNT_MODES
+    if mode == 'maxid':
+        return max_row_id(db_type, cursor)
+
+    if mode == 'exact':
+        tbl = 'person' if db_type == 'mysql' else '[test].[dbo].[person]'
+        sql = f'''
+        SELECT COUNT(*) cnt
+        FROM {tbl}
+        '''
+    elif db_type == 'mysql':
+        # InnoDB 는 통계 기반 추정치. MySQL 8 은 information_schema 통계를
+        # information_schema_stats_expiry (기본 86400 초) 동안 캐시하기에 끔
+        cursor.execute('SET SESSION information_schema_stats_expiry = 0')
+        sql = '''
+        SELECT TABLE_ROWS
+        FROM information_schema.tables
+        WHERE table_schema = 'test' AND table_name = 'person'
+        '''
+    else:
+        sql = '''
+        SELECT SUM(row_count)
+        FROM sys.dm_db_partition_stats
+        WHERE object_id = OBJECT_ID('test.dbo.person') AND index_id IN (0, 1)
+        '''
+    cursor.execute(sql)
+    res = cursor.fetchone()
+    return res[0] or 0
+
+
+def max_row_id(db_type, cursor):
+    """테이블의 최대 id (AUTO_INCREMENT / IDENTITY 키).
+
+    기본키 인덱스의 끝만 읽기에 테이블 크기와 무관하게 싸다. 행이 없으면 0.
+
+    """
     tbl = 'person' if db_type == 'mysql' else '[test].[dbo].[person]'
-    cursor.execute(f'''
-    SELECT COUNT(*) cnt
-    FROM {tbl}
-    ''')
+    cursor.execute(f'SELECT MAX(id) FROM {tbl}')
     res = cursor.fetchone()
-    return res[0]
+    return res[0] or 0
 
 
-def count_table_row(profile):
-    """테이블 행수 얻기."""
+def count_table_row(profile, mode='exact'):
+    """테이블 행수 얻기 (mode 는 count_rows 참고)."""
     _, cursor = db_concur(profile)
-    return count_rows(profile, cursor)
+    return count_rows(profile, cursor, mode)
 
 
 @pytest.fixture
@@ -1865,22 +2913,20 @@ def s3_listfile(bucket, adir):
     return objects
 
 
-def s3_count_sinkmsg(bucket, adir):
-    """S3 Sink 된 메시지 카운팅.
+def s3_iter_sinkmsg(bucket, adir):
+    """S3 Sink 된 메시지를 하나씩 디코딩해 반환.
 
-    - S3 경로에 S3 Sink 커넥터가 올린 메시지 수를 센다
     - 메시지는 .gz + json 형태 가정
+    - 파일 단위로 받아 풀기에 메모리는 파일 하나 크기
 
     """
-    linfo(f"[ ] s3_count_sinkmsg s3://{bucket}/{adir}")
     assert valid_location(bucket, adir, True)
     s3 = boto3.client('s3')
-    mcnt = 0
     for key in s3_listfile(bucket, adir):
         print(key)
         if not key.endswith('.gz'):
             continue
-        data = s3.get_object(Bucket=KFKTEST_S3_BUCKET, Key=key)
+        data = s3.get_object(Bucket=bucket, Key=key)
         body = data['Body'].read()
         cfile = io.BytesIO(body)
         dfile = gzip.GzipFile(fileobj=cfile)
@@ -1888,13 +2934,40 @@ def s3_count_sinkmsg(bucket, adir):
         for line in text.split('\n'):
             if line == '':
                 continue
-            # json 체크
-            json.loads(line)
-            mcnt += 1
+            yield json.loads(line)
+
+
+def s3_count_sinkmsg(bucket, adir):
+    """S3 Sink 된 메시지 카운팅.
+
+    - S3 경로에 S3 Sink 커넥터가 올린 메시지 수를 센다
+    - 메시지는 .gz + json 형태 가정
+
+    """
+    linfo(f"[ ] s3_count_sinkmsg s3://{bucket}/{adir}")
+    mcnt = 0
+    for _ in s3_iter_sinkmsg(bucket, adir):
+        mcnt += 1
     linfo(f"[v] s3_count_sinkmsg s3://{bucket}/{adir}")
     return mcnt
 
 
+def s3_check_seq(bucket, adir, window=1000, expected=None):
+    """S3 Sink 된 메시지들의 인서터별 sid 시퀀스 검사 (kfktest.verify.SeqChecker).
+
+    Returns:
+        bool: 빈틈과 중복이 없으면 True
+
+    """
+    from kfktest.verify import check_seq
+
+    linfo(f"[ ] s3_check_seq s3://{bucket}/{adir}")
+    checker = check_seq(s3_iter_sinkmsg(bucket, adir), window, expected)
+    ok = checker.report(f"S3 {adir}", linfo)
+    linfo(f"[v] s3_check_seq s3://{bucket}/{adir}")
+    return ok
+
+
 def rot_insert_proc(profile, num_insert, batch_row):
     """로테이션 테스트용 인서트."""
     linfo(f"[ ] rot_insert_proc {profile}")
@@ -2154,34 +3227,138 @@ def delete_schema(ksql_ssh, name, hard=False):
     linfo(f"[v] delete_schema {name}")
 
 
-def consume_loop(consumer, topics, msg_process, timeout=10):
-    """메시지 컨슘 루프."""
-    running = True
+def consume_loop(consumer, topics, msg_process, timeout=10,
+        batch=CONSUME_BATCH, verbose=False, eof=False):
+    """메시지 컨슘 루프.
+
+    - 메시지를 batch 개씩 consume() 으로 받는다 (메시지당 poll() 보다 훨씬 빠름)
+    - 디코딩은 하지 않고 메시지 객체를 msg_process 에 넘긴다
+    - timeout 초 동안 메시지가 없으면 종료
+
+    Args:
+        consumer: confluent_kafka Consumer
+        topics (list): 구독할 토픽들
+        msg_process (callable): 메시지 객체별로 불릴 함수
+        timeout (int): 종료할 유휴 시간 (초). 기본값 10
+        batch (int): 한 번에 받을 최대 메시지 수. 기본값 CONSUME_BATCH
+        verbose (bool): 디코딩한 메시지 출력 여부. 기본값 False
+        eof (bool): 할당 시점의 끝 오프셋에 닿으면 바로 종료 (EndOffsets 참고).
+            컨슈머는 enable.partition.eof 가 켜져 있어야 함. 기본값 False
+
+    """
+    try:
+        ends = EndOffsets() if eof else None
+        _subscribe(consumer, topics, ends)
+        for msg in _consume_batches(consumer, timeout, batch, ends):
+            if verbose:
+                print(json.loads(msg.value()))
+            msg_process(msg)
+    finally:
+        # Close down consumer to commit final offsets.
+        consumer.close()
+
+
+def consume_assigned(consumer, tps, msg_process, timeout=10,
+        batch=CONSUME_BATCH, eof=False):
+    """그룹 구독 없이 지정된 파티션들을 직접 할당받아 컨슘.
+
+    리밸런스가 없기에 여러 프로세스가 파티션을 나눠 읽을 때 쓴다.
+    인자는 consume_loop 와 같고, tps 는 TopicPartition 리스트.
+
+    """
     try:
-        consumer.subscribe(topics)
+        consumer.assign(tps)
+        ends = None
+        if eof:
+            ends = EndOffsets()
+            ends.on_assign(consumer, tps)
+        for msg in _consume_batches(consumer, timeout, batch, ends):
+            msg_process(msg)
+    finally:
+        consumer.close()
+
+
+class EndOffsets:
+    """할당된 파티션별 끝 오프셋에 닿았는지 추적.
 
-        while running:
-            msg = consumer.poll(timeout=timeout)
-            if msg is None:
+    할당시 파티션별 high 워터마크를 기록해 두고, 그 직전 오프셋의 메시지를 받거나
+    그 이상의 오프셋에서 파티션 EOF 이벤트가 오면 해당 파티션은 끝난 것으로 본다.
+    할당 이후 들어온 메시지는 읽지 않을 수 있다.
+
+    """
+
+    def __init__(self):
+        self.ends = {}
+        self.done = set()
+        self.assigned = False
+
+    def on_assign(self, cons, parts):
+        for tp in parts:
+            key = (tp.topic, tp.partition)
+            low, high = cons.get_watermark_offsets(tp, timeout=10, cached=False)
+            self.ends[key] = high
+            if high <= low:
+                # 빈 파티션
+                self.done.add(key)
+        self.assigned = True
+
+    def update(self, topic, partition, next_offset):
+        """다음에 읽을 오프셋으로 파티션 끝 여부 갱신."""
+        key = (topic, partition)
+        if key in self.ends and next_offset >= self.ends[key]:
+            self.done.add(key)
+
+    def finished(self):
+        return self.assigned and len(self.done) >= len(self.ends)
+
+
+def _subscribe(cons, topics, ends=None):
+    if ends is None:
+        cons.subscribe(topics)
+    else:
+        cons.subscribe(topics, on_assign=ends.on_assign)
+
+
+def _consume_batches(cons, timeout, batch, ends=None):
+    """구독된 컨슈머에서 batch 개씩 받아 에러가 아닌 메시지를 하나씩 반환.
+
+    timeout 초 동안 메시지가 없으면 종료. 마지막 덜 찬 배치 때문에 timeout 만큼
+    기다리지 않게 consume() 은 짧게 (CONSUME_POLL) 부르고 유휴 시간은 따로 잰다.
+    ends (EndOffsets) 가 주어지면 모든 파티션이 끝에 닿는 즉시 종료하고, 유휴
+    timeout 은 안전장치로만 쓰인다.
+
+    """
+    idle_st = time.time()
+    while ends is None or not ends.finished():
+        msgs = cons.consume(num_messages=batch, timeout=min(CONSUME_POLL, timeout))
+        if len(msgs) == 0:
+            if time.time() - idle_st >= timeout:
                 break
+            continue
+        idle_st = time.time()
+        for msg in msgs:
             if msg.error():
                 if msg.error().code() == KafkaError._PARTITION_EOF:
                     # End of partition event
-                    sys.stderr.write('%% %s [%d] reached end at offset %d\n' %
-                                     (msg.topic(), msg.partition(), msg.offset()))
-                elif msg.error():
+                    if ends is not None:
+                        ends.update(msg.topic(), msg.partition(), msg.offset())
+                    else:
+                        sys.stderr.write('%% %s [%d] reached end at offset %d\n' %
+                                         (msg.topic(), msg.partition(), msg.offset()))
+                else:
                     raise KafkaException(msg.error())
             else:
-                data = json.loads(msg.value())
-                print(data)
-                msg_process(data)
-    finally:
-        # Close down consumer to commit final offsets.
-        consumer.close()
+                if ends is not None:
+                    ends.update(msg.topic(), msg.partition(), msg.offset() + 1)
+                yield msg
+
+
+def new_consumer(profile, gid=None, eof=False):
+    """컨슈머 생성.
 
+    eof 가 참이면 파티션 끝 이벤트를 켠다 (consume_iter / consume_loop 의 eof 모드용).
 
-def new_consumer(profile, gid=None):
-    """컨슈머 생성."""
+    """
     setup = load_setup(profile)
     addr = setup['kafka_public_ip']['value']
     port = 19092
@@ -2190,24 +3367,22 @@ def new_consumer(profile, gid=None):
             'group.id': gid,
             'bootstrap.servers': f'{addr}:{port}',
             'auto.offset.reset': 'earliest',
+            'enable.partition.eof': eof,
         })
     return cons
 
 
-def consume_iter(cons, topics, timeout=10):
-    cons.subscribe(topics)
-    time.sleep(3)
-    while True:
-        msg = cons.poll(timeout=timeout)
-        if msg is None:
-            break
-        if msg.error():
-            if msg.error().code() == KafkaError._PARTITION_EOF:
-                # End of partition event
-                sys.stderr.write('%% %s [%d] reached end at offset %d\n' %
-                                    (msg.topic(), msg.partition(), msg.offset()))
-            elif msg.error():
-                raise KafkaException(msg.error())
-        else:
-            yield msg
+def consume_iter(cons, topics, timeout=10, batch=CONSUME_BATCH, eof=False):
+    """토픽들을 구독해 메시지 객체를 하나씩 반환 (batch 개씩 받음).
+
+    eof 가 참이면 구독 후 기다리지 않고, 할당 시점의 끝 오프셋에 닿는 즉시 끝난다
+    (컨슈머는 enable.partition.eof 가 켜져 있어야 함. new_consumer 의 eof 참고).
+    아니면 timeout 초 동안 메시지가 없을 때 끝난다.
+
+    """
+    ends = EndOffsets() if eof else None
+    _subscribe(cons, topics, ends)
+    if not eof:
+        time.sleep(3)
+    yield from _consume_batches(cons, timeout, batch, ends)
     cons.close()
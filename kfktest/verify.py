@@ -0,0 +1,341 @@
+"""
+
+컨슘한 메시지의 중복 / 누락 검증
+
+메시지마다 페이로드를 모두 들고 있지 않고, 기대하는 id 범위 크기의 카운트 배열에
+본 횟수만 기록한다 (id 당 1 바이트). 페이로드는 중복으로 드러난 메시지의 것만
+남기기에 1 억 메시지 토픽도 수백 MB 안에서 검증할 수 있다.
+
+또 inserter 가 매기는 pid 별 sid 시퀀스로 인서터별 빈틈 / 중복 / 순서 바뀜을
+스트리밍으로 검사한다 (SeqChecker).
+
+"""
+import heapq
+import copy
+from collections import defaultdict
+
+import numpy as np
+
+MAX_COUNT = np.iinfo(np.uint8).max  # id 별 카운트 상한 (넘으면 포화)
+
+
+def id_ranges(ids):
+    """정렬된 id 배열을 연속 구간들로 압축.
+
+    Returns:
+        list: (시작, 끝) 튜플 리스트 (끝 포함)
+
+    """
+    ids = np.asarray(ids)
+    if len(ids) == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(ids) != 1)
+    starts = np.concatenate([[0], breaks + 1])
+    ends = np.concatenate([breaks, [len(ids) - 1]])
+    return [(int(ids[s]), int(ids[e])) for s, e in zip(starts, ends)]
+
+
+def mask_ranges(mask, base=0):
+    """불리언 마스크의 True 연속 구간들.
+
+    id 배열을 만들지 않고 (id 당 8 바이트) 마스크 경계의 차분으로 구간 시작 / 끝만
+    찾기에, 추가 메모리는 마스크 크기 (id 당 1 바이트) 의 몇 배 정도다.
+
+    Args:
+        mask (ndarray): 불리언 배열
+        base (int): 인덱스 0 에 해당하는 id
+
+    Returns:
+        list: (시작, 끝) 튜플 리스트 (끝 포함)
+
+    """
+    if len(mask) == 0:
+        return []
+    edges = np.diff(mask.view(np.int8), prepend=np.int8(0), append=np.int8(0))
+    starts = np.flatnonzero(edges > 0)
+    ends = np.flatnonzero(edges < 0) - 1
+    return [(int(s) + base, int(e) + base) for s, e in zip(starts, ends)]
+
+
+def format_ranges(ranges, limit=20):
+    """구간 리스트를 '1-10, 15, 20-30' 식 문자열로 (limit 개 까지)."""
+    parts = [f'{s}' if s == e else f'{s}-{e}' for s, e in ranges[:limit]]
+    if len(ranges) > limit:
+        parts.append(f'... ({len(ranges) - limit} more ranges)')
+    return ', '.join(parts)
+
+
+class IdTracker:
+    """id 별 본 횟수를 NumPy uint8 배열로 기록해 중복 / 누락 검출.
+
+    기대 범위를 넘는 id 가 오면 배열을 두 배씩 늘린다. min_id 보다 작은 id 는
+    따로 센다.
+
+    Args:
+        max_id (int): 기대하는 최대 id
+        min_id (int): 기대하는 최소 id. 기본값 1
+        keep_dups (bool): 중복 메시지의 정보를 남길지 여부. 기본값 True
+
+    """
+
+    def __init__(self, max_id, min_id=1, keep_dups=True):
+        self.min_id = min_id
+        self.max_id = max_id
+        self.counts = np.zeros(max_id - min_id + 1, dtype=np.uint8)
+        self.keep_dups = keep_dups
+        self.dups = defaultdict(list)
+        self.total = 0
+        self.dup_cnt = 0
+        self.below = 0
+
+    def _grow(self, idx):
+        size = len(self.counts)
+        while size <= idx:
+            size *= 2
+        counts = np.zeros(size, dtype=np.uint8)
+        counts[:len(self.counts)] = self.counts
+        self.counts = counts
+
+    def add(self, id, info=None):
+        """id 하나를 기록.
+
+        Args:
+            id (int): 메시지 id
+            info: 중복일 때 남길 정보 (토픽, 파티션, 오프셋, 페이로드 등)
+
+        Returns:
+            bool: 이미 본 id 이면 True
+
+        """
+        self.total += 1
+        idx = id - self.min_id
+        if idx < 0:
+            self.below += 1
+            return False
+        if idx >= len(self.counts):
+            self._grow(idx)
+        cnt = self.counts[idx]
+        if cnt < MAX_COUNT:
+            self.counts[idx] = cnt + 1
+        if cnt == 0:
+            return False
+        self.dup_cnt += 1
+        if self.keep_dups:
+            self.dups[id].append(info)
+        return True
+
+    def trimmed(self):
+        """본 id 구간만 담은 사본 (프로세스 간에 보낼 때 배열 크기를 줄이려고).
+
+        사본의 min_id 는 처음 본 id 이기에 missing 대신 merge 용으로만 쓴다.
+
+        """
+        trim = copy.copy(self)
+        seen = self.counts > 0
+        if not seen.any():
+            trim.counts = self.counts[:0].copy()
+            return trim
+        lo = int(np.argmax(seen))
+        hi = len(seen) - 1 - int(np.argmax(seen[::-1]))
+        trim.counts = self.counts[lo:hi + 1].copy()
+        trim.min_id = self.min_id + lo
+        return trim
+
+    def merge(self, other):
+        """다른 트래커의 기록을 합침 (other.min_id 가 이쪽 min_id 이상이어야 함).
+
+        다른 트래커에서 처음 본 id 가 이쪽에도 있으면 중복이지만 그 메시지 정보는 없다.
+
+        """
+        assert other.min_id >= self.min_id
+        off = other.min_id - self.min_id
+        size = len(other.counts)
+        if off + size > len(self.counts):
+            self._grow(off + size - 1)
+        mine = self.counts[off:off + size].astype(np.uint16)
+        theirs = other.counts.astype(np.uint16)
+        self.dup_cnt += other.dup_cnt + int(np.count_nonzero((mine > 0) & (theirs > 0)))
+        self.counts[off:off + size] = np.minimum(mine + theirs, MAX_COUNT).astype(np.uint8)
+        for id, infos in other.dups.items():
+            self.dups[id] += infos
+        self.total += other.total
+        self.below += other.below
+        self.max_id = max(self.max_id, other.max_id)
+        return self
+
+    def missing(self):
+        """min_id ~ max_id 중 한 번도 보지 못한 id 들의 구간 리스트."""
+        counts = self.counts[:self.max_id - self.min_id + 1]
+        return mask_ranges(counts == 0, self.min_id)
+
+    def duplicated(self):
+        """두 번 이상 본 id 들의 구간 리스트."""
+        return mask_ranges(self.counts > 1, self.min_id)
+
+    def extra(self):
+        """max_id 보다 큰데 본 id 수."""
+        return int(np.count_nonzero(self.counts[self.max_id - self.min_id + 1:]))
+
+
+def row_of(data):
+    """커넥터 메시지에서 행 데이터를 꺼냄.
+
+    - JDBC 소스 (JsonConverter 스키마 포함): {"schema": .., "payload": {행}}
+    - Debezium: {"payload": {"before": .., "after": .., "op": ..}} 또는 payload 없이
+        before / after. 삭제는 before 를 쓴다
+    - S3 싱크: 한 줄에 위의 메시지나 행 하나
+
+    Returns:
+        dict: 행 데이터. 툼스톤 등 행이 없으면 None
+
+    """
+    if data is None:
+        return None
+    if data.get('payload') is not None:
+        data = data['payload']
+    if 'after' in data or 'before' in data:
+        data = data.get('after') or data.get('before')
+    return data
+
+
+class SeqChecker:
+    """인서터별 (pid) sid 시퀀스의 빈틈 / 중복 / 순서 바뀜을 스트리밍으로 검사.
+
+    pid 마다 연속으로 받은 마지막 sid 다음 값 (high-water mark) 과, 그보다 앞서 온
+    sid 들의 작은 창 (힙과 중복 확인용 집합) 만 유지하기에 메모리는 pid 수 x window 에 비례한다.
+    창 크기보다 멀리 앞선 sid 가 오면 그 사이는 빈틈으로 확정한다. 빈틈으로
+    확정된 sid 가 나중에 오면 늦게 온 것으로 센다.
+
+    inserter 는 실행마다 sid 를 0 부터 매기기에, 같은 pid 로 여러 번 인서트한
+    테이블에서는 중복으로 보인다.
+
+    Args:
+        window (int): pid 별 순서 바뀜 허용 창 크기. 기본값 1000
+        start (int): 첫 sid. 기본값 0
+        expected (int): pid 별 기대 행수. 주어지면 끝에서 못 받은 sid 도 빈틈으로
+
+    """
+
+    def __init__(self, window=1000, start=0, expected=None):
+        self.window = window
+        self.start = start
+        self.expected = expected
+        self.next = {}
+        self.pending = {}
+        self.waiting = {}
+        self.stats = {}
+        self.gaps = defaultdict(list)
+
+    def _stat(self, pid):
+        if pid not in self.stats:
+            self.stats[pid] = dict(received=0, dups=0, reorders=0, late=0)
+            self.next[pid] = self.start
+            self.pending[pid] = []
+            self.waiting[pid] = set()
+        return self.stats[pid]
+
+    def _drain(self, pid):
+        """대기 중인 sid 들로 연속 구간을 앞으로 밀어냄."""
+        pending = self.pending[pid]
+        waiting = self.waiting[pid]
+        while len(pending) > 0 and pending[0] == self.next[pid]:
+            waiting.discard(heapq.heappop(pending))
+            self.next[pid] += 1
+
+    def _in_gap(self, pid, sid):
+        for i, (s, e) in enumerate(self.gaps[pid]):
+            if s <= sid <= e:
+                # 늦게 온 sid 를 빈틈에서 빼냄
+                del self.gaps[pid][i]
+                if s < sid:
+                    self.gaps[pid].append((s, sid - 1))
+                if sid < e:
+                    self.gaps[pid].append((sid + 1, e))
+                return True
+        return False
+
+    def add(self, pid, sid):
+        """(pid, sid) 하나를 기록."""
+        stat = self._stat(pid)
+        stat['received'] += 1
+        nxt = self.next[pid]
+        pending = self.pending[pid]
+        waiting = self.waiting[pid]
+        if sid < nxt:
+            if self._in_gap(pid, sid):
+                stat['late'] += 1
+            else:
+                stat['dups'] += 1
+            return
+        if sid == nxt:
+            self.next[pid] += 1
+            self._drain(pid)
+            return
+        if sid in waiting:
+            stat['dups'] += 1
+            return
+        stat['reorders'] += 1
+        heapq.heappush(pending, sid)
+        waiting.add(sid)
+        # 창을 넘어서면 창 밖 (sid - window 까지) 만 빈틈으로 확정.
+        # 창 안의 sid 들은 아직 순서가 바뀌어 올 수 있다
+        low = sid - self.window + 1
+        while self.next[pid] < low:
+            upto = min(pending[0], low)
+            self.gaps[pid].append((self.next[pid], upto - 1))
+            self.next[pid] = upto
+            self._drain(pid)
+
+    def add_row(self, data):
+        """커넥터 메시지 (디코딩된 dict) 하나를 기록. 행이 없으면 무시."""
+        row = row_of(data)
+        if row is None or 'pid' not in row:
+            return
+        self.add(row['pid'], row['sid'])
+
+    def finish(self):
+        """남은 대기 sid 들과 (expected 가 있으면) 못 받은 끝부분을 빈틈으로 확정."""
+        for pid in self.stats:
+            pending = self.pending[pid]
+            while len(pending) > 0:
+                first = pending[0]
+                self.gaps[pid].append((self.next[pid], first - 1))
+                self.next[pid] = first
+                self._drain(pid)
+            if self.expected is not None:
+                end = self.start + self.expected
+                if self.next[pid] < end:
+                    self.gaps[pid].append((self.next[pid], end - 1))
+                    self.next[pid] = end
+        return self
+
+    def report(self, name, log):
+        """pid 별 결과 출력.
+
+        Returns:
+            bool: 빈틈과 중복이 없으면 True
+
+        """
+        ok = True
+        for pid in sorted(self.stats.keys()):
+            stat = self.stats[pid]
+            gaps = sorted(self.gaps[pid])
+            nmiss = sum(e - s + 1 for s, e in gaps)
+            log(f"{name} pid {pid}: received {stat['received']}, dups {stat['dups']}, "
+                f"reorders {stat['reorders']}, late {stat['late']}, missing {nmiss} "
+                f"{format_ranges(gaps)}")
+            ok = ok and nmiss == 0 and stat['dups'] == 0
+        return ok
+
+
+def check_seq(records, window=1000, expected=None):
+    """디코딩된 커넥터 메시지들을 SeqChecker 로 검사 (S3 싱크 결과 등).
+
+    Returns:
+        SeqChecker: finish 된 체커
+
+    """
+    checker = SeqChecker(window, expected=expected)
+    for data in records:
+        checker.add_row(data)
+    return checker.finish()
@@ -0,0 +1,236 @@
+"""
+
+INSERT / UPDATE / DELETE 가 섞인 워크로드 생성
+
+inserter 는 INSERT 만 하지만, CDC 에서는 before / after 이미지가 실리는 UPDATE 와
+DELETE 의 메시지가 더 크고 비싸다. 비율 (예: 70/25/5) 에 맞춰 세 가지 작업을 섞어
+CDC / CT 의 처리 속도와 메시지 양을 측정한다.
+
+UPDATE / DELETE 대상은 직접 인서트한 (pid, sid) 키를 로컬 인덱스로 관리해 고르기에
+대상을 찾으려 SELECT 할 필요가 없다. 대상 테이블에 (pid, sid) 인덱스가 있어야
+UPDATE / DELETE 가 전체 스캔을 하지 않는다 (table.py 의 --key-index).
+
+"""
+import time
+import argparse
+
+import numpy as np
+
+from kfktest.util import load_setup, linfo, fake_pool, DB_BATCH, DB_EPOCH, \
+    db_connect, db_release
+from kfktest.fakepool import FAKE_COLS
+
+WORKLOAD_OPS = ['insert', 'update', 'delete']
+
+# CLI 용 파서
+parser = argparse.ArgumentParser(description="DB 에 INSERT / UPDATE / DELETE 가 섞인 워크로드 실행.",
+    formatter_class=argparse.ArgumentDefaultsHelpFormatter
+)
+parser.add_argument('db_type', type=str, choices=['mysql', 'mssql'], help="DBMS 종류.")
+parser.add_argument('--db-name', type=str, default='test', help="이용할 데이터베이스 이름.")
+parser.add_argument('-t', '--table', type=str, default='person', help="대상 테이블 이름.")
+parser.add_argument('-p', '--pid', type=int, default=0, help="워크로드 프로세스 ID.")
+parser.add_argument('-e', '--epoch', type=int, default=DB_EPOCH, help="에포크 수.")
+parser.add_argument('-b', '--batch', type=int, default=DB_BATCH, help="에포크당 작업수.")
+parser.add_argument('-r', '--ratio', type=str, default='70/25/5',
+    help="INSERT/UPDATE/DELETE 비율.")
+parser.add_argument('-k', '--known', type=int, default=0,
+    help="같은 pid 로 이미 인서트된 행수 (sid 0 ~ known - 1). UPDATE / DELETE 대상에 포함.")
+parser.add_argument('-s', '--seed', type=int, default=None, help="작업 선택 시드.")
+parser.add_argument('-d', '--dev', action='store_true', default=False,
+    help="개발 PC 에서 실행.")
+parser.add_argument('-n', '--no-result', action='store_true', default=False,
+    help="출력 감추기.")
+parser.add_argument('--db-host', type=str, help="외부 MySQL DB 주소.")
+parser.add_argument('--db-user', type=str, help="외부 MySQL DB 유저.")
+parser.add_argument('--db-passwd', type=str, help="외부 MySQL DB 암호.")
+
+
+def parse_ratio(ratio):
+    """'70/25/5' 형식의 비율을 합이 1 인 확률 배열로.
+
+    Returns:
+        numpy.ndarray: INSERT, UPDATE, DELETE 확률
+
+    """
+    parts = [float(v) for v in ratio.split('/')]
+    if len(parts) != len(WORKLOAD_OPS) or min(parts) < 0 or sum(parts) <= 0:
+        raise ValueError(f"Invalid workload ratio: {ratio}")
+    parts = np.array(parts)
+    return parts / parts.sum()
+
+
+class KeyIndex:
+    """살아있는 sid 들의 로컬 인덱스.
+
+    sid 를 배열에 두고 위치를 dict 로 관리해, 추가 / 임의 선택 / 삭제 모두 O(1).
+    삭제는 마지막 원소를 빈 자리로 옮기는 방식.
+
+    """
+
+    def __init__(self, sids=()):
+        self.sids = list(sids)
+        self.pos = {sid: i for i, sid in enumerate(self.sids)}
+
+    def __len__(self):
+        return len(self.sids)
+
+    def add(self, sid):
+        self.pos[sid] = len(self.sids)
+        self.sids.append(sid)
+
+    def remove(self, sid):
+        i = self.pos.pop(sid)
+        last = self.sids.pop()
+        if last != sid:
+            self.sids[i] = last
+            self.pos[last] = i
+
+    def pick(self, rng, count):
+        """서로 다른 sid 를 count 개 (최대 인덱스 크기) 임의로 선택."""
+        count = min(count, len(self.sids))
+        idx = rng.choice(len(self.sids), count, replace=False)
+        return [self.sids[i] for i in idx]
+
+
+def run_workload(conn, cursor, epoch, batch, pid, profile, table='person',
+        ratio='70/25/5', known=0, seed=None):
+    """비율에 맞춰 INSERT / UPDATE / DELETE 를 섞어 실행.
+
+    에포크마다 batch 개 작업의 종류를 고르고, 종류별로 모아 executemany 후 커밋.
+    살아있는 행이 모자라면 UPDATE / DELETE 는 그만큼 INSERT 로 바뀐다.
+    한 에포크 안에서 DELETE 대상을 먼저 인덱스에서 빼기에 UPDATE 와 겹치지 않는다.
+
+    Args:
+        conn: DB 커넥션
+        cursor: DB 커서
+        epoch (int): 에포크 수
+        batch (int): 에포크당 작업수
+        pid (int): 워크로드 프로세스 ID
+        profile (str): DBMS 종류. mysql / mssql
+        table (str): 대상 테이블. 기본값 person
+        ratio (str): INSERT/UPDATE/DELETE 비율. 기본값 70/25/5
+        known (int): 같은 pid 로 이미 인서트된 행수 (sid 0 ~ known - 1)
+        seed (int): 작업 선택 시드. 기본값 None
+
+    Returns:
+        dict: 작업 종류별 실행 행수
+
+    """
+    assert profile in ('mysql', 'mssql')
+    linfo(f"[ ] run_workload {epoch} {batch} {table} {ratio}")
+    probs = parse_ratio(ratio)
+    rng = np.random.default_rng(seed)
+    pool = fake_pool(profile, pid)
+    index = KeyIndex(range(known))
+    next_sid = known
+
+    cols = ', '.join(FAKE_COLS)
+    marks = ', '.join(['%s'] * (len(FAKE_COLS) + 2))
+    ins_sql = f"INSERT INTO {table}(pid, sid, {cols}) VALUES({marks})"
+    sets = ', '.join([f'{col} = %s' for col in FAKE_COLS])
+    upd_sql = f"UPDATE {table} SET {sets} WHERE pid = %s AND sid = %s"
+    del_sql = f"DELETE FROM {table} WHERE pid = %s AND sid = %s"
+
+    counts = dict.fromkeys(WORKLOAD_OPS, 0)
+    for j in range(epoch):
+        linfo(f"Workload {pid} epoch: {j+1}")
+        n_ins, n_upd, n_del = rng.multinomial(batch, probs)
+
+        del_sids = index.pick(rng, n_del)
+        for sid in del_sids:
+            index.remove(sid)
+        upd_sids = index.pick(rng, n_upd)
+        n_ins = batch - len(del_sids) - len(upd_sids)
+        ins_sids = range(next_sid, next_sid + n_ins)
+        next_sid += n_ins
+
+        if n_ins > 0:
+            cursor.executemany(ins_sql, pool.rows(n_ins, pid, ins_sids))
+        if len(upd_sids) > 0:
+            rows = [(*vals, pid, sid) for vals, sid in
+                    zip(zip(*pool.sample(len(upd_sids))), upd_sids)]
+            cursor.executemany(upd_sql, rows)
+        if len(del_sids) > 0:
+            cursor.executemany(del_sql, [(pid, sid) for sid in del_sids])
+        conn.commit()
+
+        for sid in ins_sids:
+            index.add(sid)
+        counts['insert'] += n_ins
+        counts['update'] += len(upd_sids)
+        counts['delete'] += len(del_sids)
+    linfo(f"[v] run_workload {epoch} {batch} {table} {ratio}")
+    return counts
+
+
+def workload(db_type,
+        db_name=parser.get_default('db_name'),
+        table=parser.get_default('table'),
+        epoch=parser.get_default('epoch'),
+        batch=parser.get_default('batch'),
+        pid=parser.get_default('pid'),
+        ratio=parser.get_default('ratio'),
+        known=parser.get_default('known'),
+        seed=parser.get_default('seed'),
+        dev=parser.get_default('dev'),
+        no_result=parser.get_default('no_result'),
+        db_host=None,
+        db_user=None,
+        db_passwd=None
+        ):
+    """워크로드 실행.
+
+    `db_name` DB 에 대상 테이블이 미리 만들어져 있어야 함.
+
+    Args:
+        db_type (str): DBMS 종류. mysql / mssql
+        db_name (str): DB 이름
+        table (str): 테이블 이름. 기본값 person
+        epoch (int): 에포크 수
+        batch (int): 에포크당 작업수
+        pid (int): 워크로드 프로세스 ID
+        ratio (str): INSERT/UPDATE/DELETE 비율
+        known (int): 같은 pid 로 이미 인서트된 행수
+        seed (int): 작업 선택 시드
+        dev (bool): 개발 PC 에서 실행 여부
+        no_result (bool): 결과 감추기 여부
+        db_host (str): 외부 DB 주소
+        db_user (str): 외부 DB 유저
+        db_passwd (str): 외부 DB 암호
+
+    Returns:
+        dict: 작업 종류별 실행 행수
+
+    """
+    # 외부 DB 정보가 없으면 생성한 DB
+    if db_host is None:
+        setup = load_setup(db_type)
+        db_ip_key = f'{db_type}_public_ip' if dev else f'{db_type}_private_ip'
+        db_host = setup[db_ip_key]['value']
+        db_user = setup['db_user']['value']
+        db_passwd = setup['db_passwd']['value']['result']
+
+    linfo(f"Workload {pid} connect DB at {db_host}")
+    conn = db_connect(db_type, db_host, db_user, db_passwd, db_name)
+    cursor = conn.cursor()
+    linfo("Connect done.")
+
+    st = time.time()
+    counts = run_workload(conn, cursor, epoch, batch, pid, db_type, table,
+        ratio, known, seed)
+    db_release(conn)
+
+    elapsed = time.time() - st
+    vel = epoch * batch / elapsed
+    if not no_result:
+        ops = ' / '.join([f'{op} {counts[op]}' for op in WORKLOAD_OPS])
+        linfo(f"Workload {pid} ran {epoch * batch} ops ({ops}). {int(vel)} ops/sec with batch of {batch}.")
+    return counts
+
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+    workload(args.db_type, args.db_name, args.table, args.epoch, args.batch,
+        args.pid, args.ratio, args.known, args.seed, args.dev, args.no_result,
+        args.db_host, args.db_user, args.db_passwd)
@@ -12,8 +12,9 @@ from kfktest.util import (count_topic_message, get_kafka_ssh,
     start_kafka_broker, kill_proc_by_port, vm_stop, vm_start,
     restart_kafka_and_connect, stop_kafka_and_connect, count_table_row,
     local_select_proc, local_insert_proc, linfo, NUM_INS_PROCS, NUM_SEL_PROCS,
-    remote_insert_proc, remote_select_proc, DB_ROWS, load_setup, insert_fake,
-    db_concur, ssh_exec, s3_count_sinkmsg, KFKTEST_S3_BUCKET,
+    remote_insert_job, remote_select_job, fanout_exec, DB_ROWS, load_setup, insert_fake,
+    INSERT_MODES, DB_EPOCH, DB_BATCH, DB_PRE_BATCH,
+    db_concur, ssh_exec, ssh_stream, s3_count_sinkmsg, KFKTEST_S3_BUCKET,
     KFKTEST_S3_DIR, rot_table_proc, rot_insert_proc, new_consumer, consume_iter,
     # 픽스쳐들
     xsetup, xcp_setup, xjdbc, xtable, xkafka, xzookeeper, xkvmstart,
@@ -44,7 +45,7 @@ def test_ct_local_basic(xsetup, xjdbc, xprofile, xkfssh):
         p.start()
 
     # 카프카 토픽 확인 (timeout 되기 전에 다 받아야 함)
-    cnt = count_topic_message(xprofile, f'{xprofile}_person', timeout=10)
+    cnt = count_topic_message(xprofile, f'{xprofile}_person', expected=DB_ROWS, timeout=10)
     assert DB_ROWS == cnt
 
     for p in ins_pros:
@@ -97,7 +98,7 @@ def test_ct_broker_stop(xsetup, xjdbc, xprofile, xkfssh, xhash):
     restart_kafka_and_connect(xprofile, xkfssh, xhash, False)
 
     # 카프카 토픽 확인 (timeout 되기 전에 다 받아야 함)
-    cnt = count_topic_message(xprofile, f'{xprofile}_person', timeout=10)
+    cnt = count_topic_message(xprofile, f'{xprofile}_person', expected=DB_ROWS, timeout=10)
     assert DB_ROWS == cnt
 
     for p in ins_pros:
@@ -140,7 +141,7 @@ def test_ct_broker_kill(xsetup, xjdbc, xprofile, xkfssh):
     start_kafka_broker(xkfssh)
 
     # 카프카 토픽 확인 (timeout 되기 전에 다 받아야 함)
-    cnt = count_topic_message(xprofile, f'{xprofile}_person', timeout=20)
+    cnt = count_topic_message(xprofile, f'{xprofile}_person', expected=DB_ROWS, timeout=20)
     # 브로커만 강제 Kill 된 경우, 커넥터가 offset 을 flush 하지 못해 다시 시도
     # -> 중복 메시지 발생 가능!
     assert DB_ROWS <= cnt
@@ -184,7 +185,7 @@ def test_ct_broker_vmstop(xsetup, xjdbc, xprofile, xkfssh):
     # Reboot 후 ssh 객체 재생성 필요!
     kfssh = get_kafka_ssh(xprofile)
     # 카프카 토픽 확인 (timeout 되기 전에 다 받아야 함)
-    cnt = count_topic_message(xprofile, f'{xprofile}_person', timeout=20)
+    cnt = count_topic_message(xprofile, f'{xprofile}_person', expected=DB_ROWS, timeout=20)
     assert DB_ROWS == cnt
 
     for p in ins_pros:
@@ -198,70 +199,63 @@ def test_ct_broker_vmstop(xsetup, xjdbc, xprofile, xkfssh):
 
 def test_db(xcp_setup, xprofile, xkfssh, xtable):
     """DB 기본성능 확인을 위해 원격 insert / select 만 수행."""
-    # Selector 프로세스들 시작
-    sel_pros = []
-    for pid in range(1, NUM_SEL_PROCS + 1):
-        # select 프로세스
-        p = Process(target=remote_select_proc, args=(xprofile, xcp_setup, pid))
-        sel_pros.append(p)
-        p.start()
+    # Selector / Inserter 명령을 원격 노드들에서 동시에 시작
+    jobs = [remote_select_job(xprofile, xcp_setup, pid)
+            for pid in range(1, NUM_SEL_PROCS + 1)]
+    # 노드당 하나의 SSH 세션에서 NUM_INS_PROCS 개 워커로 인서트
+    jobs.append(remote_insert_job(xprofile, xcp_setup, 1, workers=NUM_INS_PROCS))
+    fanout_exec(jobs)
+    linfo("All insert / select processes are done.")
 
-    # Insert 프로세스들 시작
-    ins_pros = []
-    for pid in range(1, NUM_INS_PROCS + 1):
-        # insert 프로세스
-        p = Process(target=remote_insert_proc, args=(xprofile, xcp_setup, pid))
-        ins_pros.append(p)
-        p.start()
+    # 테이블 행수 확인
+    cnt = count_table_row(xprofile)
+    assert DB_ROWS  == cnt
 
-    for p in ins_pros:
-        p.join()
-    linfo("All insert processes are done.")
 
-    for p in sel_pros:
-        p.join()
-    linfo("All select processes are done.")
+@pytest.mark.parametrize('batch', [DB_PRE_BATCH, DB_BATCH])
+@pytest.mark.parametrize('mode', INSERT_MODES)
+def test_insert_modes(xprofile, xtable, mode, batch):
+    """MSSQL 인서트 방식별 속도 비교.
+
+    - many: pymssql executemany 는 행마다 INSERT 왕복
+    - values: multi-row VALUES 로 1000 행당 한 번 왕복
+    - bulk: BCP
+    - `pytest test_mssql.py::test_insert_modes -s | grep "per seconds"` 로 비교
+
+    """
+    conn, cursor = db_concur(xprofile)
+    st = time.time()
+    insert_fake(conn, cursor, DB_EPOCH, batch, 1, xprofile, mode=mode)
+    vel = DB_EPOCH * batch / (time.time() - st)
+    linfo(f"Inserter mode {mode} inserted {DB_EPOCH * batch} rows. {int(vel)} rows per seconds with batch of {batch}.")
+    conn.close()
 
     # 테이블 행수 확인
     cnt = count_table_row(xprofile)
-    assert DB_ROWS  == cnt
+    assert DB_EPOCH * batch == cnt
 
 
 def test_ct_remote_basic(xcp_setup, xjdbc, xprofile, xkfssh):
     """원격 insert / select 로 기본적인 Change Tracking 테스트.
 
-    - Inserter / Selector 출력은 count 가 끝난 뒤 몰아서 나옴.
+    - Inserter / Selector 출력은 노드 이름을 붙여 바로 나옴.
 
     """
-    # Selector 프로세스들 시작
-    sel_pros = []
-    for pid in range(1, NUM_SEL_PROCS + 1):
-        # select 프로세스
-        p = Process(target=remote_select_proc, args=(xprofile, xcp_setup, pid))
-        sel_pros.append(p)
-        p.start()
-
-    # Insert 프로세스들 시작
-    ins_pros = []
-    for pid in range(1, NUM_INS_PROCS + 1):
-        # insert 프로세스
-        p = Process(target=remote_insert_proc, args=(xprofile, xcp_setup, pid))
-        ins_pros.append(p)
-        p.start()
+    # Selector / Inserter 명령을 원격 노드들에서 동시에 시작
+    jobs = [remote_select_job(xprofile, xcp_setup, pid)
+            for pid in range(1, NUM_SEL_PROCS + 1)]
+    # 노드당 하나의 SSH 세션에서 NUM_INS_PROCS 개 워커로 인서트
+    jobs.append(remote_insert_job(xprofile, xcp_setup, 1, workers=NUM_INS_PROCS))
+    load = fanout_exec(jobs, wait=False)
 
     # 이것이 없으면 일부 메시지 유실 발생?!
     time.sleep(5)
     # 카프카 토픽 확인 (timeout 되기전에 다 받아야 함)
-    cnt = count_topic_message(xprofile, f'{xprofile}_person', timeout=20)
+    cnt = count_topic_message(xprofile, f'{xprofile}_person', expected=DB_ROWS, timeout=20)
     assert DB_ROWS == cnt
 
-    for p in ins_pros:
-        p.join()
-    linfo("All insert processes are done.")
-
-    for p in sel_pros:
-        p.join()
-    linfo("All select processes are done.")
+    load.result()
+    linfo("All insert / select processes are done.")
 
 
 def test_cdc_local_basic(xdbzm, xkfssh, xsetup, xprofile):
@@ -289,7 +283,7 @@ def test_cdc_local_basic(xdbzm, xkfssh, xsetup, xprofile):
     time.sleep(10)
 
     # 카프카 토픽 확인 (timeout 되기전에 다 받아야 함)
-    cnt = count_topic_message(xprofile, f'db1.dbo.person', timeout=30)
+    cnt = count_topic_message(xprofile, f'db1.dbo.person', expected=DB_ROWS, timeout=30)
     assert DB_ROWS == cnt
 
     for p in ins_pros:
@@ -305,37 +299,23 @@ def test_cdc_remote_basic(xcp_setup, xdbzm, xprofile, xkfssh, xtable):
     """원격 insert / select 로 기본적인 Change Data Capture 테스트.
 
     - 테스트 시작전 이전 토픽을 참고하는 것이 없어야 함. (delete_topic 에러 발생)
-    - Inserter / Selector 출력은 count 가 끝난 뒤 몰아서 나옴.
+    - Inserter / Selector 출력은 노드 이름을 붙여 바로 나옴.
 
     """
 
-    # Selector 프로세스들 시작
-    sel_pros = []
-    for pid in range(1, NUM_SEL_PROCS + 1):
-        # select 프로세스
-        p = Process(target=remote_select_proc, args=(xprofile, xcp_setup, pid))
-        sel_pros.append(p)
-        p.start()
-
-    # Insert 프로세스들 시작
-    ins_pros = []
-    for pid in range(1, NUM_INS_PROCS + 1):
-        # insert 프로세스
-        p = Process(target=remote_insert_proc, args=(xprofile, xcp_setup, pid))
-        ins_pros.append(p)
-        p.start()
+    # Selector / Inserter 명령을 원격 노드들에서 동시에 시작
+    jobs = [remote_select_job(xprofile, xcp_setup, pid)
+            for pid in range(1, NUM_SEL_PROCS + 1)]
+    # 노드당 하나의 SSH 세션에서 NUM_INS_PROCS 개 워커로 인서트
+    jobs.append(remote_insert_job(xprofile, xcp_setup, 1, workers=NUM_INS_PROCS))
+    load = fanout_exec(jobs, wait=False)
 
     # 카프카 토픽 확인 (timeout 되기전에 다 받아야 함)
-    cnt = count_topic_message(xprofile, f'db1.dbo.person', timeout=10)
+    cnt = count_topic_message(xprofile, f'db1.dbo.person', expected=DB_ROWS, timeout=10)
     assert DB_ROWS == cnt
 
-    for p in ins_pros:
-        p.join()
-    linfo("All insert processes are done.")
-
-    for p in sel_pros:
-        p.join()
-    linfo("All select processes are done.")
+    load.result()
+    linfo("All insert / select processes are done.")
 
     linfo(f"CDC Test Elapsed: {time.time() - xtable:.2f}")
 
@@ -542,23 +522,25 @@ def test_ct_rtbl_inc(xcp_setup, xjdbc, xtable, xprofile, xtopic, xkfssh):
     time.sleep(7)
 
     # 토픽 메시지 수와 DB 행 수는 같아야 한다
-    count = count_topic_message('mssql', 'mssql_person')
+    count = count_topic_message('mssql', 'mssql_person',
+        expected=CTR_INSERTS * CTR_BATCH)
     assert CTR_INSERTS * CTR_BATCH == count
     linfo(f"Orignal Messages: {CTR_INSERTS * CTR_BATCH}, Topic Messages: {count}")
 
     # 빠진 ID 가 없는지 확인
     cmd = "kafka-console-consumer.sh --bootstrap-server localhost:9092 --topic mssql_person --from-beginning --timeout-ms 3000"
     ssh = get_kafka_ssh('mssql')
-    ret = ssh_exec(ssh, cmd)
     pids = set()
-    for line in ret.split('\n'):
-        try:
-            data = json.loads(line)
-        except json.decoder.JSONDecodeError:
-            print(line)
-            continue
-        pid = data['pid']
-        pids.add(pid)
+    # 토픽 전체를 문자열로 받지 않고 읽는 대로 확인
+    with ssh_stream(ssh, cmd) as lines:
+        for line in lines:
+            try:
+                data = json.loads(line)
+            except json.decoder.JSONDecodeError:
+                print(line)
+                continue
+            pid = data['pid']
+            pids.add(pid)
     missed = set(range(CTR_INSERTS)) - pids
     linfo(f"Check missing messages: {missed}")
     assert len(missed) == 0
@@ -613,16 +595,17 @@ def test_ct_rtbl_incts(xcp_setup, xjdbc, xs3sink, xtable, xprofile, xtopic, xkfs
     # 빠진 ID 가 없는지 확인
     cmd = "kafka-console-consumer.sh --bootstrap-server localhost:9092 --topic mssql_person --from-beginning --timeout-ms 3000"
     ssh = get_kafka_ssh('mssql')
-    ret = ssh_exec(ssh, cmd)
     pids = set()
-    for line in ret.split('\n'):
-        try:
-            data = json.loads(line)
-        except json.decoder.JSONDecodeError:
-            print(line)
-            continue
-        pid = data['pid']
-        pids.add(pid)
+    # 토픽 전체를 문자열로 받지 않고 읽는 대로 확인
+    with ssh_stream(ssh, cmd) as lines:
+        for line in lines:
+            try:
+                data = json.loads(line)
+            except json.decoder.JSONDecodeError:
+                print(line)
+                continue
+            pid = data['pid']
+            pids.add(pid)
     missed = sorted(set(range(CTR_INSERTS)) - pids)
     linfo(f"Check missing messages: {missed}")
     assert len(missed) == 0
@@ -671,5 +654,5 @@ def test_ct_tsloss(xcp_setup, xjdbc, xtable, xprofile, xtopic, xkfssh):
     linfo("All insert processes are done.")
 
     # 카프카 토픽 확인 (timeout 되기 전에 다 받아야 함)
-    cnt = count_topic_message(xprofile, f'{xprofile}_person', timeout=10)
+    cnt = count_topic_message(xprofile, f'{xprofile}_person', expected=DB_ROWS, timeout=10)
     assert DB_ROWS == cnt
@@ -8,12 +8,13 @@ from mysql.connector import connect
 
 from kfktest.table import reset_table
 from kfktest.inserter import insert
+from kfktest.workload import workload
 from kfktest.util import (SSH, count_topic_message, ssh_exec, stop_kafka_broker,
     start_kafka_broker, kill_proc_by_port, vm_start, vm_stop, vm_hibernate,
     get_kafka_ssh, stop_kafka_and_connect, restart_kafka_and_connect, linfo,
-    count_table_row, DB_PRE_ROWS, NUM_SEL_PROCS,  NUM_INS_PROCS,
-    local_insert_proc, local_select_proc, remote_insert_proc,
-    remote_select_proc, DB_ROWS, rot_insert_proc, rot_table_proc,
+    count_table_row, DB_PRE_ROWS, NUM_SEL_PROCS,  NUM_INS_PROCS, DB_EPOCH, DB_BATCH,
+    local_insert_proc, local_select_proc, remote_insert_job, fanout_exec,
+    remote_select_job, DB_ROWS, rot_insert_proc, rot_table_proc,
     KFKTEST_S3_BUCKET, KFKTEST_S3_DIR, s3_count_sinkmsg,
     # 픽스쳐들
     xsetup, xjdbc, xcp_setup, xtable, xkafka, xzookeeper, xkvmstart,
@@ -57,7 +58,7 @@ def test_ct_local_basic(xjdbc, xkfssh, xsetup, xprofile):
     linfo("All select processes are done.")
 
     # 카프카 토픽 확인 (timeout 되기전에 다 받아야 함)
-    cnt = count_topic_message(xprofile, f'{xprofile}_person', timeout=10)
+    cnt = count_topic_message(xprofile, f'{xprofile}_person', expected=DB_ROWS, timeout=10)
     assert DB_ROWS == cnt
 
 
@@ -88,7 +89,8 @@ def test_ct_speed(xjdbc, xsetup, xprofile, xkfssh):
     cnt = 0
     st = time.time()
     while cnt != DB_ROWS:
-        cnt = count_topic_message(xprofile, f'{xprofile}_person')
+        # 워터마크로 바로 세기에 기다리지 않음
+        cnt = count_topic_message(xprofile, f'{xprofile}_person', timeout=None)
         print(cnt)
         time.sleep(1)
     print(f"Sync in {time.time() - st:.1f} seconds")
@@ -132,7 +134,8 @@ def test_ct_broker_stop(xsetup, xjdbc, xkfssh, xprofile, xhash):
     restart_kafka_and_connect(xprofile, xkfssh, xhash, False)
 
     # 카프카 토픽 확인 (timeout 되기 전에 다 받아야 함)
-    cnt = count_topic_message(xprofile, f'{xprofile}_person', timeout=10)
+    cnt = count_topic_message(xprofile, f'{xprofile}_person',
+        expected=DB_ROWS + DB_PRE_ROWS, timeout=10)
     # 정지 시점에 따라 중복 발생 가능
     assert DB_ROWS + DB_PRE_ROWS <= cnt
 
@@ -176,7 +179,8 @@ def test_ct_broker_kill(xsetup, xjdbc, xkfssh, xprofile):
     start_kafka_broker(xkfssh)
 
     # 카프카 토픽 확인 (timeout 되기 전에 다 받아야 함)
-    cnt = count_topic_message(xprofile, f'{xprofile}_person', timeout=10)
+    cnt = count_topic_message(xprofile, f'{xprofile}_person',
+        expected=DB_ROWS + DB_PRE_ROWS, timeout=10)
     # 브로커만 강제 Kill 된 경우, 커넥터가 offset 을 flush 하지 못해 다시 시도
     # -> 중복 메시지 발생 가능!
     assert DB_ROWS + DB_PRE_ROWS <= cnt
@@ -220,7 +224,8 @@ def test_ct_broker_vmstop(xsetup, xjdbc, xkfssh, xprofile):
     # Reboot 후 ssh 객체 재생성 필요!
     kfssh = get_kafka_ssh(xprofile)
     # 카프카 토픽 확인 (timeout 되기 전에 다 받아야 함)
-    cnt = count_topic_message(xprofile, f'{xprofile}_person', timeout=10)
+    cnt = count_topic_message(xprofile, f'{xprofile}_person',
+        expected=DB_ROWS + DB_PRE_ROWS, timeout=10)
     assert DB_ROWS + DB_PRE_ROWS == cnt
 
     for p in ins_pros:
@@ -278,29 +283,13 @@ def test_ct_broker_vmstop(xsetup, xjdbc, xkfssh, xprofile):
 
 def test_db(xcp_setup, xprofile, xkfssh, xtable):
     """DB 기본성능 확인을 위해 원격 insert / select 만 수행."""
-    # Selector 프로세스들 시작
-    sel_pros = []
-    for pid in range(1, NUM_SEL_PROCS + 1):
-        # select 프로세스
-        p = Process(target=remote_select_proc, args=(xprofile, xcp_setup, pid))
-        sel_pros.append(p)
-        p.start()
-
-    # Insert 프로세스들 시작
-    ins_pros = []
-    for pid in range(1, NUM_INS_PROCS + 1):
-        # insert 프로세스
-        p = Process(target=remote_insert_proc, args=(xprofile, xcp_setup, pid))
-        ins_pros.append(p)
-        p.start()
-
-    for p in ins_pros:
-        p.join()
-    linfo("All insert processes are done.")
-
-    for p in sel_pros:
-        p.join()
-    linfo("All select processes are done.")
+    # Selector / Inserter 명령을 원격 노드들에서 동시에 시작
+    jobs = [remote_select_job(xprofile, xcp_setup, pid)
+            for pid in range(1, NUM_SEL_PROCS + 1)]
+    # 노드당 하나의 SSH 세션에서 NUM_INS_PROCS 개 워커로 인서트
+    jobs.append(remote_insert_job(xprofile, xcp_setup, 1, workers=NUM_INS_PROCS))
+    fanout_exec(jobs)
+    linfo("All insert / select processes are done.")
 
     # 테이블 행수 확인
     cnt = count_table_row(xprofile)
@@ -310,40 +299,26 @@ def test_db(xcp_setup, xprofile, xkfssh, xtable):
 def test_ct_remote_basic(xcp_setup, xprofile, xkfssh, xjdbc):
     """원격 insert / select 로 기본적인 Change Tracking 테스트.
 
-    - Inserter / Selector 출력은 count 가 끝난 뒤 몰아서 나옴.
+    - Inserter / Selector 출력은 노드 이름을 붙여 바로 나옴.
     - 가끔씩 1~4 개 정도 메시지 손실이 있는듯?
 
     """
     time.sleep(5)
-    # Selector 프로세스들 시작
-    sel_pros = []
-    for pid in range(1, NUM_SEL_PROCS + 1):
-        # select 프로세스
-        p = Process(target=remote_select_proc, args=(xprofile, xcp_setup, pid))
-        sel_pros.append(p)
-        p.start()
-
-    # Insert 프로세스들 시작
-    ins_pros = []
-    for pid in range(1, NUM_INS_PROCS + 1):
-        # insert 프로세스
-        p = Process(target=remote_insert_proc, args=(xprofile, xcp_setup, pid))
-        ins_pros.append(p)
-        p.start()
+    # Selector / Inserter 명령을 원격 노드들에서 동시에 시작
+    jobs = [remote_select_job(xprofile, xcp_setup, pid)
+            for pid in range(1, NUM_SEL_PROCS + 1)]
+    # 노드당 하나의 SSH 세션에서 NUM_INS_PROCS 개 워커로 인서트
+    jobs.append(remote_insert_job(xprofile, xcp_setup, 1, workers=NUM_INS_PROCS))
+    load = fanout_exec(jobs, wait=False)
 
     # 이것이 없으면 일부 메시지 유실 발생?!
     time.sleep(5)
     # 카프카 토픽 확인 (timeout 되기전에 다 받아야 함)
-    cnt = count_topic_message(xprofile, f'{xprofile}_person', timeout=20)
+    cnt = count_topic_message(xprofile, f'{xprofile}_person', expected=DB_ROWS, timeout=20)
     assert DB_ROWS == cnt
 
-    for p in ins_pros:
-        p.join()
-    linfo("All insert processes are done.")
-
-    for p in sel_pros:
-        p.join()
-    linfo("All select processes are done.")
+    load.result()
+    linfo("All insert / select processes are done.")
 
 
 def test_cdc_local_basic(xdbzm, xkfssh, xsetup, xprofile):
@@ -369,7 +344,7 @@ def test_cdc_local_basic(xdbzm, xkfssh, xsetup, xprofile):
         p.start()
 
     # 카프카 토픽 확인 (timeout 되기전에 다 받아야 함)
-    cnt = count_topic_message(xprofile, f'db1.test.person', timeout=20)
+    cnt = count_topic_message(xprofile, f'db1.test.person', expected=DB_ROWS, timeout=20)
     assert DB_ROWS == cnt
 
     for p in ins_pros:
@@ -385,36 +360,46 @@ def test_cdc_remote_basic(xcp_setup, xdbzm, xprofile, xkfssh, xcdc):
     """원격 insert / select 로 기본적인 Change Data Capture 테스트.
 
     - 테스트 시작전 이전 토픽을 참고하는 것이 없어야 함. (delete_topic 에러 발생)
-    - Inserter / Selector 출력은 count 가 끝난 뒤 몰아서 나옴.
+    - Inserter / Selector 출력은 노드 이름을 붙여 바로 나옴.
 
     """
-    # Selector 프로세스들 시작
-    sel_pros = []
-    for pid in range(1, NUM_SEL_PROCS + 1):
-        # select 프로세스
-        p = Process(target=remote_select_proc, args=(xprofile, xcp_setup, pid))
-        sel_pros.append(p)
-        p.start()
-
-    # Insert 프로세스들 시작
-    ins_pros = []
-    for pid in range(1, NUM_INS_PROCS + 1):
-        # insert 프로세스
-        p = Process(target=remote_insert_proc, args=(xprofile, xcp_setup, pid))
-        ins_pros.append(p)
-        p.start()
+    # Selector / Inserter 명령을 원격 노드들에서 동시에 시작
+    jobs = [remote_select_job(xprofile, xcp_setup, pid)
+            for pid in range(1, NUM_SEL_PROCS + 1)]
+    # 노드당 하나의 SSH 세션에서 NUM_INS_PROCS 개 워커로 인서트
+    jobs.append(remote_insert_job(xprofile, xcp_setup, 1, workers=NUM_INS_PROCS))
+    load = fanout_exec(jobs, wait=False)
 
     # 카프카 토픽 확인 (timeout 되기전에 다 받아야 함)
-    cnt = count_topic_message(xprofile, f'db1.test.person', timeout=10)
+    cnt = count_topic_message(xprofile, f'db1.test.person', expected=DB_ROWS, timeout=10)
     assert DB_ROWS == cnt
 
-    for p in ins_pros:
-        p.join()
-    linfo("All insert processes are done.")
+    load.result()
+    linfo("All insert / select processes are done.")
 
-    for p in sel_pros:
-        p.join()
-    linfo("All select processes are done.")
+
+@pytest.mark.parametrize('xtable', [{'key_index': True}], indirect=True)
+def test_cdc_workload(xdbzm, xkfssh, xsetup, xprofile, xtable):
+    """INSERT / UPDATE / DELETE 가 섞인 워크로드의 Change Data Capture 테스트.
+
+    - UPDATE 는 before / after 이미지가 실려 INSERT 보다 메시지가 크다.
+    - DELETE 는 삭제 메시지와 툼스톤 메시지 두 개가 생긴다.
+
+    """
+    st = time.time()
+    counts = workload(xprofile, epoch=DB_EPOCH, batch=DB_BATCH, pid=1,
+                      ratio='70/25/5', seed=0, dev=True)
+    elapsed = time.time() - st
+    linfo(f"Workload done in {elapsed:.1f} seconds: {counts}")
+
+    # 테이블 행수 확인
+    cnt = count_table_row(xprofile)
+    assert counts['insert'] - counts['delete'] == cnt
+
+    # 카프카 토픽 확인 (timeout 되기전에 다 받아야 함)
+    expected = counts['insert'] + counts['update'] + counts['delete'] * 2
+    cnt = count_topic_message(xprofile, f'db1.test.person', expected=expected, timeout=20)
+    assert expected == cnt
 
 
 CTR_ROTATION = 1  # 로테이션 수
@@ -517,5 +502,5 @@ def test_ct_tsdelay(xprofile, xcp_setup, xjdbc, xtable):
     insert('mysql', epoch=1, batch=1, dev=True, dt=dt, show=True)
 
     # 카프카 토픽 확인
-    cnt = count_topic_message(xprofile, f'mysql_person', timeout=10)
+    cnt = count_topic_message(xprofile, f'mysql_person', expected=2, timeout=10)
     assert 2 == cnt
\ No newline at end of file
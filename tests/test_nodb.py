@@ -18,12 +18,14 @@ from kfktest.util import (delete_schema, get_ksqldb_ssh, local_produce_proc,
     ksql_exec, list_ksql_tables, list_ksql_streams, delete_ksql_objects,
     _ksql_exec, setup_filebeat, producer_logger_proc, SSH, create_topic,
     register_schema, delete_schema, consume_iter, new_consumer, delete_topic,
+    describe_topic, truncate_topic,
     # 픽스쳐들
     xsetup, xtopic, xkfssh, xkvmstart, xcp_setup, xs3sink, xhash, xs3rmdir,
     xrmcons, xconn, xkafka, xzookeeper, xksql, xlog, xksqlssh
 )
 from kfktest.producer import produce
 from kfktest.consumer import consume
+from kfktest.agent import get_agent
 
 NUM_PRO_PROCS = 4
 PROC_NUM_MSG = 10000
@@ -93,11 +95,12 @@ def test_remote_basic(xkafka, xprofile, xsetup, xcp_setup, xtopic, xkfssh):
     """원격 프로듀서 및 컨슈머로 기본 동작 테스트."""
     st = time.time()
     # Producer 프로세스 시작
+    # 하나의 SSH 세션에서 NUM_PRO_PROCS 개 워커로 전송
     pro_pros = []
-    for pid in range(1, NUM_PRO_PROCS + 1):
-        p = Process(target=remote_produce_proc, args=(xprofile, xsetup, pid, PROC_NUM_MSG))
-        p.start()
-        pro_pros.append(p)
+    p = Process(target=remote_produce_proc, args=(xprofile, xsetup, 1, PROC_NUM_MSG),
+                kwargs=dict(workers=NUM_PRO_PROCS))
+    p.start()
+    pro_pros.append(p)
 
     for p in pro_pros:
         p.join()
@@ -110,6 +113,88 @@ def test_remote_basic(xkafka, xprofile, xsetup, xcp_setup, xtopic, xkfssh):
     assert tot_msg == cnt
 
 
+def test_remote_agent(xkafka, xprofile, xsetup, xcp_setup, xtopic, xkfssh):
+    """원격 노드의 상주 에이전트로 프로듀스.
+
+    - 첫 호출에서 에이전트가 뜨고, 이후 작업은 인터프리터 기동과 임포트 없이 바로 시작
+
+    """
+    pro_ip = xsetup['producer_public_ip']['value']
+    agent = get_agent(pro_ip, xprofile, 'producer')
+    st = time.time()
+    assert 'pong' == agent.run('ping')
+    linfo(f"Agent round trip {(time.time() - st) * 1000:.1f} ms")
+
+    for pid in (1, 1 + NUM_PRO_PROCS):
+        remote_produce_proc(xprofile, xsetup, pid, PROC_NUM_MSG,
+            workers=NUM_PRO_PROCS, agent=True)
+
+    time.sleep(3)
+    cnt = count_topic_message(xprofile, xtopic,
+        expected=2 * PROC_NUM_MSG * NUM_PRO_PROCS)
+    assert 2 * PROC_NUM_MSG * NUM_PRO_PROCS == cnt
+
+
+def test_truncate_topic(xkafka, xprofile, xsetup, xtopic, xkfssh):
+    """토픽을 지우지 않고 비우기.
+
+    - 비운 뒤 메시지 수는 0 이고 파티션 수와 토픽 ID 는 그대로
+
+    """
+    local_produce_proc(xprofile, 1, PROC_NUM_MSG)
+    assert PROC_NUM_MSG == count_topic_message(xprofile, xtopic, timeout=None)
+    info, parts = describe_topic(xkfssh, xtopic)
+
+    st = time.time()
+    lows = truncate_topic(xkfssh, [xtopic])
+    linfo(f"Truncate {xtopic} in {time.time() - st:.2f} sec.")
+    assert len(parts) == len(lows)
+    assert 0 == count_topic_message(xprofile, xtopic, timeout=None)
+    assert info == describe_topic(xkfssh, xtopic)[0]
+
+    local_produce_proc(xprofile, 2, PROC_NUM_MSG)
+    assert PROC_NUM_MSG == count_topic_message(xprofile, xtopic, timeout=None)
+
+
+CB_NUM_MSG = 100000
+def test_consume_batch_speed(xkafka, xprofile, xsetup, xtopic, xkfssh):
+    """메시지당 poll() 과 batch consume() 의 컨슘 속도 비교.
+
+    - 이전 consume_loop 방식: 메시지마다 poll() 후 json.loads
+    - 현재 consume_loop 방식: consume(num_messages) 로 배치, 디코딩은 필요할 때만
+
+    """
+    local_produce_proc(xprofile, 1, CB_NUM_MSG // NUM_PRO_PROCS,
+                       workers=NUM_PRO_PROCS)
+
+    # 메시지당 poll
+    cons = new_consumer(xprofile)
+    cons.subscribe([xtopic])
+    cnt = 0
+    st = time.time()
+    while True:
+        msg = cons.poll(timeout=5)
+        if msg is None:
+            break
+        if not msg.error():
+            json.loads(msg.value())
+            cnt += 1
+    # 마지막 유휴 대기 시간은 제외
+    poll_vel = cnt / (time.time() - st - 5)
+    cons.close()
+    assert CB_NUM_MSG == cnt
+
+    # 배치 consume (끝에 닿으면 바로 종료)
+    cnt = 0
+    st = time.time()
+    for msg in consume_iter(new_consumer(xprofile, eof=True), [xtopic], eof=True):
+        cnt += 1
+    batch_vel = cnt / (time.time() - st)
+    assert CB_NUM_MSG == cnt
+
+    linfo(f"Consume {cnt} messages by poll: {int(poll_vel)} msgs/sec, by batch: {int(batch_vel)} msgs/sec.")
+
+
 @pytest.mark.parametrize('xtopic', [{
     'partitions': 1,
     'topic_cfg': {
@@ -169,7 +254,7 @@ def test_log_comp(xprofile, xcp_setup, xtopic):
         # value_deserializer=decoder
     )
 
-    for msg in consume_iter(new_consumer(xprofile), [xtopic]):
+    for msg in consume_iter(new_consumer(xprofile, eof=True), [xtopic], eof=True):
         key, value = msg.key().decode(), msg.value().decode()
         if key in ('Bob', 'Lucy'):
             # 테일 세그먼트에는 중복이 없음
@@ -460,7 +545,7 @@ def test_filebeat(xkafka, xprofile, xtopic, xcp_setup, xlog):
     producer_logger_proc(xprofile, messages=10000, latency=0)
 
     time.sleep(5)
-    cnt = count_topic_message(xprofile, xtopic)
+    cnt = count_topic_message(xprofile, xtopic, expected=10000)
     assert 10000 == cnt
 
 
@@ -1363,10 +1448,11 @@ def test_schema_evolution(xkafka, xprofile, xtopic, xksqlssh):
 
     cons_conf1 = {'bootstrap.servers': broker,
                  'group.id': 'cgid1',
-                 'auto.offset.reset': "earliest"}
+                 'auto.offset.reset': "earliest",
+                 'enable.partition.eof': True}
 
     cons1 = Consumer(cons_conf1)
-    for msg in consume_iter(cons1, [xtopic]):
+    for msg in consume_iter(cons1, [xtopic], eof=True):
         _person1 = avro_deser(msg.value(), SerializationContext(msg.topic(), MessageField.VALUE))
         assert person1 == _person1
         print(f"Person1 regdt: {_person1['regdt']}")
@@ -1407,10 +1493,11 @@ def test_schema_evolution(xkafka, xprofile, xtopic, xksqlssh):
 
     cons_conf2 = {'bootstrap.servers': broker,
                  'group.id': 'cgid2',
-                 'auto.offset.reset': "earliest"}
+                 'auto.offset.reset': "earliest",
+                 'enable.partition.eof': True}
 
     cons2 = Consumer(cons_conf2)
-    for i, msg in enumerate(consume_iter(cons2, [xtopic])):
+    for i, msg in enumerate(consume_iter(cons2, [xtopic], eof=True)):
         _person1 = avro_deser(msg.value(), SerializationContext(msg.topic(), MessageField.VALUE))
         _person2 = avro_deser2(msg.value(), SerializationContext(msg.topic(), MessageField.VALUE))
         assert 'address' not in _person1
@@ -1458,10 +1545,11 @@ def test_schema_evolution(xkafka, xprofile, xtopic, xksqlssh):
 
     cons_conf3 = {'bootstrap.servers': broker,
                  'group.id': 'cgid3',
-                 'auto.offset.reset': "earliest"}
+                 'auto.offset.reset': "earliest",
+                 'enable.partition.eof': True}
 
     cons3 = Consumer(cons_conf3)
-    for i, msg in enumerate(consume_iter(cons3, [xtopic])):
+    for i, msg in enumerate(consume_iter(cons3, [xtopic], eof=True)):
         _person1 = avro_deser(msg.value(), SerializationContext(msg.topic(), MessageField.VALUE))
         _person2 = avro_deser2(msg.value(), SerializationContext(msg.topic(), MessageField.VALUE))
         _person3 = avro_deser3(msg.value(), SerializationContext(msg.topic(), MessageField.VALUE))
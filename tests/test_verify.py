@@ -0,0 +1,134 @@
+import numpy as np
+
+from kfktest.verify import (SeqChecker, check_seq, IdTracker, id_ranges,
+    mask_ranges)
+
+
+def _check(sids, window=1000, expected=None, pid=1):
+    checker = SeqChecker(window, expected=expected)
+    for sid in sids:
+        checker.add(pid, sid)
+    return checker.finish()
+
+
+def test_seq_in_order():
+    checker = _check(range(10))
+    assert checker.stats[1] == dict(received=10, dups=0, reorders=0, late=0)
+    assert checker.gaps[1] == []
+    assert checker.report('test', print)
+
+
+def test_seq_reorder():
+    """창 안에서 순서가 바뀐 sid 는 빈틈이 아니다."""
+    checker = _check([0, 2, 3, 1, 4])
+    assert checker.stats[1]['reorders'] == 2
+    assert checker.gaps[1] == []
+    assert checker.next[1] == 5
+
+
+def test_seq_dups():
+    """이미 지난 sid 와 대기 중인 sid 의 중복을 모두 센다."""
+    checker = _check([0, 1, 1, 3, 3])
+    assert checker.stats[1]['dups'] == 2
+    assert checker.stats[1]['reorders'] == 1
+    # 끝까지 2 가 오지 않음
+    assert checker.gaps[1] == [(2, 2)]
+    assert not checker.report('test', print)
+
+
+def test_seq_window_gap_and_late():
+    """창을 넘어서 앞선 sid 가 오면 창 밖은 빈틈 확정, 그 뒤에 온 sid 는 늦게 온 것."""
+    checker = SeqChecker(window=3)
+    for sid in [0, 5]:
+        checker.add(1, sid)
+    assert checker.next[1] == 3
+    assert checker.gaps[1] == [(1, 2)]
+    checker.add(1, 1)
+    checker.finish()
+    assert checker.stats[1]['late'] == 1
+    assert sorted(checker.gaps[1]) == [(2, 2), (3, 4)]
+
+
+def test_seq_window_keeps_inside():
+    """창 안의 sid 는 빈틈으로 확정하지 않기에 나중에 와도 늦은 것이 아니다."""
+    checker = SeqChecker(window=1000)
+    for sid in [0, 5, 5000]:
+        checker.add(1, sid)
+    assert checker.gaps[1] == [(1, 4), (6, 4000)]
+    assert checker.next[1] == 4001
+    for sid in range(4001, 5000):
+        checker.add(1, sid)
+    checker.finish()
+    assert checker.stats[1]['late'] == 0
+    assert checker.next[1] == 5001
+    assert checker.gaps[1] == [(1, 4), (6, 4000)]
+
+
+def test_seq_expected():
+    checker = _check([0, 1, 2], expected=5)
+    assert checker.gaps[1] == [(3, 4)]
+
+
+def test_seq_pids():
+    checker = SeqChecker()
+    for sid in range(3):
+        checker.add(1, sid)
+        checker.add(2, 2 - sid)
+    checker.finish()
+    assert checker.gaps[1] == [] and checker.gaps[2] == []
+    assert checker.stats[2]['reorders'] == 2
+
+
+def test_check_seq_rows():
+    """JDBC / Debezium 메시지와 툼스톤이 섞여도 행의 pid / sid 로 검사."""
+    records = [
+        {'schema': {}, 'payload': {'pid': 1, 'sid': 0}},
+        {'payload': {'before': None, 'after': {'pid': 1, 'sid': 1}, 'op': 'c'}},
+        None,
+        {'before': {'pid': 1, 'sid': 2}, 'after': None},
+    ]
+    checker = check_seq(records, expected=4)
+    assert checker.stats[1]['received'] == 3
+    assert checker.gaps[1] == [(3, 3)]
+
+
+def test_mask_ranges():
+    mask = np.array([1, 1, 0, 1, 0, 0, 1], dtype=bool)
+    assert mask_ranges(mask, 10) == [(10, 11), (13, 13), (16, 16)]
+    assert mask_ranges(~mask) == [(2, 2), (4, 5)]
+    assert mask_ranges(np.zeros(0, dtype=bool)) == []
+    ids = np.flatnonzero(mask) + 10
+    assert mask_ranges(mask, 10) == id_ranges(ids)
+
+
+def test_id_tracker():
+    tracker = IdTracker(10)
+    for id in [1, 2, 2, 5, 6, 7, 7, 7, 10, 12]:
+        tracker.add(id, info=id)
+    assert tracker.missing() == [(3, 4), (8, 9)]
+    assert tracker.duplicated() == [(2, 2), (7, 7)]
+    assert tracker.dup_cnt == 3
+    assert tracker.extra() == 1
+    assert tracker.dups[7] == [7, 7]
+
+
+def test_id_tracker_merge_trimmed():
+    """워커별 트래커의 본 구간만 합쳐도 전체 트래커와 같다."""
+    a, b, whole = IdTracker(100), IdTracker(100), IdTracker(100)
+    for id in range(10, 40):
+        a.add(id)
+        whole.add(id)
+    for id in list(range(35, 60)) + [150]:
+        b.add(id)
+        whole.add(id)
+    trim = b.trimmed()
+    assert trim.min_id == 35 and len(trim.counts) == 116
+
+    merged = IdTracker(100)
+    for tracker in (a.trimmed(), trim, IdTracker(100).trimmed()):
+        merged.merge(tracker)
+    assert merged.missing() == whole.missing() == [(1, 9), (60, 100)]
+    assert merged.duplicated() == whole.duplicated() == [(35, 39)]
+    assert merged.dup_cnt == whole.dup_cnt
+    assert merged.total == whole.total
+    assert merged.extra() == 1